@@ -0,0 +1,161 @@
+"""
+Benchmark of the byte-level block prefilter of `public-icon` Upstream
+
+Builds a synthetic chain DB, then measures digest building for all blocks
+with full JSON decoding and with the prefilter used by stake-only transforms.
+
+Usage: python benchmarks/bench_block_prefilter.py [--blocks 20000] [--txs 50] [--stake-ratio 0.02]
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import random
+import shutil
+import tempfile
+from pathlib import Path
+from time import time
+
+import plyvel
+from ruamel.yaml import YAML
+
+from chainalytic.common import config, zone_manager
+
+
+def build_chain_db(chain_db_dir: str, score_db_dir: str, blocks: int, txs: int, stake_ratio: float):
+    chain_db = plyvel.DB(chain_db_dir, create_if_missing=True)
+    score_db = plyvel.DB(score_db_dir, create_if_missing=True)
+    score_db.put(b'total_supply', (800460000 * 10 ** 18).to_bytes(32, 'big'))
+
+    rand = random.Random(0)
+    for height in range(1, blocks + 1):
+        tx_list = [
+            {
+                'from': f'hx{rand.getrandbits(160):040x}',
+                'to': f'hx{rand.getrandbits(160):040x}',
+                'value': hex(rand.getrandbits(70)),
+                'fee': '0x2386f26fc10000',
+                'timestamp': hex(height),
+                'tx_hash': f'{rand.getrandbits(256):064x}',
+                'signature': 'x' * 88,
+                'method': 'icx_sendTransaction',
+            }
+            for _ in range(txs)
+        ]
+        if rand.random() < stake_ratio:
+            tx_list.append(
+                {
+                    'from': f'hx{rand.getrandbits(160):040x}',
+                    'to': 'cx0000000000000000000000000000000000000000',
+                    'dataType': 'call',
+                    'data': {'method': 'setStake', 'params': {'value': hex(rand.getrandbits(70))}},
+                    'timestamp': hex(height),
+                    'signature': 'x' * 88,
+                }
+            )
+        block = {
+            'version': '0.1a',
+            'prev_block_hash': f'{rand.getrandbits(256):064x}',
+            'merkle_tree_root_hash': f'{rand.getrandbits(256):064x}',
+            'time_stamp': 1516819217223222 + height,
+            'confirmed_transaction_list': tx_list,
+            'block_hash': f'{rand.getrandbits(256):064x}',
+            'height': hex(height),
+            'peer_id': f'hx{rand.getrandbits(160):040x}',
+            'signature': 'x' * 88,
+        }
+        block_hash = hashlib.sha3_256(str(height).encode()).hexdigest().encode()
+        chain_db.put(b'block_height_key' + height.to_bytes(12, 'big'), block_hash)
+        chain_db.put(block_hash, json.dumps(block).encode())
+
+    chain_db.put(b'last_block_key', block_hash)
+    chain_db.close()
+    score_db.close()
+
+
+def setup_working_dir(working_dir: str, chain_db_dir: str, score_db_dir: str, transforms: list):
+    config.init_user_config(working_dir)
+    cfg_dir = Path(working_dir, config.CHAINALYTIC_FOLDER, config.CFG_FOLDER)
+    yaml = YAML(typ='safe')
+
+    registry_path = cfg_dir.joinpath('chain_registry.yml')
+    registry = yaml.load(registry_path.read_text())
+    zone = [z for z in registry['zones'] if z['zone_id'] == 'public-icon'][0]
+    zone.update(
+        {
+            'chain_db_dir': chain_db_dir,
+            'score_db_icondex_dir': score_db_dir,
+            'direct_db_access': 1,
+            'transforms': transforms,
+        }
+    )
+    with open(registry_path, 'w') as f:
+        yaml.dump(registry, f)
+
+    setting_path = cfg_dir.joinpath('setting.yml')
+    setting = yaml.load(setting_path.read_text())
+    setting['digest_store_dir'] = ''
+    with open(setting_path, 'w') as f:
+        yaml.dump(setting, f)
+
+
+def load_data_feeder_module():
+    zone_dir = Path(zone_manager.__file__).resolve().parent.parent.joinpath('zones', 'public-icon')
+    spec = importlib.util.spec_from_file_location(
+        'data_feeder', zone_dir.joinpath('upstream', 'data_feeder.py').as_posix()
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(working_dir: str, blocks: int, transform_id: str) -> tuple:
+    mod = load_data_feeder_module()
+    feeder = mod.DataFeeder(working_dir, 'public-icon')
+    feeder.block_cache.capacity = 0
+
+    async def feed_all():
+        return [await feeder.get_block(h, transform_id) for h in range(1, blocks + 1)]
+
+    start = time()
+    result = asyncio.get_event_loop().run_until_complete(feed_all())
+    elapsed = time() - start
+    feeder.chain_db.close()
+    feeder.score_db_icondex_db.close()
+    return elapsed, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark block prefilter of public-icon Upstream')
+    parser.add_argument('--blocks', type=int, default=20000)
+    parser.add_argument('--txs', type=int, default=50, help='ICX transfer txs per block')
+    parser.add_argument('--stake-ratio', type=float, default=0.02, help='Ratio of blocks with setStake')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        chain_db_dir = Path(tmp, 'chain_db').as_posix()
+        score_db_dir = Path(tmp, 'score_db').as_posix()
+        build_chain_db(chain_db_dir, score_db_dir, args.blocks, args.txs, args.stake_ratio)
+
+        full_dir = Path(tmp, 'full').as_posix()
+        setup_working_dir(
+            full_dir, chain_db_dir, score_db_dir, ['stake_history', 'funded_wallets']
+        )
+        full_time, full_result = run(full_dir, args.blocks, 'stake_history')
+
+        prefilter_dir = Path(tmp, 'prefilter').as_posix()
+        setup_working_dir(prefilter_dir, chain_db_dir, score_db_dir, ['stake_history'])
+        prefilter_time, prefilter_result = run(prefilter_dir, args.blocks, 'stake_history')
+
+        assert full_result == prefilter_result, 'Prefiltered feed differs from full decoding'
+
+        print(f'Blocks: {args.blocks:,}, txs per block: {args.txs}, stake ratio: {args.stake_ratio}')
+        print(f'Full JSON decoding: {full_time:.3f}s ({int(args.blocks / full_time):,} blocks/s)')
+        print(
+            f'Prefilter:          {prefilter_time:.3f}s ({int(args.blocks / prefilter_time):,} blocks/s)'
+        )
+        print(f'Speedup: {full_time / prefilter_time:.2f}x')
+    finally:
+        shutil.rmtree(tmp, ignore_errors=1)
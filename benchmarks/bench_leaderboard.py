@@ -0,0 +1,98 @@
+"""
+Benchmark of the aggregator `Leaderboard` against the sort-per-block approach of transforms
+
+Replays a synthetic stream of blocks, each updating a few wallets of a large wallet set,
+and keeps a top list after every block. The old approach merges updates into
+a `{address: 'stake:delegation:unvoted'}` dict, sorts it with a string-parsing key
+and truncates it, as `abstention_stake` used to do.
+
+Usage: python benchmarks/bench_leaderboard.py [--blocks 20000] [--wallets 50000] [--updates 5] [--top 200]
+"""
+import argparse
+import random
+from time import time
+
+from chainalytic.aggregator.leaderboard import Leaderboard
+
+
+def build_updates(blocks: int, wallets: int, updates: int) -> list:
+    rand = random.Random(0)
+    addresses = [f'hx{rand.getrandbits(160):040x}' for _ in range(wallets)]
+    stream = []
+    for _ in range(blocks):
+        block = {}
+        for _ in range(updates):
+            unvoted = round(rand.uniform(-100, 1000000), 4)
+            block[rand.choice(addresses)] = f'{unvoted + 10}:10:{unvoted}'
+        stream.append(block)
+    return stream
+
+
+def run_sort(stream: list, top: int) -> tuple:
+    start = time()
+    wallets = {}
+    for block in stream:
+        for addr, addr_data in block.items():
+            if float(addr_data.split(':')[2]) > 3:
+                wallets[addr] = addr_data
+            elif addr in wallets:
+                wallets.pop(addr)
+        wallets = {
+            k: v
+            for k, v in sorted(
+                wallets.items(), key=lambda item: float(item[1].split(':')[2]), reverse=1
+            )
+        }
+        wallets = {k: wallets[k] for k in list(wallets)[:top]}
+    return time() - start, wallets
+
+
+def run_leaderboard(stream: list, top: int) -> tuple:
+    start = time()
+    leaderboard = Leaderboard(top)
+    for block in stream:
+        for addr, addr_data in block.items():
+            unvoted = float(addr_data.split(':')[2])
+            if unvoted > 3:
+                leaderboard.put(addr, unvoted, addr_data)
+            else:
+                leaderboard.remove(addr)
+    return time() - start, leaderboard.to_dict()
+
+
+def run_persistence(stream: list, top: int) -> float:
+    leaderboard = Leaderboard(top)
+    for block in stream:
+        for addr, addr_data in block.items():
+            leaderboard.put(addr, float(addr_data.split(':')[2]), addr_data)
+
+    start = time()
+    for _ in range(1000):
+        Leaderboard.loads(leaderboard.dumps())
+    return (time() - start) / 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark aggregator Leaderboard')
+    parser.add_argument('--blocks', type=int, default=20000)
+    parser.add_argument('--wallets', type=int, default=50000, help='Number of distinct wallets')
+    parser.add_argument('--updates', type=int, default=5, help='Wallets updated per block')
+    parser.add_argument('--top', type=int, default=200, help='Leaderboard size')
+    args = parser.parse_args()
+
+    stream = build_updates(args.blocks, args.wallets, args.updates)
+    sort_time, sort_result = run_sort(stream, args.top)
+    leaderboard_time, leaderboard_result = run_leaderboard(stream, args.top)
+    persistence_time = run_persistence(stream, args.top)
+
+    # Ties may be ordered differently, compare content only
+    assert set(sort_result) == set(leaderboard_result), 'Leaderboard differs from sorted dict'
+
+    print(f'Blocks: {args.blocks:,}, wallets: {args.wallets:,}, updates per block: {args.updates}')
+    print(f'Sort per block: {sort_time:.3f}s ({int(args.blocks / sort_time):,} blocks/s)')
+    print(
+        f'Leaderboard:    {leaderboard_time:.3f}s '
+        f'({int(args.blocks / leaderboard_time):,} blocks/s)'
+    )
+    print(f'Speedup: {sort_time / leaderboard_time:.2f}x')
+    print(f'Persistence round trip of {args.top} entries: {persistence_time * 1000:.3f}ms')
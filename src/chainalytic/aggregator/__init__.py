@@ -1,3 +1,4 @@
+import asyncio
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 from chainalytic.common import config, zone_manager
@@ -15,9 +16,27 @@ class Aggregator(object):
         kernel (Kernel):
         upstream_endpoint (str):
         warehouse_endpoint (str):
+        chain_tip (int): latest chain height pushed by Upstream, `None` if not subscribed
+        tip_changed (asyncio.Event): set every time `chain_tip` advances, then replaced
+        batch_execution_size (int): max blocks executed at once when far behind tip, `0` to disable
+        max_concurrent_transforms (int): max transforms aggregating at the same time
+        transform_slots (asyncio.Semaphore): limits concurrent transforms
+        cursors (dict): last block height committed to Warehouse, by transform ID
+        pipeline_depth (int): max items queued between each two of fetch, execute and commit
+            stages, an item is a run of `batch_execution_size` blocks in catch-up mode
+            and a single block in tip-follow mode. `0` to fetch, execute and commit
+            blocks one after another
+        catch_up_lag (int): min blocks behind chain tip to switch a transform to catch-up mode
+        tip_follow_lag (int): max blocks behind chain tip to switch back to tip-follow mode
 
     """
 
+    DEFAULT_BATCH_EXECUTION_SIZE = 100
+    DEFAULT_MAX_CONCURRENT_TRANSFORMS = 4
+    DEFAULT_PIPELINE_DEPTH = 0
+    DEFAULT_CATCH_UP_LAG = 100
+    DEFAULT_TIP_FOLLOW_LAG = 10
+
     def __init__(self, working_dir: str, zone_id: str):
         super(Aggregator, self).__init__()
         self.working_dir = working_dir
@@ -38,3 +57,38 @@ class Aggregator(object):
 
         self.upstream_endpoint = config.get_setting(working_dir)['upstream_endpoint']
         self.warehouse_endpoint = config.get_setting(working_dir)['warehouse_endpoint']
+
+        self.batch_execution_size = self.setting.get(
+            'batch_execution_size', Aggregator.DEFAULT_BATCH_EXECUTION_SIZE
+        )
+
+        self.max_concurrent_transforms = (
+            self.setting.get(
+                'max_concurrent_transforms', Aggregator.DEFAULT_MAX_CONCURRENT_TRANSFORMS
+            )
+            or len(self.kernel.transforms)
+        )
+        self.transform_slots = asyncio.Semaphore(max(self.max_concurrent_transforms, 1))
+
+        self.cursors = {}
+        self.pipeline_depth = self.setting.get(
+            'pipeline_depth', Aggregator.DEFAULT_PIPELINE_DEPTH
+        )
+        self.catch_up_lag = self.setting.get('catch_up_lag', Aggregator.DEFAULT_CATCH_UP_LAG)
+        self.tip_follow_lag = self.setting.get(
+            'tip_follow_lag', Aggregator.DEFAULT_TIP_FOLLOW_LAG
+        )
+
+        self.chain_tip = None
+        self.tip_changed = asyncio.Event()
+
+    def set_chain_tip(self, height: Optional[int]):
+        """Update `chain_tip` and wake up all transforms waiting on `tip_changed`
+
+        A new event replaces the old one, so every waiter sees the change
+        no matter which transform wakes up first.
+        """
+        self.chain_tip = height
+        tip_changed = self.tip_changed
+        self.tip_changed = asyncio.Event()
+        tip_changed.set()
@@ -2,7 +2,9 @@ import argparse
 import asyncio
 import os
 import sys
+import traceback
 from time import time
+from typing import Optional, Tuple
 
 import websockets
 from jsonrpcclient.clients.websockets_client import WebSocketsClient
@@ -17,8 +19,131 @@ from . import Aggregator
 
 _AGGREGATOR = None
 
+_SCHEDULER = None
+
 _LOGGER = None
 
+# Max seconds to idle at chain tip before polling Upstream again
+TIP_WAIT_TIMEOUT = 10
+RESUBSCRIBE_DELAY = 1
+ERROR_RETRY_DELAY = 1
+
+# Min seconds between two restarts of Upstream service
+UPSTREAM_REINIT_INTERVAL = 5
+_LAST_UPSTREAM_REINIT = 0
+
+# Seconds a chain tip asked from Upstream is reused while not subscribed
+CHAIN_TIP_REFRESH_INTERVAL = 1
+_LAST_CHAIN_TIP = (None, 0)
+
+# Range of seconds to idle at chain tip in tip-follow mode, doubled on every idle round
+MIN_IDLE_BACKOFF = 0.5
+MAX_IDLE_BACKOFF = TIP_WAIT_TIMEOUT
+
+
+class Scheduler(object):
+    """Adapt batch size, prefetch depth and idle backoff of each transform to its lag
+
+    Lag is the number of blocks between chain tip and last block committed by a transform.
+    Transforms at least `catch_up_lag` blocks behind chain tip are in catch-up mode,
+    executing large batches for throughput.
+    They go back to tip-follow mode once within `tip_follow_lag` blocks, handling
+    single blocks as soon as they are on chain. The gap between both thresholds
+    prevents flapping between modes.
+
+    Properties:
+        batch_size (int): max blocks executed at once in catch-up mode
+        prefetch_depth (int): max items queued between two pipeline stages, pipelined mode only
+        catch_up_lag (int):
+        tip_follow_lag (int):
+    """
+
+    CATCH_UP = 'catch_up'
+    TIP_FOLLOW = 'tip_follow'
+    PIPELINE_STAGES = 3
+
+    def __init__(
+        self, batch_size: int, prefetch_depth: int, catch_up_lag: int, tip_follow_lag: int
+    ):
+        super(Scheduler, self).__init__()
+        self.batch_size = batch_size
+        self.prefetch_depth = prefetch_depth
+        self.catch_up_lag = catch_up_lag
+        self.tip_follow_lag = min(tip_follow_lag, catch_up_lag)
+
+        self._modes = {}
+        self._lags = {}
+        self._idle_backoffs = {}
+
+    def update(self, transform_id: str, chain_tip: Optional[int]) -> str:
+        """Measure lag of a transform to `chain_tip` and switch its mode if needed
+
+        Mode is kept as is if chain tip or cursor is not known.
+        """
+        cursor = _AGGREGATOR.cursors.get(transform_id)
+        mode = self.mode(transform_id)
+        if chain_tip is None or cursor is None:
+            return mode
+
+        lag = max(chain_tip - cursor, 0)
+        self._lags[transform_id] = lag
+        if mode == Scheduler.TIP_FOLLOW and lag >= self.catch_up_lag:
+            mode = Scheduler.CATCH_UP
+        elif mode == Scheduler.CATCH_UP and lag <= self.tip_follow_lag:
+            mode = Scheduler.TIP_FOLLOW
+        else:
+            return mode
+
+        self._modes[transform_id] = mode
+        _LOGGER.info(f'[{transform_id}] Switched to {mode} mode, {lag} blocks behind chain tip')
+        return mode
+
+    def mode(self, transform_id: str) -> str:
+        return self._modes.get(transform_id, Scheduler.TIP_FOLLOW)
+
+    def lag(self, transform_id: str) -> Optional[int]:
+        return self._lags.get(transform_id)
+
+    def batch_blocks(self, transform_id: str) -> int:
+        """Blocks to fetch and execute at once, `1` means one block with `get_block`"""
+        if self.mode(transform_id) == Scheduler.CATCH_UP and self.batch_size > 1:
+            return self.batch_size
+        return 1
+
+    def prefetch_blocks(self, transform_id: str) -> int:
+        """Max blocks fetched but not committed yet, in pipelined mode
+
+        Enough for `prefetch_depth` items of `batch_blocks()` blocks in each of
+        the fetch, execute and commit stages, so they all keep working in both modes.
+        """
+        depth = max(self.prefetch_depth, 1)
+        return Scheduler.PIPELINE_STAGES * depth * self.batch_blocks(transform_id)
+
+    def idle(self, transform_id: str) -> float:
+        """Seconds to idle after a round without new block, backoff grows in tip-follow mode"""
+        if self.mode(transform_id) == Scheduler.CATCH_UP:
+            return MIN_IDLE_BACKOFF
+        backoff = self._idle_backoffs.get(transform_id, MIN_IDLE_BACKOFF / 2) * 2
+        backoff = min(backoff, MAX_IDLE_BACKOFF)
+        self._idle_backoffs[transform_id] = backoff
+        return backoff
+
+    def active(self, transform_id: str):
+        """Reset idle backoff once a transform executed new blocks"""
+        self._idle_backoffs.pop(transform_id, None)
+
+    def status(self) -> dict:
+        return {
+            tid: {
+                'mode': self.mode(tid),
+                'lag': self.lag(tid),
+                'batch_blocks': self.batch_blocks(tid),
+                'prefetch_blocks': self.prefetch_blocks(tid),
+                'idle_backoff': self._idle_backoffs.get(tid, 0),
+            }
+            for tid in _AGGREGATOR.kernel.transforms
+        }
+
 
 @method
 async def _call(call_id: str, **kwargs):
@@ -41,6 +166,8 @@ async def _call(call_id: str, **kwargs):
         return EXIT_SERVICE
     elif call_id == 'ls_all_transform_id':
         return list(_AGGREGATOR.kernel.transforms)
+    elif call_id == 'scheduler_status':
+        return _SCHEDULER.status()
     else:
         return 'Not implemented'
 
@@ -54,102 +181,452 @@ async def initialize():
     while not warehouse_response['status']:
         warehouse_response = await rpc_client.call_async(warehouse_endpoint, call_id='ping')
 
-    # Set last_block_height value for the first time
+    # Set last_block_height value for the first time, then keep it as local cursor
     for tid in _AGGREGATOR.kernel.transforms:
-        warehouse_response = await rpc_client.call_async(
-            warehouse_endpoint,
-            call_id='api_call',
-            api_id='last_block_height',
-            api_params={'transform_id': tid},
-        )
-        if not warehouse_response['data']:
-            await rpc_client.call_async(
-                warehouse_endpoint,
-                call_id='api_call',
-                api_id='set_last_block_height',
-                api_params={
-                    'height': _AGGREGATOR.kernel.transforms[tid].START_BLOCK_HEIGHT - 1,
-                    'transform_id': tid,
-                },
-            )
-            _LOGGER.info(f'--Set initial last_block_height for transform: {tid}')
+        retry_delay = ERROR_RETRY_DELAY
+        while 1:
+            loaded, last_block_height = await load_last_block_height(tid)
+            if loaded and last_block_height is not None:
+                _AGGREGATOR.cursors[tid] = last_block_height
+                break
+            if loaded:
+                # Nothing stored in Warehouse yet, transform starts from scratch
+                initial_height = _AGGREGATOR.kernel.transforms[tid].START_BLOCK_HEIGHT - 1
+                warehouse_response = await rpc_client.call_async(
+                    warehouse_endpoint,
+                    call_id='api_call',
+                    api_id='set_last_block_height',
+                    api_params={'height': initial_height, 'transform_id': tid},
+                )
+                if warehouse_response['status'] and warehouse_response['data']:
+                    _AGGREGATOR.cursors[tid] = initial_height
+                    _LOGGER.info(f'--Set initial last_block_height for transform: {tid}')
+                    break
+            _LOGGER.warning(f'--Failed to initialize last_block_height of {tid}, retrying...')
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, MAX_IDLE_BACKOFF)
     _LOGGER.info('Initialized Aggregator service')
     _LOGGER.info('')
 
 
-async def fetch_data():
+async def load_last_block_height(transform_id: str) -> Tuple[bool, Optional[int]]:
+    """Get `last_block_height` of a transform from Warehouse
+
+    Returns:
+        tuple: (whether Warehouse answered, last block height or `None` if not stored yet)
+    """
+    warehouse_response = await rpc_client.call_async(
+        _AGGREGATOR.warehouse_endpoint,
+        call_id='api_call',
+        api_id='last_block_height',
+        api_params={'transform_id': transform_id},
+    )
+    _LOGGER.debug(f'[{transform_id}] Last block height: {warehouse_response["data"]}')
+    if not warehouse_response['status']:
+        return 0, None
+    height = warehouse_response['data']
+    if height is None or type(height) == int:
+        return 1, height
+    return 0, None
+
+
+async def resync_cursor(transform_id: str) -> Optional[int]:
+    """Reload local cursor of a transform from `last_block_height` in Warehouse
+
+    Only needed on start and after errors, cursor is advanced locally on every
+    successful commit. Cursor is left unset if Warehouse is not available,
+    so it is reloaded again before next block.
+
+    Returns:
+        int: last block height committed to Warehouse, `None` if not available
+    """
+    _, _AGGREGATOR.cursors[transform_id] = await load_last_block_height(transform_id)
+    return _AGGREGATOR.cursors[transform_id]
+
+
+async def follow_tip():
+    """Keep `chain_tip` up to date with new heights pushed by Upstream"""
     upstream_endpoint = _AGGREGATOR.upstream_endpoint
-    warehouse_endpoint = _AGGREGATOR.warehouse_endpoint
+    while 1:
+        try:
+            async for item in rpc_client.subscribe_async(
+                upstream_endpoint, call_id='subscribe_new_height', height=_AGGREGATOR.chain_tip
+            ):
+                _AGGREGATOR.set_chain_tip(item['height'])
+                _LOGGER.debug(f'New chain tip: {item["height"]}')
+        except Exception as e:
+            _LOGGER.debug(f'Chain tip subscription lost: {e}')
+
+        # Do not let transforms wait for notifications while unsubscribed
+        _AGGREGATOR.set_chain_tip(None)
+        await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+
+async def wait_for_new_tip(
+    height: Optional[int], tip_changed: asyncio.Event, timeout: float = TIP_WAIT_TIMEOUT
+):
+    """Block cheaply at chain tip until a new block is available
+
+    Wait for heights pushed by Upstream if subscribed,
+    otherwise long-poll Upstream until chain tip reaches `height`.
+
+    Args:
+        height (int): next block height needed
+        tip_changed (asyncio.Event): `Aggregator.tip_changed` taken before fetching,
+            so a height pushed in between is not missed
+        timeout (float): max seconds to wait
+    """
+    if _AGGREGATOR.chain_tip is not None:
+        _LOGGER.debug(f'--Synced to chain tip {_AGGREGATOR.chain_tip}, waiting for new block...')
+        try:
+            await asyncio.wait_for(tip_changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    elif height is not None:
+        _LOGGER.debug(f'--Waiting for block {height}...')
+        await rpc_client.call_async(
+            _AGGREGATOR.upstream_endpoint,
+            call_id='wait_for_height',
+            height=height,
+            timeout=timeout,
+        )
+
+
+async def get_chain_tip() -> Optional[int]:
+    """Chain tip pushed by Upstream, or asked from Upstream if not subscribed
+
+    Asked value is reused for `CHAIN_TIP_REFRESH_INTERVAL` seconds by all transforms.
+    """
+    global _LAST_CHAIN_TIP
+    if _AGGREGATOR.chain_tip is not None:
+        return _AGGREGATOR.chain_tip
+
+    chain_tip, asked_time = _LAST_CHAIN_TIP
+    if chain_tip is not None and time() - asked_time < CHAIN_TIP_REFRESH_INTERVAL:
+        return chain_tip
+    upstream_response = await rpc_client.call_async(
+        _AGGREGATOR.upstream_endpoint, call_id='last_block_height'
+    )
+    if upstream_response['status'] and type(upstream_response['data']) == int:
+        _LAST_CHAIN_TIP = (upstream_response['data'], time())
+        return upstream_response['data']
+    return None
+
+
+def reinit_upstream():
+    """Restart Upstream service, at most once every `UPSTREAM_REINIT_INTERVAL` seconds
+
+    All transforms see the same Upstream error at about the same time,
+    only the first one needs to restart it.
+    """
+    global _LAST_UPSTREAM_REINIT
+    if time() - _LAST_UPSTREAM_REINIT < UPSTREAM_REINIT_INTERVAL:
+        return
+    _LAST_UPSTREAM_REINIT = time()
+    console = Console(_AGGREGATOR.working_dir)
+    console.load_config()
+    console.init_services(zone_id=_AGGREGATOR.zone_id, service_id='0', always_ping=0)
+    _LOGGER.warning('--Re-initialized Upstream service')
 
+
+async def execute_batch(next_block_height: int, count: int, transform_id: str) -> int:
+    """Fetch and execute up to `count` blocks at once
+
+    Returns:
+        int: number of executed blocks
+    """
+    upstream_response = await rpc_client.call_async(
+        _AGGREGATOR.upstream_endpoint,
+        call_id='get_blocks',
+        start_height=next_block_height,
+        count=count,
+        transform_id=transform_id,
+    )
+    if not upstream_response['status'] or not upstream_response['data']:
+        _LOGGER.warning(f'--Failed to fetch blocks from {next_block_height}, trying again...')
+        return 0
+
+    blocks = upstream_response['data']
+    _LOGGER.debug(f'--Fetched {len(blocks)} blocks successfully')
+    executed = await _AGGREGATOR.kernel.execute_batch(
+        start_height=next_block_height, inputs=blocks, transform_id=transform_id,
+    )
+    _LOGGER.debug(f'--Executed blocks {next_block_height} - {next_block_height + executed - 1}')
+
+    # Run stopped before its end, Warehouse knows where exactly
+    if executed < len(blocks):
+        await resync_cursor(transform_id)
+    else:
+        _AGGREGATOR.cursors[transform_id] = next_block_height + executed - 1
+    return executed
+
+
+async def aggregate(transform_id: str) -> Tuple[int, Optional[int]]:
+    """Fetch and execute next block, or next run of blocks, of one transform
+
+    Returns:
+        tuple: (number of executed blocks, next block height if it is not on chain yet)
+    """
+    tid = transform_id
+    t = time()
+    _LOGGER.debug(f'[{tid}] Trying to fetch data...')
+    _LOGGER.debug(f'----From Upstream: {_AGGREGATOR.upstream_endpoint}')
+
+    last_block_height = _AGGREGATOR.cursors.get(tid)
+    if last_block_height is None:
+        last_block_height = await resync_cursor(tid)
+        if last_block_height is None:
+            return 0, None
+    next_block_height = last_block_height + 1
+
+    # Far behind chain tip, execute a whole run of blocks at once
+    _SCHEDULER.update(tid, await get_chain_tip())
+    batch_blocks = _SCHEDULER.batch_blocks(tid)
+    if batch_blocks > 1:
+        executed = await execute_batch(next_block_height, batch_blocks, tid)
+        agg_time = round(time() - t, 4)
+        _LOGGER.info(
+            f'[{tid}] Aggregated {executed} blocks from {next_block_height} in {agg_time}s'
+        )
+        return executed, None
+
+    upstream_response = await rpc_client.call_async(
+        _AGGREGATOR.upstream_endpoint,
+        call_id='get_block',
+        height=next_block_height,
+        transform_id=tid,
+    )
+    if upstream_response['status'] and upstream_response['data'] not in [None, -1]:
+        _LOGGER.debug(f'--Fetched data successfully')
+        _LOGGER.debug(f'--Next block height: {next_block_height}')
+        _LOGGER.debug(f'--Preparing to execute next block...')
+        executed = await _AGGREGATOR.kernel.execute(
+            height=next_block_height, input_data=upstream_response['data'], transform_id=tid,
+        )
+        if not executed:
+            await resync_cursor(tid)
+            return 0, None
+        _AGGREGATOR.cursors[tid] = next_block_height
+        agg_time = round(time() - t, 4)
+        _LOGGER.info(f'[{tid}] Aggregated block {next_block_height} in {agg_time}s')
+        return 1, None
+
+    if upstream_response['data'] == -1:
+        return 0, next_block_height
+    if upstream_response['data'] is None:
+        _LOGGER.warning(f'[{tid}] Failed to fetch block {next_block_height}, trying again...')
+    if not upstream_response['status']:
+        _LOGGER.warning(f'[{tid}] Upstream response error: {upstream_response["data"]}')
+        reinit_upstream()
+    return 0, None
+
+
+async def follow_transform(transform_id: str):
+    """Keep one transform in sync with chain, independently of other transforms
+
+    At most `max_concurrent_transforms` transforms fetch and execute blocks at the same time,
+    transforms waiting for new blocks do not hold a slot.
+    """
     while 1:
-        _LOGGER.info('New aggregation')
+        tip_changed = _AGGREGATOR.tip_changed
+        try:
+            async with _AGGREGATOR.transform_slots:
+                executed, waiting_height = await aggregate(transform_id)
+        except Exception as e:
+            _LOGGER.error(f'[{transform_id}] ERROR while aggregating')
+            _LOGGER.error(f'{str(e)}\n{traceback.format_exc()}')
+            await asyncio.sleep(ERROR_RETRY_DELAY)
+            continue
 
-        t = time()
-        for tid in _AGGREGATOR.kernel.transforms:
-            t1 = time()
-            _LOGGER.info(f'Transform ID: {tid}')
-            _LOGGER.debug(f'--Trying to fetch data...')
-            _LOGGER.debug(f'----From Upstream: {upstream_endpoint}')
-
-            warehouse_response = await rpc_client.call_async(
-                warehouse_endpoint,
-                call_id='api_call',
-                api_id='last_block_height',
-                api_params={'transform_id': tid},
+        # Transform is waiting for a block which is not on chain yet
+        if executed:
+            _SCHEDULER.active(transform_id)
+        elif waiting_height is not None:
+            await wait_for_new_tip(waiting_height, tip_changed, _SCHEDULER.idle(transform_id))
+        else:
+            await asyncio.sleep(ERROR_RETRY_DELAY)
+
+
+class PipelineReset(Exception):
+    """Raised by a pipeline stage to restart the pipeline from Warehouse cursor"""
+
+
+async def fetch_stage(transform_id: str, fetched: asyncio.Queue, committed: asyncio.Event):
+    """Fetch runs of blocks from Upstream in height order, starting after local cursor
+
+    Each queued item is `(start height, inputs)`, with `Scheduler.batch_blocks()` blocks
+    in catch-up mode and one block in tip-follow mode.
+
+    No more than `Scheduler.prefetch_blocks()` blocks are fetched ahead of local cursor,
+    so a transform switching from catch-up to tip-follow mode drains its deep pipeline first.
+    """
+    next_block_height = _AGGREGATOR.cursors[transform_id] + 1
+    while 1:
+        tip_changed = _AGGREGATOR.tip_changed
+
+        # Enough blocks in flight, wait for commit stage to catch up
+        _SCHEDULER.update(transform_id, await get_chain_tip())
+        in_flight = next_block_height - 1 - _AGGREGATOR.cursors[transform_id]
+        prefetch_room = _SCHEDULER.prefetch_blocks(transform_id) - in_flight
+        if prefetch_room <= 0:
+            committed.clear()
+            await committed.wait()
+            continue
+
+        # Far behind chain tip, fetch a whole run of blocks at once, within prefetch depth
+        batch_blocks = min(_SCHEDULER.batch_blocks(transform_id), prefetch_room)
+        if batch_blocks > 1:
+            upstream_response = await rpc_client.call_async(
+                _AGGREGATOR.upstream_endpoint,
+                call_id='get_blocks',
+                start_height=next_block_height,
+                count=batch_blocks,
+                transform_id=transform_id,
             )
-            _LOGGER.debug(f'----Last block height: {warehouse_response["data"]}')
-
-            if warehouse_response['status'] and type(warehouse_response['data']) == int:
-                next_block_height = warehouse_response['data'] + 1
-                upstream_response = await rpc_client.call_async(
-                    upstream_endpoint,
-                    call_id='get_block',
-                    height=next_block_height,
-                    transform_id=tid,
-                )
-                if upstream_response['status'] and upstream_response['data'] not in [None, -1]:
-                    _LOGGER.debug(f'--Fetched data successfully')
-                    _LOGGER.debug(f'--Next block height: {next_block_height}')
-                    _LOGGER.debug(f'--Preparing to execute next block...')
-                    await _AGGREGATOR.kernel.execute(
-                        height=next_block_height,
-                        input_data=upstream_response['data'],
-                        transform_id=tid,
-                    )
-                    _LOGGER.debug(f'--Executed block {next_block_height} successfully')
-                else:
-                    if upstream_response['data'] is None:
-                        _LOGGER.warning(
-                            f'--Failed to fetch block {next_block_height}, trying again...'
-                        )
-                    if not upstream_response['status']:
-                        _LOGGER.warning(f'--Upstream response error: {upstream_response["data"]}')
-                        console = Console(_AGGREGATOR.working_dir)
-                        console.load_config()
-                        console.init_services(
-                            zone_id=_AGGREGATOR.zone_id, service_id='0', always_ping=0
-                        )
-                        _LOGGER.warning('--Re-initialized Upstream service')
-
-            agg_time = round(time() - t1, 4)
-            _LOGGER.info(f'--Aggregated block {next_block_height} in {agg_time}s')
-
-        _LOGGER.debug('----')
-        tagg_time = round(time() - t, 4)
-        _LOGGER.debug(f'Total aggregation time: {tagg_time}s')
-        _LOGGER.debug(f'Estimated aggregation speed: {int(1/tagg_time)} blocks/s')
-        _LOGGER.info('')
-        _LOGGER.info('')
+            if upstream_response['status'] and upstream_response['data']:
+                inputs = upstream_response['data']
+                await fetched.put((next_block_height, inputs))
+                next_block_height += len(inputs)
+                continue
+        else:
+            upstream_response = await rpc_client.call_async(
+                _AGGREGATOR.upstream_endpoint,
+                call_id='get_block',
+                height=next_block_height,
+                transform_id=transform_id,
+            )
+            if upstream_response['status'] and upstream_response['data'] not in [None, -1]:
+                await fetched.put((next_block_height, [upstream_response['data']]))
+                next_block_height += 1
+                _SCHEDULER.active(transform_id)
+                continue
+            if upstream_response['data'] == -1:
+                idle_backoff = _SCHEDULER.idle(transform_id)
+                await wait_for_new_tip(next_block_height, tip_changed, idle_backoff)
+                continue
+
+        tid = transform_id
+        _LOGGER.warning(f'[{tid}] Failed to fetch block {next_block_height}, trying again...')
+        if not upstream_response['status']:
+            _LOGGER.warning(f'[{tid}] Upstream response error: {upstream_response["data"]}')
+            reinit_upstream()
+        await asyncio.sleep(ERROR_RETRY_DELAY)
+
+
+async def execute_stage(transform_id: str, fetched: asyncio.Queue, executed: asyncio.Queue):
+    """Execute fetched runs of blocks in height order, without waiting for Warehouse
+
+    Cache changes of each run are staged at once, see `BaseTransform.execute_staged_batch()`.
+    A run stopped before its end is still committed, then pipeline restarts after it.
+    """
+    transform = _AGGREGATOR.kernel.transforms[transform_id]
+    while 1:
+        start_height, inputs = await fetched.get()
+        async with _AGGREGATOR.transform_slots:
+            outputs = await transform.execute_staged_batch(start_height, inputs)
+        if not outputs:
+            raise PipelineReset(f'Failed to execute block {start_height}')
+        await executed.put((outputs, len(outputs) == len(inputs)))
+        if len(outputs) < len(inputs):
+            # Later runs were fetched for the blocks after the failed one, never execute them
+            await asyncio.Event().wait()
+
+
+async def commit_stage(transform_id: str, executed: asyncio.Queue, committed: asyncio.Event):
+    """Push outputs of executed runs of blocks to Warehouse in height order,
+    then commit their staged cache changes and advance cursor
+    """
+    transform = _AGGREGATOR.kernel.transforms[transform_id]
+    t = time()
+    while 1:
+        outputs, complete = await executed.get()
+        start_height, height = outputs[0]['height'], outputs[-1]['height']
+        if not await _AGGREGATOR.kernel.push_outputs(outputs, transform_id):
+            raise PipelineReset(f'Failed to commit blocks {start_height} - {height}')
+        transform.commit_staged(height)
+        _AGGREGATOR.cursors[transform_id] = height
+        committed.set()
+        agg_time = round(time() - t, 4)
+        if start_height == height:
+            _LOGGER.info(f'[{transform_id}] Aggregated block {height} in {agg_time}s')
+        else:
+            _LOGGER.info(
+                f'[{transform_id}] Aggregated blocks {start_height} - {height} in {agg_time}s'
+            )
+        t = time()
+        if not complete:
+            raise PipelineReset(f'Failed to execute block {height + 1}')
+
+
+async def follow_transform_pipelined(transform_id: str):
+    """Keep one transform in sync with chain through a fetch / execute / commit pipeline
+
+    Fetching block N+2, executing block N+1 and committing block N to Warehouse
+    happen at the same time. Stages are linked by queues of `pipeline_depth` items,
+    each stage handles them one by one in height order. An item is a run of
+    `batch_execution_size` blocks in catch-up mode, executed and pushed to Warehouse
+    at once like `execute_batch()`, and a single block in tip-follow mode.
+
+    Transform cache only receives changes of a block once its output is in Warehouse.
+    Any failure drops all blocks in flight with their staged cache changes,
+    pipeline restarts from cursor in Warehouse, which transform cache is in line with.
+    Only execution holds one of `max_concurrent_transforms` slots.
+    """
+    transform = _AGGREGATOR.kernel.transforms[transform_id]
+    while 1:
+        if _AGGREGATOR.cursors.get(transform_id) is None:
+            if await resync_cursor(transform_id) is None:
+                await asyncio.sleep(ERROR_RETRY_DELAY)
+                continue
+
+        fetched = asyncio.Queue(_AGGREGATOR.pipeline_depth)
+        executed = asyncio.Queue(_AGGREGATOR.pipeline_depth)
+        committed = asyncio.Event()
+        stages = [
+            asyncio.ensure_future(fetch_stage(transform_id, fetched, committed)),
+            asyncio.ensure_future(execute_stage(transform_id, fetched, executed)),
+            asyncio.ensure_future(commit_stage(transform_id, executed, committed)),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except PipelineReset as e:
+            _LOGGER.warning(f'[{transform_id}] {str(e)}, restarting pipeline...')
+        except Exception as e:
+            _LOGGER.error(f'[{transform_id}] ERROR in pipeline')
+            _LOGGER.error(f'{str(e)}\n{traceback.format_exc()}')
+        finally:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            transform.discard_staged()
+
+        await resync_cursor(transform_id)
+        await asyncio.sleep(ERROR_RETRY_DELAY)
+
+
+async def fetch_data():
+    if _AGGREGATOR.pipeline_depth:
+        follow = follow_transform_pipelined
+    else:
+        follow = follow_transform
+    await asyncio.gather(*[follow(tid) for tid in _AGGREGATOR.kernel.transforms])
 
 
 def _run_server(endpoint, working_dir, zone_id):
     global _AGGREGATOR
+    global _SCHEDULER
     global _LOGGER
     config.get_setting(working_dir)
     _LOGGER = create_logger('aggregator', zone_id)
     rpc_server.set_logger(_LOGGER)
 
     _AGGREGATOR = Aggregator(working_dir, zone_id)
+    _SCHEDULER = Scheduler(
+        batch_size=_AGGREGATOR.batch_execution_size,
+        prefetch_depth=_AGGREGATOR.pipeline_depth,
+        catch_up_lag=_AGGREGATOR.catch_up_lag,
+        tip_follow_lag=_AGGREGATOR.tip_follow_lag,
+    )
     _LOGGER.info(f'Aggregator endpoint: {endpoint}')
     _LOGGER.info(f'Aggregator zone ID: {zone_id}')
 
@@ -157,6 +634,7 @@ def _run_server(endpoint, working_dir, zone_id):
     port = int(endpoint.split(':')[1])
 
     asyncio.get_event_loop().run_until_complete(initialize())
+    asyncio.get_event_loop().create_task(follow_tip())
     asyncio.get_event_loop().create_task(fetch_data())
 
     start_server = websockets.serve(main_dispatcher, host, port)
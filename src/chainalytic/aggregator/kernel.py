@@ -18,6 +18,11 @@ class BaseKernel(object):
     Methods:
         add_transform(transform: Transform)
         execute(height: int, input_data: Dict, transform_id: str)
+        execute_transform(height: int, input_data: Dict, transform_id: str, staged: bool)
+            -> Optional[Dict]
+        push_output(output: Dict, transform_id: str) -> bool
+        push_outputs(outputs: List[Dict], transform_id: str) -> bool
+        execute_batch(start_height: int, inputs: List, transform_id: str) -> int
     """
 
     def __init__(self, working_dir: str, zone_id: str):
@@ -37,12 +42,30 @@ class BaseKernel(object):
     async def execute(self, height: int, input_data: Any, transform_id: str) -> Optional[bool]:
         """Execute transform and push output data to warehouse
         """
-        output = None
-        if transform_id in self.transforms:
-            output = await self.transforms[transform_id].execute(height, input_data)
+        output = await self.execute_transform(height, input_data, transform_id)
         if not output:
             return 0
+        return await self.push_output(output, transform_id)
+
+    async def execute_transform(
+        self, height: int, input_data: Any, transform_id: str, staged: bool = False
+    ) -> Optional[Dict]:
+        """Execute transform only, output data is not pushed to warehouse
+
+        Cache changes of a `staged` block wait for `BaseTransform.commit_staged()`.
+
+        Returns:
+            dict: transform output, `None` if block is not executed
+        """
+        if transform_id in self.transforms:
+            transform = self.transforms[transform_id]
+            if staged:
+                return await transform.execute_staged(height, input_data)
+            return await transform.execute(height, input_data)
+        return None
 
+    async def push_output(self, output: Dict, transform_id: str) -> bool:
+        """Push output data of one executed block to warehouse"""
         # Sample
         r = await rpc_client.call_async(
             self.warehouse_endpoint,
@@ -55,3 +78,23 @@ class BaseKernel(object):
             },
         )
         return r['status']
+
+    async def push_outputs(self, outputs: List[Dict], transform_id: str) -> bool:
+        """Push outputs of a run of blocks to warehouse, stop at the first failed call"""
+        for output in outputs:
+            if not await self.push_output(output, transform_id):
+                return 0
+        return 1
+
+    async def execute_batch(self, start_height: int, inputs: List[Any], transform_id: str) -> int:
+        """Execute a contiguous run of blocks and push output data to warehouse
+
+        Returns:
+            int: number of executed blocks, starting from `start_height`
+        """
+        executed = 0
+        for i, input_data in enumerate(inputs):
+            if not await self.execute(start_height + i, input_data, transform_id):
+                break
+            executed += 1
+        return executed
@@ -0,0 +1,134 @@
+from bisect import bisect_left, insort
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
+
+import msgpack
+
+Number = Union[int, float]
+
+
+class Leaderboard(object):
+    """
+    Bounded leaderboard keeping only the `capacity` entries with the highest scores
+
+    Entries sit in a fixed number of slots sorted by score in descending order,
+    ties broken by key. Updating, adding or removing one entry is a binary search
+    plus a shift of at most `capacity` slots, instead of sorting all entries again.
+    Once full, an entry scoring below the last slot is rejected right away,
+    so the leaderboard also works as a streaming top-K over any number of entries.
+
+    Each entry may carry a value, which is what `to_dict()` returns for it,
+    its score otherwise.
+
+    Properties:
+        capacity (int): max number of entries
+
+    Methods:
+        put(key: Hashable, score: Number, value: Any = None) -> bool
+        remove(key: Hashable) -> bool
+        get(key: Hashable) -> Any
+        score(key: Hashable) -> Optional[Number]
+        min_score() -> Optional[Number]
+        trim(min_score: Number) -> List[Hashable]
+        items() -> List[Tuple[Hashable, Any]]
+        to_dict() -> Dict
+        dumps() -> bytes
+        loads(data: bytes, capacity: Optional[int]) -> Leaderboard
+    """
+
+    def __init__(self, capacity: int):
+        super(Leaderboard, self).__init__()
+        self.capacity = max(int(capacity), 1)
+        # Sorted `(-score, key)` slots
+        self._slots: List[Tuple[Number, Hashable]] = []
+        # `(score, value)` by key
+        self._entries: Dict[Hashable, Tuple[Number, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def put(self, key: Hashable, score: Number, value: Any = None) -> bool:
+        """Add or update an entry
+
+        Returns:
+            bool: `False` if leaderboard is full and new entry scores below all entries
+        """
+        if key in self._entries:
+            prev_score, prev_value = self._entries[key]
+            if prev_score == score:
+                self._entries[key] = (score, value)
+                return True
+            self.remove(key)
+
+        slot = (-score, key)
+        if len(self._slots) >= self.capacity and slot >= self._slots[-1]:
+            return False
+
+        insort(self._slots, slot)
+        self._entries[key] = (score, value)
+        if len(self._slots) > self.capacity:
+            _, dropped_key = self._slots.pop()
+            self._entries.pop(dropped_key)
+        return True
+
+    def remove(self, key: Hashable) -> bool:
+        """Remove an entry, return `False` if not found"""
+        if key not in self._entries:
+            return False
+        score, _ = self._entries.pop(key)
+        slot = (-score, key)
+        del self._slots[bisect_left(self._slots, slot)]
+        return True
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[0] if entry[1] is None else entry[1]
+
+    def score(self, key: Hashable) -> Optional[Number]:
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def min_score(self) -> Optional[Number]:
+        return -self._slots[-1][0] if self._slots else None
+
+    def trim(self, min_score: Number) -> List[Hashable]:
+        """Remove all entries scoring below `min_score`, lowest first
+
+        Returns:
+            list: keys of removed entries
+        """
+        removed = []
+        while self._slots and -self._slots[-1][0] < min_score:
+            _, key = self._slots.pop()
+            self._entries.pop(key)
+            removed.append(key)
+        return removed
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Return `(key, value)` of all entries, highest score first"""
+        return [(key, self.get(key)) for _, key in self._slots]
+
+    def to_dict(self) -> Dict:
+        """Return `{key: value}` of all entries, highest score first"""
+        return dict(self.items())
+
+    def dumps(self) -> bytes:
+        entries = [[key, -neg_score, self._entries[key][1]] for neg_score, key in self._slots]
+        return msgpack.dumps([self.capacity, entries], use_bin_type=True)
+
+    @classmethod
+    def loads(cls, data: bytes, capacity: Optional[int] = None) -> 'Leaderboard':
+        """Restore a leaderboard from `dumps()` output
+
+        Args:
+            capacity (int): overrides stored capacity, lowest entries are dropped if needed
+        """
+        stored_capacity, entries = msgpack.loads(data, raw=False)
+        leaderboard = cls(capacity or stored_capacity)
+        for key, score, value in entries:
+            leaderboard.put(key, score, value)
+        return leaderboard
@@ -0,0 +1,109 @@
+from bisect import bisect_left, insort
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple, Union
+
+Number = Union[int, float]
+
+
+class OrderedIndex(object):
+    """
+    In-memory index of numeric values by key, kept sorted by value in descending order
+
+    Items are stored in a list of short sorted chunks, so finding an item costs
+    two binary searches and inserting or removing one only shifts a single chunk.
+    Reading the `k` largest items walks the first chunks only.
+    Ties are broken by key, in ascending order.
+
+    Properties:
+        chunk_size (int): max items per chunk before it is split in two
+
+    Methods:
+        get(key: Hashable) -> Optional[Number]
+        put(key: Hashable, value: Number)
+        remove(key: Hashable) -> Optional[Number]
+        top(k: int) -> List[Tuple[Hashable, Number]]
+        rank(key: Hashable) -> Optional[int]
+    """
+
+    DEFAULT_CHUNK_SIZE = 512
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super(OrderedIndex, self).__init__()
+        self.chunk_size = max(int(chunk_size), 4)
+        self._values: Dict[Hashable, Number] = {}
+        # Sorted `(-value, key)` items, split into chunks
+        self._chunks: List[List[Tuple[Number, Hashable]]] = []
+        # Last item of each chunk
+        self._maxes: List[Tuple[Number, Hashable]] = []
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._values
+
+    def __iter__(self) -> Iterator[Tuple[Hashable, Number]]:
+        """Iterate `(key, value)` of all items, largest value first"""
+        for chunk in self._chunks:
+            for neg_value, key in chunk:
+                yield key, -neg_value
+
+    def get(self, key: Hashable) -> Optional[Number]:
+        return self._values.get(key)
+
+    def put(self, key: Hashable, value: Number):
+        """Insert an item, or move it to its new position if value changed"""
+        if key in self._values:
+            if self._values[key] == value:
+                return
+            self.remove(key)
+        self._values[key] = value
+        item = (-value, key)
+
+        if not self._chunks:
+            self._chunks.append([item])
+            self._maxes.append(item)
+            return
+
+        i = min(bisect_left(self._maxes, item), len(self._chunks) - 1)
+        chunk = self._chunks[i]
+        insort(chunk, item)
+        self._maxes[i] = chunk[-1]
+
+        if len(chunk) > self.chunk_size:
+            half = len(chunk) // 2
+            self._chunks[i : i + 1] = [chunk[:half], chunk[half:]]
+            self._maxes[i : i + 1] = [chunk[half - 1], chunk[-1]]
+
+    def remove(self, key: Hashable) -> Optional[Number]:
+        """Remove an item, return its value or `None` if not found"""
+        if key not in self._values:
+            return None
+        value = self._values.pop(key)
+        item = (-value, key)
+
+        i = bisect_left(self._maxes, item)
+        chunk = self._chunks[i]
+        del chunk[bisect_left(chunk, item)]
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i]
+            del self._maxes[i]
+        return value
+
+    def top(self, k: int) -> List[Tuple[Hashable, Number]]:
+        """Return `(key, value)` of the `k` largest items, largest first"""
+        result = []
+        for chunk in self._chunks:
+            if len(result) >= k:
+                break
+            result.extend((key, -neg_value) for neg_value, key in chunk[: k - len(result)])
+        return result
+
+    def rank(self, key: Hashable) -> Optional[int]:
+        """Return 0-based position of an item in descending order, `None` if not found"""
+        if key not in self._values:
+            return None
+        item = (-self._values[key], key)
+        i = bisect_left(self._maxes, item)
+        return sum(len(chunk) for chunk in self._chunks[:i]) + bisect_left(self._chunks[i], item)
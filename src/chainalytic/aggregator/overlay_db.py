@@ -0,0 +1,93 @@
+from typing import Dict, Iterator, Optional, Tuple
+
+import plyvel
+
+
+class OverlayWriteBatch(object):
+    """Write batch of `OverlayDB`, applied to the in-memory overlay on `write()`"""
+
+    def __init__(self, overlay: 'OverlayDB'):
+        super(OverlayWriteBatch, self).__init__()
+        self._overlay = overlay
+        self._changes = {}
+
+    def put(self, key: bytes, value: bytes):
+        self._changes[key] = value
+
+    def delete(self, key: bytes):
+        self._changes[key] = None
+
+    def write(self):
+        self._overlay._changes.update(self._changes)
+        self._changes = {}
+
+
+class OverlayDB(object):
+    """
+    In-memory overlay on top of a LevelDB, exposing the subset of `plyvel.DB` API used by transforms
+
+    Reads see writes done through the overlay first, then fall back to the underlying DB.
+    Nothing reaches the underlying DB until `flush()`, which commits all changes
+    in one LevelDB write batch.
+
+    Properties:
+        db (plyvel.DB):
+
+    Methods:
+        get(key: bytes, default: Optional[bytes]) -> Optional[bytes]
+        put(key: bytes, value: bytes)
+        delete(key: bytes)
+        iterator(prefix: bytes) -> Iterator[Tuple[bytes, bytes]]
+        write_batch() -> OverlayWriteBatch
+        flush() -> int
+    """
+
+    def __init__(self, db: plyvel.DB):
+        super(OverlayDB, self).__init__()
+        self.db = db
+        # Deleted keys are kept as `None`
+        self._changes: Dict[bytes, Optional[bytes]] = {}
+
+    def get(self, key: bytes, default: Optional[bytes] = None) -> Optional[bytes]:
+        if key in self._changes:
+            value = self._changes[key]
+            return default if value is None else value
+        return self.db.get(key, default)
+
+    def put(self, key: bytes, value: bytes):
+        self._changes[key] = value
+
+    def delete(self, key: bytes):
+        self._changes[key] = None
+
+    def iterator(self, prefix: bytes = b'') -> Iterator[Tuple[bytes, bytes]]:
+        """Iterate `(key, value)` of all keys starting with `prefix`, in key order
+
+        Overlay changes are merged into underlying DB items, so this is meant for
+        occasional full loads rather than hot paths.
+        """
+        items = dict(self.db.iterator(prefix=prefix))
+        for key, value in self._changes.items():
+            if not key.startswith(prefix):
+                continue
+            if value is None:
+                items.pop(key, None)
+            else:
+                items[key] = value
+        return iter(sorted(items.items()))
+
+    def write_batch(self) -> OverlayWriteBatch:
+        return OverlayWriteBatch(self)
+
+    def flush(self) -> int:
+        """Commit all changes to the underlying DB at once, return number of changed keys"""
+        count = len(self._changes)
+        if count:
+            with self.db.write_batch() as wb:
+                for key, value in self._changes.items():
+                    if value is None:
+                        wb.delete(key)
+                    else:
+                        wb.put(key, value)
+        self._changes = {}
+        return count
@@ -0,0 +1,128 @@
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+import msgpack
+
+
+class SlidingWindow(object):
+    """
+    Latest record of each key within a window of block heights, newest first
+
+    Records are appended in height order to a deque, so adding one is O(1)
+    and expiring old heights only pops from the oldest end.
+    A key recorded again only moves its live record, the outdated one stays
+    in the deque and is skipped when it reaches the oldest end, or dropped once
+    outdated records outnumber live ones.
+
+    Properties:
+        span (int): number of heights kept, records older than `height - span` expire
+        capacity (int): max number of keys, oldest ones are dropped first, `0` for no limit
+
+    Methods:
+        push(key: Hashable, height: int, value: Any) -> bool
+        expire(height: int) -> List[Hashable]
+        get(key: Hashable) -> Any
+        items(limit: Optional[int]) -> List[Tuple[Hashable, Any]]
+        to_dict(limit: Optional[int]) -> Dict
+        dumps() -> bytes
+        loads(data: bytes, span: Optional[int], capacity: Optional[int]) -> SlidingWindow
+    """
+
+    def __init__(self, span: int, capacity: int = 0):
+        super(SlidingWindow, self).__init__()
+        self.span = int(span)
+        self.capacity = max(int(capacity), 0)
+        # `(height, key)` in height order, newest on the right
+        self._records: Deque[Tuple[int, Hashable]] = deque()
+        # `(height, value)` of live record by key
+        self._live: Dict[Hashable, Tuple[int, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._live
+
+    def push(self, key: Hashable, height: int, value: Any) -> bool:
+        """Record `value` of `key` at `height`, heights must not decrease
+
+        Returns:
+            bool: `False` if record is ignored because it is older than the newest one
+        """
+        if self._records and height < self._records[-1][0]:
+            return False
+
+        prev = self._live.get(key)
+        self._live[key] = (height, value)
+        if prev is None or prev[0] != height:
+            self._records.append((height, key))
+
+        if self.capacity:
+            while len(self._live) > self.capacity:
+                self._pop_oldest()
+        if len(self._records) > 2 * len(self._live) + 64:
+            self._records = deque(r for r in self._records if self._live[r[1]][0] == r[0])
+        return True
+
+    def expire(self, height: int) -> List[Hashable]:
+        """Drop records older than `height - span`
+
+        Returns:
+            list: keys of dropped records, oldest first
+        """
+        min_height = height - self.span
+        expired = []
+        while self._records and self._records[0][0] < min_height:
+            key = self._pop_oldest()
+            if key is not None:
+                expired.append(key)
+        return expired
+
+    def get(self, key: Hashable) -> Any:
+        record = self._live.get(key)
+        return record[1] if record else None
+
+    def items(self, limit: Optional[int] = None) -> List[Tuple[Hashable, Any]]:
+        """Return `(key, value)` of live records, newest first, up to `limit` items"""
+        result = []
+        for height, key in reversed(self._records):
+            if limit is not None and len(result) >= limit:
+                break
+            if self._live[key][0] == height:
+                result.append((key, self._live[key][1]))
+        return result
+
+    def to_dict(self, limit: Optional[int] = None) -> Dict:
+        return dict(self.items(limit))
+
+    def dumps(self) -> bytes:
+        records = [[key, height, value] for key, (height, value) in self._live.items()]
+        records.sort(key=lambda record: record[1])
+        return msgpack.dumps([self.span, self.capacity, records], use_bin_type=True)
+
+    @classmethod
+    def loads(
+        cls, data: bytes, span: Optional[int] = None, capacity: Optional[int] = None
+    ) -> 'SlidingWindow':
+        """Restore a window from `dumps()` output
+
+        Args:
+            span (int): overrides stored span
+            capacity (int): overrides stored capacity
+        """
+        stored_span, stored_capacity, records = msgpack.loads(data, raw=False)
+        window = cls(
+            stored_span if span is None else span,
+            stored_capacity if capacity is None else capacity,
+        )
+        for key, height, value in records:
+            window.push(key, height, value)
+        return window
+
+    def _pop_oldest(self) -> Optional[Hashable]:
+        """Pop oldest record, return its key if it was live"""
+        height, key = self._records.popleft()
+        if self._live[key][0] != height:
+            return None
+        self._live.pop(key)
+        return key
@@ -1,8 +1,10 @@
+from collections import deque
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import plyvel
 
+from chainalytic.aggregator.overlay_db import OverlayDB
 from chainalytic.common import config
 from chainalytic.common.util import get_child_logger
 
@@ -23,6 +25,14 @@ class BaseTransform(object):
 
     Methods:
         execute(height: int, input_data: Dict) -> Dict
+        execute_batch(start_height: int, inputs: List) -> List[Dict]
+        commit_batch() -> int
+        discard_batch()
+        execute_staged(height: int, input_data: Dict) -> Optional[Dict]
+        execute_staged_batch(start_height: int, inputs: List) -> List[Dict]
+        commit_staged(height: int) -> int
+        discard_staged()
+        reset_state()
 
     """
 
@@ -49,6 +59,10 @@ class BaseTransform(object):
 
         Path(self.transform_cache_dir).parent.mkdir(parents=1, exist_ok=1)
         self.transform_cache_db = plyvel.DB(self.transform_cache_dir, create_if_missing=True)
+        # Cache changes of last `execute_batch()`, until committed or discarded
+        self.pending_batch = None
+        # `(height, OverlayDB)` of blocks run by `execute_staged()`, until committed or discarded
+        self.staged_blocks = deque()
 
         self.logger = get_child_logger('aggregator.transform')
 
@@ -57,3 +71,121 @@ class BaseTransform(object):
 
     async def execute(self, height: int, input_data: Any) -> Dict:
         return {'height': height, 'data': {}}
+
+    async def execute_batch(self, start_height: int, inputs: List[Any]) -> List[Dict]:
+        """Execute a contiguous run of blocks, starting from `start_height`
+
+        Blocks are executed one by one with `execute()`, against an in-memory overlay
+        of `transform_cache_db`. Cache changes are kept in `pending_batch`, and only
+        committed in one LevelDB write batch by `commit_batch()`, once outputs are pushed
+        to warehouse. `discard_batch()` drops them if pushing fails.
+
+        Execution stops at the first block which has no output or fails,
+        outputs and cache changes of all blocks before it are kept.
+
+        Returns:
+            list: outputs of executed blocks, in height order
+        """
+        if self.pending_batch is not None:
+            self.logger.warning('Discarded uncommitted cache changes of previous batch')
+            self.discard_batch()
+
+        outputs = []
+        db = self.transform_cache_db
+        self.transform_cache_db = OverlayDB(db)
+        try:
+            for i, input_data in enumerate(inputs):
+                output = await self.execute(start_height + i, input_data)
+                if not output:
+                    break
+                outputs.append(output)
+        except Exception as e:
+            self.logger.error(f'ERROR while executing block {start_height + len(outputs)}')
+            self.logger.error(str(e))
+        finally:
+            self.pending_batch = self.transform_cache_db
+            self.transform_cache_db = db
+
+        return outputs
+
+    def commit_batch(self) -> int:
+        """Commit cache changes of last `execute_batch()`, return number of changed keys"""
+        overlay, self.pending_batch = self.pending_batch, None
+        return overlay.flush() if overlay is not None else 0
+
+    def discard_batch(self):
+        """Drop cache changes of last `execute_batch()` and resident state built on them"""
+        self.pending_batch = None
+        self.reset_state()
+
+    async def execute_staged(self, height: int, input_data: Any) -> Optional[Dict]:
+        """Execute one block on top of blocks executed but not committed yet
+
+        Used by pipelined aggregation, where blocks are executed before previous ones
+        are pushed to warehouse. Each block runs against its own overlay, reading through
+        the overlays of previous staged blocks. Its cache changes are kept in `staged_blocks`
+        until `commit_staged()`, so transform cache never gets ahead of warehouse.
+        """
+        db = self.transform_cache_db
+        overlay = OverlayDB(self.staged_blocks[-1][1] if self.staged_blocks else db)
+        self.transform_cache_db = overlay
+        try:
+            output = await self.execute(height, input_data)
+        finally:
+            self.transform_cache_db = db
+        if output:
+            self.staged_blocks.append((height, overlay))
+        return output
+
+    async def execute_staged_batch(self, start_height: int, inputs: List[Any]) -> List[Dict]:
+        """Execute a contiguous run of blocks on top of blocks executed but not committed yet
+
+        Same as `execute_staged()`, except the whole run shares one overlay,
+        staged under its last height. So cache changes of the run are committed at once,
+        like `execute_batch()`. Execution stops at the first block which has no output or fails.
+
+        Returns:
+            list: outputs of executed blocks, in height order
+        """
+        db = self.transform_cache_db
+        overlay = OverlayDB(self.staged_blocks[-1][1] if self.staged_blocks else db)
+        self.transform_cache_db = overlay
+        outputs = []
+        try:
+            for i, input_data in enumerate(inputs):
+                output = await self.execute(start_height + i, input_data)
+                if not output:
+                    break
+                outputs.append(output)
+        except Exception as e:
+            self.logger.error(f'ERROR while executing block {start_height + len(outputs)}')
+            self.logger.error(str(e))
+        finally:
+            self.transform_cache_db = db
+        if outputs:
+            self.staged_blocks.append((outputs[-1]['height'], overlay))
+        return outputs
+
+    def commit_staged(self, height: int) -> int:
+        """Commit cache changes of staged blocks up to `height`, return number of changed keys"""
+        count = 0
+        while self.staged_blocks and self.staged_blocks[0][0] <= height:
+            _, overlay = self.staged_blocks.popleft()
+            count += overlay.flush()
+            if self.staged_blocks:
+                # Oldest overlay always sits on transform cache itself
+                self.staged_blocks[0][1].db = overlay.db
+        return count
+
+    def discard_staged(self):
+        """Drop cache changes of all staged blocks and resident state built on them"""
+        self.staged_blocks.clear()
+        self.reset_state()
+
+    def reset_state(self):
+        """Drop resident state loaded from transform cache, e.g. in-memory indexes
+
+        Called when cache changes are discarded, so state is reloaded from transform cache
+        on next block. Implemented by transforms keeping such state.
+        """
+        pass
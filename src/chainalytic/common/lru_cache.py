@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache(object):
+    """
+    A bounded, thread-safe least-recently-used cache with hit/miss counters
+
+    Properties:
+        capacity (int): max number of entries, `0` disables caching
+        hits (int):
+        misses (int):
+
+    Methods:
+        get(key: Hashable) -> Optional[Any]
+        put(key: Hashable, value: Any)
+        pop(key: Hashable) -> Optional[Any]
+        clear()
+        stats() -> Dict
+    """
+
+    def __init__(self, capacity: int):
+        super(LRUCache, self).__init__()
+        self.capacity = max(int(capacity), 0)
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return cached value and mark it as recently used, `None` on cache miss."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        """Insert or refresh one entry, evict the least recently used one if cache is full."""
+        if not self.capacity:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'capacity': self.capacity,
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0,
+        }
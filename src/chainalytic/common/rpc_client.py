@@ -1,7 +1,8 @@
 import argparse
 import asyncio
+import json
 import traceback
-from typing import Dict, List, Optional, Set, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
 
 import websockets
 from jsonrpcclient.clients.http_client import HTTPClient
@@ -31,6 +32,25 @@ async def call_async(endpoint: str, **kwargs) -> Dict:
         return {'status': FAILED_STATUS, 'data': f'{str(e)}\n{traceback.format_exc()}'}
 
 
+async def subscribe_async(endpoint: str, **kwargs) -> AsyncIterator:
+    """Subscribe to a streaming call of one Chainalytic service
+
+    Yield `params` of every notification pushed by the service.
+    Connection errors are raised, caller is responsible for reconnecting.
+
+    Example:
+        async for item in subscribe_async('localhost:5500', call_id='subscribe_new_height'):
+            print(item['height'])
+    """
+    async with websockets.connect(f"ws://{endpoint}") as ws:
+        await ws.send(json.dumps({'jsonrpc': '2.0', 'method': '_call', 'params': kwargs, 'id': 1}))
+        response = json.loads(await ws.recv())
+        if 'error' in response:
+            raise Exception(f'Failed to subscribe: {response["error"]}')
+        async for message in ws:
+            yield json.loads(message)['params']
+
+
 def call(endpoint: str, **kwargs) -> Dict:
     """Use this function to communicate with all Chainalytic services
 
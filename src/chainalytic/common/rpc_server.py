@@ -1,7 +1,10 @@
+import json
 import sys
+import traceback
 from logging import Logger
-from typing import Dict, List, Optional, Set, Tuple
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 
+import websockets
 from jsonrpcserver import async_dispatch as dispatch
 
 from chainalytic.common import util
@@ -10,14 +13,73 @@ EXIT_SERVICE = '__EXIT_SERVICE__'
 
 _LOGGER = None
 
+# Streaming calls, `call_id` -> async generator function
+_SUBSCRIPTIONS = {}
+# Close frames carry at most 123 bytes of reason
+MAX_CLOSE_REASON_BYTES = 123
+
 
 def set_logger(logger: Logger):
     global _LOGGER
     _LOGGER = logger
 
 
+def subscription(call_id: str):
+    """Register an async generator function serving `call_id` as a stream
+
+    Subscriber receives one normal JSON-RPC response first,
+    then one JSON-RPC notification per item yielded by the generator,
+    until either side closes the connection. If the generator fails,
+    connection is closed with an error, which `rpc_client.subscribe_async()` raises.
+    """
+
+    def decorator(func: Callable[..., AsyncIterator]):
+        _SUBSCRIPTIONS[call_id] = func
+        return func
+
+    return decorator
+
+
+def _parse_subscription(request: str) -> Optional[Tuple]:
+    if not _SUBSCRIPTIONS:
+        return None
+    try:
+        request = json.loads(request)
+        params = dict(request['params'])
+        call_id = params.pop('call_id')
+    except Exception:
+        return None
+    if call_id in _SUBSCRIPTIONS:
+        return request.get('id'), call_id, params
+    return None
+
+
+async def _serve_subscription(websocket, request_id, call_id: str, params: dict):
+    show_call_info(call_id, params)
+    await websocket.send(json.dumps({'jsonrpc': '2.0', 'result': call_id, 'id': request_id}))
+    try:
+        async for item in _SUBSCRIPTIONS[call_id](**params):
+            await websocket.send(json.dumps({'jsonrpc': '2.0', 'method': call_id, 'params': item}))
+    except websockets.ConnectionClosed:
+        if _LOGGER:
+            _LOGGER.debug(f'Subscriber of {call_id} disconnected')
+    except Exception as e:
+        if _LOGGER:
+            _LOGGER.error(f'ERROR while serving subscription {call_id}')
+            _LOGGER.error(f'{str(e)}\n{traceback.format_exc()}')
+        # Internal error close code, so subscriber sees a failure instead of a clean end
+        reason = f'{type(e).__name__}: {e}'.encode()[:MAX_CLOSE_REASON_BYTES]
+        await websocket.close(code=1011, reason=reason.decode(errors='ignore'))
+
+
 async def main_dispatcher(websocket, path):
-    response = await dispatch(await websocket.recv())
+    request = await websocket.recv()
+    sub = _parse_subscription(request)
+    if sub:
+        await _serve_subscription(websocket, *sub)
+        return
+
+    response = await dispatch(request)
     if response.wanted:
         await websocket.send(str(response))
         if hasattr(response, 'result'):
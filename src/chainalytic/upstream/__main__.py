@@ -2,18 +2,34 @@
 Sample service calls
 
 from chainalytic.common import rpc_client
-rpc_client.call('localhost:5500', call_id='get_block', height=10000000)
+rpc_client.call('localhost:5500', call_id='get_block', height=10000000, transform_id='stake_history')
+rpc_client.call('localhost:5500', call_id='get_blocks', start_height=10000000, count=100, transform_id='stake_history')
+rpc_client.call('localhost:5500', call_id='block_cache_stats')
+rpc_client.call('localhost:5500', call_id='client_stats')
+rpc_client.call('localhost:5500', call_id='wait_for_height', height=10000000, timeout=10)
+
+Subscribe to new chain heights, pushed as soon as chain tip advances
+
+async for item in rpc_client.subscribe_async('localhost:5500', call_id='subscribe_new_height'):
+    print(item['height'])
+
+Historical backfill mode, decode blocks with a pool of worker processes
+and merge block digests into the Upstream digest store, in height order
+
+python -m chainalytic.upstream --working_dir . --zone_id public-icon --backfill_start 1 --backfill_end 1000000 --workers 8
 
 """
 import argparse
 import asyncio
+import multiprocessing
 import os
 import time
+from collections import deque
 
 import websockets
 from jsonrpcserver import method
 
-from chainalytic.common import rpc_server, config
+from chainalytic.common import rpc_server, config, zone_manager
 from chainalytic.common.rpc_server import EXIT_SERVICE, main_dispatcher, show_call_info
 from chainalytic.common.util import create_logger
 
@@ -22,6 +38,13 @@ from . import Upstream
 _UPSTREAM = None
 _LOGGER = None
 
+# Data feeder of each backfill worker process
+_BACKFILL_FEEDER = None
+BACKFILL_CHUNK_SIZE = 1000
+
+# Upper bound of `wait_for_height` long-polling, in seconds
+MAX_WAIT_TIMEOUT = 60
+
 
 @method
 async def _call(call_id: str, **kwargs):
@@ -46,12 +69,36 @@ async def _call(call_id: str, **kwargs):
         height = params['height']
         transform_id = params['transform_id']
         return await _UPSTREAM.data_feeder.get_block(height, transform_id)
+    elif call_id == 'get_blocks':
+        start_height = params['start_height']
+        count = params['count']
+        transform_id = params['transform_id']
+        return await _UPSTREAM.data_feeder.get_blocks(start_height, count, transform_id)
     elif call_id == 'last_block_height':
         return await _UPSTREAM.data_feeder.last_block_height()
+    elif call_id == 'wait_for_height':
+        height = params['height']
+        timeout = min(params.get('timeout', MAX_WAIT_TIMEOUT), MAX_WAIT_TIMEOUT)
+        return await _UPSTREAM.data_feeder.wait_for_height(height, timeout)
+    elif call_id == 'block_cache_stats':
+        return await _UPSTREAM.data_feeder.block_cache_stats()
+    elif call_id == 'client_stats':
+        return await _UPSTREAM.data_feeder.client_stats()
     else:
         return f'Not implemented'
 
 
+@rpc_server.subscription('subscribe_new_height')
+async def _subscribe_new_height(height: int = None, **kwargs):
+    """Push `{'height': int}` every time chain tip advances above the last pushed height
+
+    Current tip is pushed first, or only once tip is above `height` if it is given.
+    """
+    while 1:
+        height = await _UPSTREAM.data_feeder.wait_new_tip(height)
+        yield {'height': height}
+
+
 def _run_server(endpoint, working_dir, zone_id):
     global _UPSTREAM
     global _LOGGER
@@ -71,13 +118,104 @@ def _run_server(endpoint, working_dir, zone_id):
     _LOGGER.info('Exited Upstream')
 
 
+def _init_backfill_worker(working_dir, zone_id):
+    global _BACKFILL_FEEDER
+    config.set_working_dir(working_dir)
+    mods = zone_manager.load_zone(zone_id, working_dir)['upstream']
+    _BACKFILL_FEEDER = mods['data_feeder'].DataFeeder(working_dir, zone_id, backfill_worker=1)
+
+
+def _build_backfill_chunk(start_height, end_height, source):
+    return _BACKFILL_FEEDER.build_backfill_chunk(start_height, end_height, source)
+
+
+def _run_backfill(working_dir, zone_id, start_height, end_height, workers):
+    """Build digests of `[start_height, end_height)` with a pool of worker processes
+
+    Each worker owns a height range at a time and its own chain read handle,
+    unless chain data can only be read by this process (see `read_backfill_chunk()`).
+    Results are merged back into the digest store in height order.
+    Refuses to run while another process, e.g. the Upstream server, holds the store writer lock.
+    """
+    global _LOGGER
+    config.get_setting(working_dir)
+    _LOGGER = create_logger('upstream_backfill', zone_id)
+
+    upstream = Upstream(working_dir, zone_id)
+    feeder = upstream.data_feeder
+    store = feeder.digest_store
+    if not store:
+        _LOGGER.error('Digest store is disabled, set `digest_store_dir` to run backfill')
+        return
+    if not store.has_writer_lock():
+        _LOGGER.error(
+            'Digest store is locked by another process, '
+            'stop the running Upstream server or backfill first'
+        )
+        return
+
+    last_height = feeder.tip_tracker.refresh()
+    if last_height is None:
+        _LOGGER.error('Failed to get last block height from chain')
+        return
+    end_height = last_height + 1 if end_height is None else min(end_height, last_height + 1)
+    _LOGGER.info(f'Backfilling blocks {start_height} - {end_height - 1} with {workers} workers')
+
+    chunks = (
+        (h, min(h + BACKFILL_CHUNK_SIZE, end_height))
+        for h in range(start_height, end_height, BACKFILL_CHUNK_SIZE)
+    )
+    t = time.time()
+    total = 0
+    with multiprocessing.Pool(
+        workers, initializer=_init_backfill_worker, initargs=(working_dir, zone_id)
+    ) as pool:
+        # Bounded number of in-flight chunks, results are consumed in submission order
+        pending = deque()
+        while 1:
+            while len(pending) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                if all(store.has(h) for h in range(*chunk)):
+                    continue
+                source = feeder.read_backfill_chunk(*chunk)
+                pending.append(
+                    (chunk, pool.apply_async(_build_backfill_chunk, (chunk[0], chunk[1], source)))
+                )
+            if not pending:
+                break
+
+            chunk, result = pending.popleft()
+            digests = result.get()
+            for height, digest in digests:
+                store.put(height, digest)
+            total += len(digests)
+            if len(digests) < chunk[1] - chunk[0]:
+                _LOGGER.warning(f'Chunk {chunk[0]} - {chunk[1] - 1} is incomplete')
+            _LOGGER.info(
+                f'--Backfilled up to block {chunk[1] - 1}, '
+                f'{int(total / max(time.time() - t, 1e-6))} blocks/s'
+            )
+
+    _LOGGER.info(f'Backfilled {total} blocks in {round(time.time() - t, 4)}s')
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Chainalytic Upstream server')
     parser.add_argument('--endpoint', type=str, help='Endpoint of Upstream server')
     parser.add_argument('--working_dir', type=str, help='Current working directory')
     parser.add_argument('--zone_id', type=str, help='Zone ID')
+    parser.add_argument('--backfill_start', type=int, help='Run historical backfill from this height')
+    parser.add_argument('--backfill_end', type=int, help='Backfill end height, exclusive, default is chain tip')
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(), help='Number of backfill worker processes'
+    )
     args = parser.parse_args()
     endpoint = args.endpoint
     working_dir = args.working_dir if args.working_dir != '.' else os.getcwd()
     zone_id = args.zone_id
-    _run_server(endpoint, working_dir, zone_id)
+    if args.backfill_start is not None:
+        _run_backfill(working_dir, zone_id, args.backfill_start, args.backfill_end, args.workers)
+    else:
+        _run_server(endpoint, working_dir, zone_id)
@@ -1,10 +1,17 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Collection, Dict, List, Optional, Set, Tuple
+from typing import Any, Callable, Collection, Dict, List, Optional, Set, Tuple
 
 import plyvel
 
 from chainalytic.common import config, zone_manager
+from chainalytic.common.lru_cache import LRUCache
 from chainalytic.common.util import get_child_logger
+from chainalytic.upstream.digest_store import DigestStore
+from chainalytic.upstream.tip_tracker import TipTracker
 
 
 class BaseDataFeeder(object):
@@ -16,20 +23,88 @@ class BaseDataFeeder(object):
         zone_id (str):
         zone (dict):
         direct_db_access (bool):
+        backfill_worker (bool): instance only decodes blocks in a backfill worker process
+        block_cache (LRUCache): decoded block data keyed by height, shared by all transforms
+        digest_store (DigestStore): persistent block digests, `None` if disabled
+        prefetch_window (int): number of heights decoded ahead in background, `0` to disable
+        last_requested_heights (dict): last requested height of each transform
+        tip_tracker (TipTracker): cached chain tip height
 
     Methods:
-        get_block(height: int) -> Optional[Dict]
+        get_block(height: int, transform_id: str) -> Optional[Dict]
+        get_blocks(start_height: int, count: int, transform_id: str) -> List
+        last_block_height() -> Optional[int]
+        block_cache_stats() -> Dict
+        client_stats() -> Dict
+        schedule_prefetch(height: int, transform_id: str)
+        wait_prefetched(height: int)
+        run_blocking(func: Callable, *args) -> Any
+        wait_new_tip(known_height: Optional[int]) -> Optional[int]
+        wait_for_height(height: int, timeout: float) -> Optional[int]
+        read_backfill_chunk(start_height: int, end_height: int) -> Optional[List]
+        build_backfill_chunk(start_height: int, end_height: int, source: Optional[List]) -> List
 
     """
 
-    def __init__(self, working_dir: str, zone_id: str):
+    MAX_BLOCKS_PER_CALL = 1000
+    DEFAULT_BLOCK_CACHE_SIZE = 1000
+    DEFAULT_PREFETCH_WORKERS = 4
+    DEFAULT_CHAIN_READ_WORKERS = 4
+    DEFAULT_CHAIN_TIP_TTL = 1
+
+    def __init__(self, working_dir: str, zone_id: str, backfill_worker: bool = False):
         super(BaseDataFeeder, self).__init__()
         self.working_dir = working_dir
         self.zone_id = zone_id
+        self.backfill_worker = backfill_worker
         self.zone = zone_manager.get_zone(working_dir, zone_id)
         self.direct_db_access = self.zone['direct_db_access']
 
+        setting = config.get_setting(working_dir)
+        self.block_cache = LRUCache(
+            setting.get('block_cache_size', BaseDataFeeder.DEFAULT_BLOCK_CACHE_SIZE)
+        )
+
+        # Backfill workers only decode, digests are merged into the store by parent process
+        if setting.get('digest_store_dir') and not backfill_worker:
+            digest_store_dir = Path(working_dir, setting['digest_store_dir'].format(zone_id=zone_id))
+            self.digest_store = DigestStore(digest_store_dir.as_posix(), exclusive=1)
+        else:
+            self.digest_store = None
+
+        self.prefetch_window = setting.get('prefetch_window', 0)
+        self.last_requested_heights = {}
+        self._prefetching = {}
+        self._prefetch_lock = threading.RLock()
+        if self.prefetch_window and not backfill_worker:
+            self._prefetch_executor = ThreadPoolExecutor(
+                max_workers=setting.get('prefetch_workers', BaseDataFeeder.DEFAULT_PREFETCH_WORKERS),
+                thread_name_prefix='prefetch',
+            )
+        else:
+            self._prefetch_executor = None
+
+        # Blocking chain reads (LevelDB, citizen node JSON-RPC) run here, not on the event loop
+        self._chain_read_executor = ThreadPoolExecutor(
+            max_workers=setting.get(
+                'chain_read_workers', BaseDataFeeder.DEFAULT_CHAIN_READ_WORKERS
+            ),
+            thread_name_prefix='chain_read',
+        )
+
+        self.tip_tracker = TipTracker(
+            self._get_last_block_height,
+            setting.get('chain_tip_ttl', BaseDataFeeder.DEFAULT_CHAIN_TIP_TTL),
+        )
+        self._tip_watcher = None
+        self._tip_changed = None
+
         self.logger = get_child_logger('upstream.data_feeder')
+        if self.digest_store and not self.digest_store.has_writer_lock():
+            self.logger.warning(
+                'Digest store is locked by another process, e.g. a running backfill, '
+                'new digests are not stored until it exits'
+            )
 
     async def get_block(self, height: int, transform_id: str) -> Optional[Collection]:
         """Retrieve standard block data from chain
@@ -37,7 +112,165 @@ class BaseDataFeeder(object):
         block = {}
         return block
 
+    async def get_blocks(self, start_height: int, count: int, transform_id: str) -> List:
+        """Retrieve standard data of a contiguous range of blocks
+
+        Blocks are returned in height order, starting from `start_height`.
+        The list stops at the first block which is not available yet (`None` or `-1`),
+        so it may contain less than `count` items.
+        """
+        blocks = []
+        for height in range(start_height, start_height + min(count, self.MAX_BLOCKS_PER_CALL)):
+            block = await self.get_block(height, transform_id)
+            if block in [None, -1]:
+                break
+            blocks.append(block)
+        return blocks
+
     async def last_block_height(self) -> Optional[int]:
         """Get last block height from chain
         """
         return 1
+
+    def _get_last_block_height(self) -> Optional[int]:
+        """Read last block height from chain, used by `tip_tracker`
+
+        Implemented by zones, blocking calls are fine here.
+        """
+        return None
+
+    async def block_cache_stats(self) -> Dict:
+        """Get usage counters of the shared block cache
+        """
+        return self.block_cache.stats()
+
+    async def run_blocking(self, func: Callable, *args) -> Any:
+        """Run one blocking chain read in the dedicated executor
+
+        Keeps the Upstream event loop free to serve other requests, e.g. `ping`,
+        while a slow citizen node call is in progress.
+        """
+        return await asyncio.get_event_loop().run_in_executor(
+            self._chain_read_executor, functools.partial(func, *args)
+        )
+
+    async def client_stats(self) -> Dict:
+        """Get request counters of the chain client, if any
+        """
+        return {}
+
+    async def _watch_tip(self):
+        """Shared tip watcher, poll chain tip every `chain_tip_ttl` seconds and wake up waiters
+        """
+        last_height = self.tip_tracker.height
+        while 1:
+            try:
+                height = await self.run_blocking(self.tip_tracker.refresh)
+            except Exception as e:
+                self.logger.error(f'_watch_tip(): Failed to refresh chain tip: {e}')
+                height = None
+            if height is not None and (last_height is None or height > last_height):
+                last_height = height
+                async with self._tip_changed:
+                    self._tip_changed.notify_all()
+            await asyncio.sleep(max(self.tip_tracker.ttl, 0.1))
+
+    async def wait_new_tip(self, known_height: Optional[int]) -> Optional[int]:
+        """Wait until chain tip is above `known_height`, then return the new tip height
+
+        Return current tip immediately if `known_height` is `None`.
+        All waiters share one tip watcher, which is started on first call.
+        """
+        if self._tip_watcher is None:
+            self._tip_changed = asyncio.Condition()
+            self._tip_watcher = asyncio.ensure_future(self._watch_tip())
+
+        def is_above_known_height():
+            height = self.tip_tracker.height
+            return height is not None and (known_height is None or height > known_height)
+
+        async with self._tip_changed:
+            await self._tip_changed.wait_for(is_above_known_height)
+        return self.tip_tracker.height
+
+    async def wait_for_height(self, height: int, timeout: float) -> Optional[int]:
+        """Long-poll until chain tip reaches `height`, for at most `timeout` seconds
+
+        Returns:
+            int: current tip height, may still be below `height` if timed out
+            None: chain tip is unknown
+        """
+        try:
+            return await asyncio.wait_for(self.wait_new_tip(height - 1), timeout)
+        except asyncio.TimeoutError:
+            return self.tip_tracker.height
+
+    def _prefetch_block(self, height: int) -> bool:
+        """Decode one block into `block_cache`, run in prefetch threads
+
+        Implemented by zones which support prefetching.
+
+        Returns:
+            bool: `False` if the block is not available on chain yet
+        """
+        return False
+
+    def _on_prefetched(self, height: int, future: Future):
+        with self._prefetch_lock:
+            self._prefetching.pop(height, None)
+
+    def schedule_prefetch(self, height: int, transform_id: str):
+        """Keep `prefetch_window` heights after the last requested one decoded in background
+
+        Nothing is prefetched above the tip cached by `tip_tracker`, so heights not on chain yet
+        never cost a chain read. Tip is not refreshed here, it is kept up to date by
+        `last_block_height()` and the tip watcher.
+        """
+        if not self._prefetch_executor:
+            return
+        self.last_requested_heights[transform_id] = height
+
+        tip = self.tip_tracker.height
+        if tip is None:
+            return
+        with self._prefetch_lock:
+            for h in range(height + 1, min(height + self.prefetch_window, tip) + 1):
+                if h in self._prefetching or h in self.block_cache:
+                    continue
+                future = self._prefetch_executor.submit(self._prefetch_block, h)
+                self._prefetching[h] = future
+                future.add_done_callback(lambda f, h=h: self._on_prefetched(h, f))
+
+    async def wait_prefetched(self, height: int):
+        """Wait for in-flight prefetching of one height, if any, to avoid decoding it twice
+        """
+        future = self._prefetching.get(height)
+        if future:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                pass
+
+    def read_backfill_chunk(self, start_height: int, end_height: int) -> Optional[List]:
+        """Read source data of a height range in backfill parent process
+
+        Used when chain data can only be read by one process, e.g. a locked LevelDB.
+        `end_height` is exclusive.
+
+        Returns:
+            list: source data passed to `build_backfill_chunk()` in a worker process
+            None: workers read the range by themselves
+        """
+        return None
+
+    def build_backfill_chunk(
+        self, start_height: int, end_height: int, source: Optional[List]
+    ) -> List[Tuple[int, Any]]:
+        """Build digests of a height range, run in backfill worker processes
+
+        `end_height` is exclusive.
+
+        Returns:
+            list: `(height, digest)` in height order, stop at the first unavailable height
+        """
+        return []
@@ -0,0 +1,192 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import msgpack
+
+
+class DigestStore(object):
+    """
+    Append-only on-disk store of per-height block digests
+
+    Digests are `MessagePack` encoded and appended to `data.bin`.
+    `index.bin` is a fixed-width height index, record `i` holds `(offset, length)`
+    of the digest at height `i`, a zero length record means the height is not stored yet.
+    Both files are memory-mapped for reads, so sequential backfills read at disk bandwidth.
+    Appends hold an exclusive `flock` on `data.bin`, so several processes can write safely.
+
+    An exclusive store also takes the writer lock, a `flock` on `writer.lock` held until closed,
+    so e.g. a backfill run and an Upstream server never write the same store at once.
+    It is read-only while another process holds the writer lock.
+
+    Properties:
+        store_dir (str):
+        index_path (str):
+        data_path (str):
+        exclusive (bool): only write while holding the writer lock
+
+    Methods:
+        get(height: int) -> Optional[Any]
+        put(height: int, digest: Any) -> bool
+        has(height: int) -> bool
+        lock_writer() -> bool
+        has_writer_lock() -> bool
+        iter_range(start_height: int, end_height: int) -> Iterator[Tuple[int, Any]]
+        stats() -> Dict
+        close()
+    """
+
+    INDEX_RECORD = struct.Struct('>QI')
+
+    def __init__(self, store_dir: str, exclusive: bool = False):
+        super(DigestStore, self).__init__()
+        self.store_dir = store_dir
+        Path(store_dir).mkdir(parents=1, exist_ok=1)
+        self.index_path = Path(store_dir, 'index.bin').as_posix()
+        self.data_path = Path(store_dir, 'data.bin').as_posix()
+
+        Path(self.index_path).touch()
+        self._index_file = open(self.index_path, 'r+b')
+        self._data_file = open(self.data_path, 'a+b')
+        self._index_map = None
+        self._data_map = None
+        self._lock = threading.RLock()
+
+        self.exclusive = exclusive
+        self._writer_lock_file = None
+        self._writer_locked = 0
+        if exclusive:
+            self._writer_lock_file = open(Path(store_dir, 'writer.lock').as_posix(), 'a+b')
+            self.lock_writer()
+
+    def _remap(self):
+        for m in [self._index_map, self._data_map]:
+            if m is not None:
+                m.close()
+        self._index_map = self._map_file(self._index_file)
+        self._data_map = self._map_file(self._data_file)
+
+    @staticmethod
+    def _map_file(f) -> Optional[mmap.mmap]:
+        f.seek(0, 2)
+        if not f.tell():
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read_record(self, height: int) -> Tuple[int, int]:
+        """Return `(offset, length)` of one height, `length` is 0 if not stored."""
+        pos = height * DigestStore.INDEX_RECORD.size
+        end = pos + DigestStore.INDEX_RECORD.size
+        if height < 0:
+            return 0, 0
+        if self._index_map is None or len(self._index_map) < end:
+            # Only remap if the index file really grew since last mapping
+            if os.fstat(self._index_file.fileno()).st_size < end:
+                return 0, 0
+            self._remap()
+        return DigestStore.INDEX_RECORD.unpack_from(self._index_map, pos)
+
+    def lock_writer(self) -> bool:
+        """Try to take the writer lock of an exclusive store, without blocking
+
+        Returns:
+            bool: `True` if the lock is held by this store
+        """
+        with self._lock:
+            if self._writer_locked or self._writer_lock_file is None:
+                return self._writer_locked
+            try:
+                fcntl.flock(self._writer_lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            self._writer_locked = 1
+            return 1
+
+    def has_writer_lock(self) -> bool:
+        return self._writer_locked
+
+    def has(self, height: int) -> bool:
+        with self._lock:
+            return self._read_record(height)[1] > 0
+
+    def get(self, height: int) -> Optional[Any]:
+        with self._lock:
+            offset, length = self._read_record(height)
+            if not length:
+                return None
+            if self._data_map is None or len(self._data_map) < offset + length:
+                self._remap()
+            return msgpack.loads(self._data_map[offset : offset + length], raw=False)
+
+    def put(self, height: int, digest: Any) -> bool:
+        """Append digest of one height, already stored heights are never overwritten.
+
+        Data is flushed before its index record, so an interrupted write
+        leaves at most some unreferenced bytes at the end of `data.bin`.
+        The whole sequence runs under the file lock, otherwise another process
+        may append in between and the index record would point into its digest.
+        An exclusive store skips the write while another process holds the writer lock.
+        """
+        if height < 0:
+            return 0
+        if self.exclusive and not self.lock_writer():
+            return 0
+        encoded = msgpack.dumps(digest, use_bin_type=True)
+        with self._lock:
+            fcntl.flock(self._data_file.fileno(), fcntl.LOCK_EX)
+            try:
+                if self._read_record(height)[1] > 0:
+                    return 0
+
+                self._data_file.seek(0, 2)
+                offset = self._data_file.tell()
+                self._data_file.write(encoded)
+                self._data_file.flush()
+
+                # Writing past the end of index file leaves zero-filled records,
+                # aka missing heights
+                self._index_file.seek(height * DigestStore.INDEX_RECORD.size)
+                self._index_file.write(DigestStore.INDEX_RECORD.pack(offset, len(encoded)))
+                self._index_file.flush()
+            finally:
+                fcntl.flock(self._data_file.fileno(), fcntl.LOCK_UN)
+        return 1
+
+    def iter_range(self, start_height: int, end_height: int) -> Iterator[Tuple[int, Any]]:
+        """Yield `(height, digest)` in height order, stop at the first missing height.
+
+        `end_height` is exclusive.
+        """
+        for height in range(start_height, end_height):
+            digest = self.get(height)
+            if digest is None:
+                return
+            yield height, digest
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._remap()
+            index_size = len(self._index_map) if self._index_map is not None else 0
+            data_size = len(self._data_map) if self._data_map is not None else 0
+        return {
+            'index_records': index_size // DigestStore.INDEX_RECORD.size,
+            'data_bytes': data_size,
+        }
+
+    def close(self):
+        with self._lock:
+            for m in [self._index_map, self._data_map]:
+                if m is not None:
+                    m.close()
+            self._index_map = self._data_map = None
+            self._index_file.close()
+            self._data_file.close()
+            if self._writer_lock_file is not None:
+                # Closing the file releases the writer lock
+                self._writer_lock_file.close()
+                self._writer_lock_file = None
+                self._writer_locked = 0
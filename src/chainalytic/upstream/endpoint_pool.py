@@ -0,0 +1,152 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class EndpointPool(object):
+    """
+    Spread blocking client calls over several equivalent chain client endpoints
+
+    Every call goes to the least busy endpoint, ties are broken by lowest average latency.
+    If it does not respond within `hedge_delay` seconds, the same call is also sent
+    to the next best endpoint and the first successful result wins.
+    A failed call is retried on the remaining endpoints, failed endpoints
+    are avoided for `failure_cooldown` seconds.
+
+    Properties:
+        endpoints (list):
+        hedge_delay (float): seconds before hedging a slow call, `0` to disable
+        failure_cooldown (float):
+
+    Methods:
+        call(func: Callable[[str], Any]) -> Any
+        pick(exclude: List[str]) -> Optional[str]
+        stats() -> Dict
+        close()
+    """
+
+    LATENCY_SMOOTHING = 0.3
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        hedge_delay: float = 0,
+        failure_cooldown: float = 5,
+        max_workers: int = 16,
+    ):
+        super(EndpointPool, self).__init__()
+        assert endpoints, 'At least one endpoint is required'
+        self.endpoints = list(endpoints)
+        self.hedge_delay = hedge_delay
+        self.failure_cooldown = failure_cooldown
+
+        self._lock = threading.Lock()
+        self._in_flight = {e: 0 for e in self.endpoints}
+        self._latency = {e: 0.0 for e in self.endpoints}
+        self._down_until = {e: 0.0 for e in self.endpoints}
+        self._requests = {e: 0 for e in self.endpoints}
+        self._failures = {e: 0 for e in self.endpoints}
+        self._hedges = {e: 0 for e in self.endpoints}
+
+        if hedge_delay and len(self.endpoints) > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix='endpoint_pool'
+            )
+        else:
+            self._executor = None
+
+    def pick(self, exclude: List[str] = ()) -> Optional[str]:
+        """Best endpoint which is not in `exclude`, endpoints in cooldown come last"""
+        now = time()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            return min(
+                candidates,
+                key=lambda e: (self._down_until[e] > now, self._in_flight[e], self._latency[e]),
+            )
+
+    def _run(self, func: Callable[[str], Any], endpoint: str) -> Any:
+        with self._lock:
+            self._in_flight[endpoint] += 1
+            self._requests[endpoint] += 1
+        t = time()
+        try:
+            result = func(endpoint)
+        except Exception:
+            with self._lock:
+                self._failures[endpoint] += 1
+                self._down_until[endpoint] = time() + self.failure_cooldown
+            raise
+        else:
+            latency = time() - t
+            with self._lock:
+                if self._latency[endpoint]:
+                    self._latency[endpoint] += EndpointPool.LATENCY_SMOOTHING * (
+                        latency - self._latency[endpoint]
+                    )
+                else:
+                    self._latency[endpoint] = latency
+                self._down_until[endpoint] = 0.0
+            return result
+        finally:
+            with self._lock:
+                self._in_flight[endpoint] -= 1
+
+    def call(self, func: Callable[[str], Any]) -> Any:
+        """Run `func(endpoint)` and return result of the first endpoint which succeeds
+
+        Raise the last error if all endpoints failed.
+        """
+        tried = []
+        error = None
+        while len(tried) < len(self.endpoints):
+            endpoint = self.pick(tried)
+            tried.append(endpoint)
+            try:
+                if self._executor:
+                    return self._call_hedged(func, endpoint, tried)
+                return self._run(func, endpoint)
+            except Exception as e:
+                error = e
+        raise error
+
+    def _call_hedged(self, func: Callable[[str], Any], endpoint: str, tried: List[str]) -> Any:
+        futures = [self._executor.submit(self._run, func, endpoint)]
+        done, pending = wait(futures, timeout=self.hedge_delay)
+        if not done:
+            hedge_endpoint = self.pick(tried)
+            if hedge_endpoint:
+                tried.append(hedge_endpoint)
+                with self._lock:
+                    self._hedges[hedge_endpoint] += 1
+                futures.append(self._executor.submit(self._run, func, hedge_endpoint))
+
+        # Return the first success, the slower request is left running and ignored
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if not f.exception():
+                    return f.result()
+        raise futures[-1].exception()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                e: {
+                    'requests': self._requests[e],
+                    'failures': self._failures[e],
+                    'hedges': self._hedges[e],
+                    'latency_ms': round(self._latency[e] * 1000, 2),
+                }
+                for e in self.endpoints
+            }
+
+    def close(self):
+        """Shut down hedging threads, calls already running are not waited for"""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
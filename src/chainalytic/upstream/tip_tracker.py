@@ -0,0 +1,62 @@
+import threading
+from time import time
+from typing import Callable, Dict, Optional
+
+
+class TipTracker(object):
+    """
+    Cached chain tip height
+
+    The tip is only fetched again from chain when the cached value is older than `ttl`,
+    or when a caller needs a height above the cached tip.
+
+    Properties:
+        ttl (float): max age of cached tip, in seconds
+        height (int): cached tip height, `None` if never fetched
+        refresh_count (int):
+
+    Methods:
+        get(min_height: Optional[int] = None) -> Optional[int]
+        refresh() -> Optional[int]
+        stats() -> Dict
+    """
+
+    def __init__(self, fetch_tip: Callable[[], Optional[int]], ttl: float):
+        super(TipTracker, self).__init__()
+        self.ttl = ttl
+        self.height = None
+        self.refresh_count = 0
+        self._fetch_tip = fetch_tip
+        self._fetched_time = 0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, min_height: Optional[int]) -> bool:
+        if self.height is None or time() - self._fetched_time > self.ttl:
+            return 0
+        return min_height is None or min_height <= self.height
+
+    def refresh(self) -> Optional[int]:
+        """Fetch tip from chain now, a failed fetch keeps the previous value."""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> Optional[int]:
+        tip = self._fetch_tip()
+        self.refresh_count += 1
+        if tip is not None:
+            self.height = tip
+            self._fetched_time = time()
+        return self.height
+
+    def get(self, min_height: Optional[int] = None) -> Optional[int]:
+        """Get tip height, refresh it if expired or lower than `min_height`."""
+        if self._is_fresh(min_height):
+            return self.height
+        with self._lock:
+            # Another thread may have refreshed while we were waiting
+            if self._is_fresh(min_height):
+                return self.height
+            return self._refresh()
+
+    def stats(self) -> Dict:
+        return {'height': self.height, 'ttl': self.ttl, 'refresh_count': self.refresh_count}
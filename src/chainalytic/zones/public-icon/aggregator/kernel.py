@@ -9,20 +9,98 @@ class Kernel(BaseKernel):
     def __init__(self, working_dir: str, zone_id: str):
         super(Kernel, self).__init__(working_dir, zone_id)
 
-    async def execute(self, height: int, input_data: Any, transform_id: str) -> Optional[bool]:
-        """Execute transform and push output data to warehouse
+    async def execute_transform(
+        self, height: int, input_data: Any, transform_id: str, staged: bool = False
+    ) -> Optional[Dict]:
+        """Execute transform only, output data is not pushed to warehouse
+
+        Cache changes of a `staged` block wait for `BaseTransform.commit_staged()`.
         """
         output = None
         if transform_id in self.transforms:
             try:
-                output = await self.transforms[transform_id].execute(height, input_data)
+                transform = self.transforms[transform_id]
+                if staged:
+                    output = await transform.execute_staged(height, input_data)
+                else:
+                    output = await transform.execute(height, input_data)
             except Exception as e:
                 self.logger.error(f'ERROR while executing transform {transform_id}')
                 self.logger.error(str(e))
                 self.logger.error(traceback.format_exc())
-        if not output:
+        return output
+
+    async def execute_batch(self, start_height: int, inputs: List[Any], transform_id: str) -> int:
+        """Execute a contiguous run of blocks and push output data to warehouse
+
+        Transform cache is committed once for the whole run, see `BaseTransform.execute_batch()`,
+        and only after all outputs are pushed. Otherwise the run is discarded, so transform
+        cache never gets ahead of warehouse.
+        Latest states in `misc` of all outputs are squashed, so warehouse only receives
+        per-block data, plus one state update for the whole run.
+
+        Returns:
+            int: number of executed blocks, starting from `start_height`
+        """
+        if transform_id not in self.transforms:
             return 0
+        transform = self.transforms[transform_id]
+        outputs = await transform.execute_batch(start_height, inputs)
+
+        try:
+            if outputs and await self.push_outputs(outputs, transform_id):
+                transform.commit_batch()
+                return len(outputs)
+        except Exception as e:
+            self.logger.error(f'ERROR while committing batch of transform {transform_id}')
+            self.logger.error(str(e))
+            self.logger.error(traceback.format_exc())
+        transform.discard_batch()
+        return 0
+
+    async def push_outputs(self, outputs: List[Dict], transform_id: str) -> bool:
+        """Push outputs of a run of blocks to warehouse, stop at the first failed call"""
+        if transform_id == 'stake_history':
+            for output in outputs[:-1]:
+                r = await rpc_client.call_async(
+                    self.warehouse_endpoint,
+                    call_id='api_call',
+                    api_id='put_block',
+                    api_params={
+                        'height': output['height'],
+                        'data': output['data'],
+                        'transform_id': transform_id,
+                    },
+                )
+                if not r['status']:
+                    return 0
+
+        return await self.push_output(self._squash_outputs(outputs, transform_id), transform_id)
+
+    def _squash_outputs(self, outputs: List[Dict], transform_id: str) -> Dict:
+        """Merge `misc` of consecutive outputs into the last output
+
+        Wallet updates are accumulated for `funded_wallets` and `passive_stake_wallets`,
+        other transforms only keep their latest full state, `None` means unchanged.
+        """
+        last = outputs[-1]
+        misc = {}
+        for key, state in last['misc'].items():
+            if transform_id in ['funded_wallets', 'passive_stake_wallets']:
+                wallets = {}
+                for output in outputs:
+                    wallets.update(output['misc'][key]['wallets'])
+            else:
+                wallets = None
+                for output in reversed(outputs):
+                    if output['misc'][key]['wallets'] is not None:
+                        wallets = output['misc'][key]['wallets']
+                        break
+            misc[key] = {'wallets': wallets, 'height': state['height']}
+
+        return {'height': last['height'], 'data': last['data'], 'misc': misc}
 
+    async def push_output(self, output: Dict, transform_id: str) -> bool:
         if transform_id == 'stake_history':
             r = await rpc_client.call_async(
                 self.warehouse_endpoint,
@@ -8,6 +8,7 @@ from iconservice.icon_config import default_icon_config
 from iconservice.icon_constant import ConfigKey
 from iconservice.iiss.engine import Engine
 
+from chainalytic.aggregator.leaderboard import Leaderboard
 from chainalytic.aggregator.transform import BaseTransform
 from chainalytic.common import rpc_client, trie
 
@@ -16,10 +17,32 @@ class Transform(BaseTransform):
     START_BLOCK_HEIGHT = FIRST_STAKE_BLOCK_HEIGHT = 7597365
 
     LAST_STATE_HEIGHT_KEY = b'last_state_height'
+    LEADERBOARD_KEY = b'abstention_stake_leaderboard'
+    # Same wallets as one JSON value, used by older versions
+    LEGACY_ABSTENTION_STAKE_KEY = b'abstention_stake'
     MAX_WALLETS = 200
 
     def __init__(self, working_dir: str, zone_id: str, transform_id: str):
         super(Transform, self).__init__(working_dir, zone_id, transform_id)
+        # Loaded from transform cache on first block
+        self.leaderboard = None
+
+    def reset_state(self):
+        self.leaderboard = None
+
+    def load_leaderboard(self) -> Leaderboard:
+        """Load wallets with most unvoted stake from transform cache"""
+        cache_db = self.transform_cache_db
+        data = cache_db.get(Transform.LEADERBOARD_KEY)
+        if data:
+            return Leaderboard.loads(data, Transform.MAX_WALLETS)
+
+        leaderboard = Leaderboard(Transform.MAX_WALLETS)
+        legacy = cache_db.get(Transform.LEGACY_ABSTENTION_STAKE_KEY)
+        if legacy:
+            for addr, addr_data in json.loads(legacy).items():
+                leaderboard.put(addr, float(addr_data.split(':')[2]), addr_data)
+        return leaderboard
 
     async def execute(self, height: int, input_data: dict) -> Optional[Dict]:
         # Load transform cache to retrive previous staking state
@@ -45,94 +68,88 @@ class Transform(BaseTransform):
         set_delegation_wallets = input_data['data']['delegation']
         state_changed = 1 if set_stake_wallets or set_delegation_wallets else 0
 
-        abstention_stake = cache_db.get(b'abstention_stake')
-        if abstention_stake:
-            abstention_stake = json.loads(abstention_stake)
-        else:
-            abstention_stake = {}
+        # Nothing cached yet, push initial state
+        if prev_state_height is None:
             state_changed = 1
 
-        # Process setStake txs
-        for addr, val in set_stake_wallets.items():
-            addr_data = cache_db.get(addr.encode())
-            if addr_data:
-                stake, delegation, unvoted = addr_data.split(b':')
-                stake = val
-                delegation = float(delegation)
-                unvoted = round(stake - delegation, 4)
-            else:
-                stake = delegation = 0
-                stake = val
-                unvoted = round(stake - delegation, 4)
-
-            addr_data = f'{stake}:{delegation}:{unvoted}'
-
-            if unvoted > 3 and stake > 0:
-                abstention_stake[addr] = addr_data
-            elif addr in abstention_stake:
-                abstention_stake.pop(addr)
-
-            cache_db_batch.put(addr.encode(), addr_data.encode())
-
-        # Process setDelegation txs
-        for addr, targets in set_delegation_wallets.items():
-            delegation_val = 0
-            for t in targets:
-                # delegation_val += int(t['value'], 16) / 10 ** 18
-                try:
-                    delegation_val += int(t['value'], 16) / 10 ** 18
-                except Exception as e:
-                    self.logger.error(f'{e}\n{traceback.format_exc()}')
-                    delegation_val = None
-                    break
-
-            if delegation_val is None:
-                continue
-
-            addr_data = cache_db.get(addr.encode())
-            if addr_data:
-                stake, delegation, unvoted = addr_data.split(b':')
-                stake = float(stake)
-                delegation = delegation_val
-                unvoted = round(stake - delegation, 4)
-            else:
-                stake = delegation = 0
-                delegation = delegation_val
-                unvoted = round(stake - delegation, 4)
-
-            addr_data = f'{stake}:{delegation}:{unvoted}'
-
-            if unvoted > 3 and stake > 0:
-                abstention_stake[addr] = addr_data
-            elif addr in abstention_stake:
-                abstention_stake.pop(addr)
-
-            cache_db_batch.put(addr.encode(), addr_data.encode())
-
-        if state_changed:
-            abstention_stake = {
-                k: v
-                for k, v in sorted(
-                    abstention_stake.items(),
-                    key=lambda item: float(item[1].split(':')[2]),
-                    reverse=1,
-                )
-            }
-            if len(abstention_stake) > Transform.MAX_WALLETS:
-                abstention_stake = {
-                    k: abstention_stake[k] for k in list(abstention_stake)[: Transform.MAX_WALLETS]
-                }
-
-        cache_db_batch.put(b'abstention_stake', json.dumps(abstention_stake).encode())
-        cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
-        cache_db_batch.write()
+        if self.leaderboard is None:
+            self.leaderboard = self.load_leaderboard()
+        abstention_stake = self.leaderboard
+
+        try:
+            # Process setStake txs
+            for addr, val in set_stake_wallets.items():
+                addr_data = cache_db.get(addr.encode())
+                if addr_data:
+                    stake, delegation, unvoted = addr_data.split(b':')
+                    stake = val
+                    delegation = float(delegation)
+                    unvoted = round(stake - delegation, 4)
+                else:
+                    stake = delegation = 0
+                    stake = val
+                    unvoted = round(stake - delegation, 4)
+
+                addr_data = f'{stake}:{delegation}:{unvoted}'
+
+                if unvoted > 3 and stake > 0:
+                    abstention_stake.put(addr, unvoted, addr_data)
+                else:
+                    abstention_stake.remove(addr)
+
+                cache_db_batch.put(addr.encode(), addr_data.encode())
+
+            # Process setDelegation txs
+            for addr, targets in set_delegation_wallets.items():
+                delegation_val = 0
+                for t in targets:
+                    # delegation_val += int(t['value'], 16) / 10 ** 18
+                    try:
+                        delegation_val += int(t['value'], 16) / 10 ** 18
+                    except Exception as e:
+                        self.logger.error(f'{e}\n{traceback.format_exc()}')
+                        delegation_val = None
+                        break
+
+                if delegation_val is None:
+                    continue
+
+                addr_data = cache_db.get(addr.encode())
+                if addr_data:
+                    stake, delegation, unvoted = addr_data.split(b':')
+                    stake = float(stake)
+                    delegation = delegation_val
+                    unvoted = round(stake - delegation, 4)
+                else:
+                    stake = delegation = 0
+                    delegation = delegation_val
+                    unvoted = round(stake - delegation, 4)
+
+                addr_data = f'{stake}:{delegation}:{unvoted}'
+
+                if unvoted > 3 and stake > 0:
+                    abstention_stake.put(addr, unvoted, addr_data)
+                else:
+                    abstention_stake.remove(addr)
+
+                cache_db_batch.put(addr.encode(), addr_data.encode())
+
+            if state_changed:
+                cache_db_batch.put(Transform.LEADERBOARD_KEY, abstention_stake.dumps())
+                cache_db_batch.delete(Transform.LEGACY_ABSTENTION_STAKE_KEY)
+            cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
+            cache_db_batch.write()
+        except Exception:
+            # Leaderboard may be ahead of transform cache now, reload it on next block
+            self.leaderboard = None
+            raise
 
         return {
             'height': height,
             'data': {},
             'misc': {
                 'abstention_stake': {
-                    'wallets': abstention_stake if state_changed else None,
+                    'wallets': abstention_stake.to_dict() if state_changed else None,
                     'height': height,
                 }
             },
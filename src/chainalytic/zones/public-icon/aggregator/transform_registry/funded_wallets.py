@@ -9,17 +9,62 @@ from iconservice.icon_constant import ConfigKey
 from iconservice.iiss.engine import Engine
 
 from chainalytic.aggregator.transform import BaseTransform
-from chainalytic.common import rpc_client, trie
+from chainalytic.common import config, rpc_client, trie
+from chainalytic.common.lru_cache import LRUCache
+
+LOOP_PER_ICX = 10 ** 18
+
+
+def loop_to_icx(loop: int) -> str:
+    """Format an amount in loop as an exact decimal ICX string, e.g. `'12.5'`"""
+    icx, remainder = divmod(loop, LOOP_PER_ICX)
+    if not remainder:
+        return str(icx)
+    return f'{icx}.{remainder:018d}'.rstrip('0')
 
 
 class Transform(BaseTransform):
     START_BLOCK_HEIGHT = 1
 
     LAST_STATE_HEIGHT_KEY = b'last_state_height'
+    # Balance in loop, as `loop:<address>`
+    BALANCE_KEY_PREFIX = b'loop:'
     MAX_WALLETS = 200
+    DEFAULT_BALANCE_CACHE_SIZE = 100000
 
     def __init__(self, working_dir: str, zone_id: str, transform_id: str):
         super(Transform, self).__init__(working_dir, zone_id, transform_id)
+        # Balances in loop of recently active wallets, written through to transform cache
+        setting = config.get_setting(working_dir)
+        self.balance_cache = LRUCache(
+            setting.get('balance_cache_size', Transform.DEFAULT_BALANCE_CACHE_SIZE)
+        )
+
+    def reset_state(self):
+        self.balance_cache.clear()
+
+    def get_balance(self, addr: str, legacy_wallets: Optional[Set[str]] = None) -> int:
+        """Get committed balance of a wallet in loop, from memory if possible
+
+        Balances written by older versions are stored as float ICX under the bare address.
+        Such wallets are added to `legacy_wallets` and not cached, so the legacy key
+        is found again until the balance is rewritten under the new key.
+        """
+        balance = self.balance_cache.get(addr)
+        if balance is not None:
+            return balance
+
+        cache_db = self.transform_cache_db
+        balance = cache_db.get(Transform.BALANCE_KEY_PREFIX + addr.encode())
+        if balance is None:
+            legacy_balance = cache_db.get(addr.encode())
+            if legacy_balance:
+                if legacy_wallets is not None:
+                    legacy_wallets.add(addr)
+                return int(round(float(legacy_balance) * LOOP_PER_ICX))
+        balance = int(balance) if balance is not None else 0
+        self.balance_cache.put(addr, balance)
+        return balance
 
     async def execute(self, height: int, input_data: dict) -> Optional[Dict]:
         # Load transform cache to retrive previous staking state
@@ -41,9 +86,15 @@ class Transform(BaseTransform):
 
         # Create cache and storage data for genesis block 0
         if height == 1:
-            cache_db_batch.put(b'hx54f7853dc6481b670caf69c5a27c7c8fe5be8269', b'800460000')
-            cache_db_batch.put(b'hx1000000000000000000000000000000000000000', b'0')
+            cache_db_batch.put(
+                Transform.BALANCE_KEY_PREFIX + b'hx54f7853dc6481b670caf69c5a27c7c8fe5be8269',
+                str(800460000 * LOOP_PER_ICX).encode(),
+            )
+            cache_db_batch.put(
+                Transform.BALANCE_KEY_PREFIX + b'hx1000000000000000000000000000000000000000', b'0'
+            )
             cache_db_batch.write()
+            self.balance_cache.clear()
 
             await rpc_client.call_async(
                 self.warehouse_endpoint,
@@ -65,32 +116,50 @@ class Transform(BaseTransform):
 
         txs = input_data['data']
 
-        # Example of `updated_wallets`
-        # {
-        #     "ADDRESS_1": "100000.0",
-        #     "ADDRESS_2": "9999.9999",
-        # }
-        updated_wallets = {}
+        # Balances in loop changed by this block, so later txs see earlier ones
+        balances = {}
+        legacy_wallets = set()
 
         for tx in txs:
-            source_balance = cache_db.get(tx['from'].encode())
-            dest_balance = cache_db.get(tx['to'].encode())
-            value = tx['value']
+            source, dest = tx['from'], tx['to']
+            if 'loop' not in tx:
+                raise ValueError(
+                    f'Block {height} digest has no exact transfer value in loop, '
+                    f'it was stored by an older Upstream, clear `digest_store_dir` and restart'
+                )
+            value = int(tx['loop'], 16)
 
-            source_balance = float(source_balance) if source_balance else 0
-            dest_balance = float(dest_balance) if dest_balance else 0
+            if source in balances:
+                source_balance = balances[source]
+            else:
+                source_balance = self.get_balance(source, legacy_wallets)
             if source_balance >= value:
-                source_balance -= value
-                dest_balance += value
-                updated_wallets[tx['from']] = str(source_balance)
-                updated_wallets[tx['to']] = str(dest_balance)
-
-        for addr, balance in updated_wallets.items():
-            cache_db_batch.put(addr.encode(), balance.encode())
+                balances[source] = source_balance - value
+                if dest in balances:
+                    dest_balance = balances[dest]
+                else:
+                    dest_balance = self.get_balance(dest, legacy_wallets)
+                balances[dest] = dest_balance + value
+
+        for addr, balance in balances.items():
+            cache_db_batch.put(Transform.BALANCE_KEY_PREFIX + addr.encode(), str(balance).encode())
+            if addr in legacy_wallets:
+                cache_db_batch.delete(addr.encode())
 
         cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
         cache_db_batch.write()
 
+        # Only cache balances once they are committed
+        for addr, balance in balances.items():
+            self.balance_cache.put(addr, balance)
+
+        # Example of `updated_wallets`
+        # {
+        #     "ADDRESS_1": "100000",
+        #     "ADDRESS_2": "9999.9999",
+        # }
+        updated_wallets = {addr: loop_to_icx(balance) for addr, balance in balances.items()}
+
         return {
             'height': height,
             'data': {},
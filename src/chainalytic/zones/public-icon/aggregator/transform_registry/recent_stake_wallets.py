@@ -7,19 +7,46 @@ from iconservice.icon_config import default_icon_config
 from iconservice.icon_constant import ConfigKey
 from iconservice.iiss.engine import Engine
 
+from chainalytic.aggregator.sliding_window import SlidingWindow
 from chainalytic.aggregator.transform import BaseTransform
-from chainalytic.common import rpc_client, trie
+from chainalytic.common import rpc_client, trie, zone_manager
 
 
 class Transform(BaseTransform):
     START_BLOCK_HEIGHT = FIRST_STAKE_BLOCK_HEIGHT = 7597365
 
     LAST_STATE_HEIGHT_KEY = b'last_state_height'
+    WINDOW_KEY = b'recent_stake_wallets_window'
+    # Same wallets as one JSON value, used by older versions
+    LEGACY_RECENT_STAKE_WALLETS_KEY = b'recent_stake_wallets'
     TIMESPAN = 129600  # 3 days
     MAX_WALLETS = 200
 
     def __init__(self, working_dir: str, zone_id: str, transform_id: str):
         super(Transform, self).__init__(working_dir, zone_id, transform_id)
+        # Number of blocks a stake record stays recent, may be set per zone in chain registry
+        zone = zone_manager.get_zone(working_dir, zone_id) or {}
+        self.timespan = int(zone.get('recent_stake_wallets_timespan', Transform.TIMESPAN))
+        # Loaded from transform cache on first block
+        self.window = None
+
+    def reset_state(self):
+        self.window = None
+
+    def load_window(self) -> SlidingWindow:
+        """Load latest stake records from transform cache"""
+        cache_db = self.transform_cache_db
+        data = cache_db.get(Transform.WINDOW_KEY)
+        if data:
+            return SlidingWindow.loads(data, self.timespan, Transform.MAX_WALLETS)
+
+        legacy = cache_db.get(Transform.LEGACY_RECENT_STAKE_WALLETS_KEY)
+        records = json.loads(legacy) if legacy else {}
+
+        window = SlidingWindow(self.timespan, Transform.MAX_WALLETS)
+        for addr, record in sorted(records.items(), key=lambda item: int(item[1].split(':')[0])):
+            window.push(addr, int(record.split(':')[0]), record)
+        return window
 
     async def execute(self, height: int, input_data: dict) -> Optional[Dict]:
         start_time = time.time()
@@ -46,40 +73,31 @@ class Transform(BaseTransform):
         set_stake_wallets = input_data['data']
         state_changed = 1 if set_stake_wallets else 0
 
-        recent_stake_wallets = cache_db.get(b'recent_stake_wallets')
-        if recent_stake_wallets:
-            recent_stake_wallets = json.loads(recent_stake_wallets)
-        else:
-            recent_stake_wallets = {}
+        # Nothing cached yet, push initial state
+        if prev_state_height is None:
             state_changed = 1
 
-        # Clean stake records that are out of pre-defined timespan
-        min_height = height - Transform.TIMESPAN
-        for addr in list(recent_stake_wallets):
-            if int(recent_stake_wallets[addr].split(':')[0]) < min_height:
-                recent_stake_wallets.pop(addr)
-                state_changed = 1
-
-        for addr, val in set_stake_wallets.items():
-            recent_stake_wallets[addr] = f'{height}:{val}'
+        if self.window is None:
+            self.window = self.load_window()
+        recent_stake_wallets = self.window
 
-        if state_changed:
-            recent_stake_wallets = {
-                k: v
-                for k, v in sorted(
-                    recent_stake_wallets.items(), key=lambda item: item[1], reverse=1
-                )
-            }
-            if len(recent_stake_wallets) > Transform.MAX_WALLETS:
-                recent_stake_wallets = {
-                    k: recent_stake_wallets[k]
-                    for k in list(recent_stake_wallets)[: Transform.MAX_WALLETS]
-                }
+        try:
+            # Clean stake records that are out of pre-defined timespan
+            if recent_stake_wallets.expire(height):
+                state_changed = 1
 
-        cache_db_batch.put(b'recent_stake_wallets', json.dumps(recent_stake_wallets).encode())
+            for addr, val in set_stake_wallets.items():
+                recent_stake_wallets.push(addr, height, f'{height}:{val}')
 
-        cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
-        cache_db_batch.write()
+            if state_changed:
+                cache_db_batch.put(Transform.WINDOW_KEY, recent_stake_wallets.dumps())
+                cache_db_batch.delete(Transform.LEGACY_RECENT_STAKE_WALLETS_KEY)
+            cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
+            cache_db_batch.write()
+        except Exception:
+            # Window may be ahead of transform cache now, reload it on next block
+            self.window = None
+            raise
 
         # execution_time = f'{round(time.time()-start_time, 4)}s'
 
@@ -88,7 +106,7 @@ class Transform(BaseTransform):
             'data': {},
             'misc': {
                 'recent_stake_wallets': {
-                    'wallets': recent_stake_wallets if state_changed else None,
+                    'wallets': recent_stake_wallets.to_dict() if state_changed else None,
                     'height': height,
                 }
             },
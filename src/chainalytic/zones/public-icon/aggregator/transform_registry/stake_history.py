@@ -1,3 +1,4 @@
+import heapq
 import json
 import time
 from typing import Dict, List, Optional, Set, Tuple, Union
@@ -23,6 +24,111 @@ def unlock_period(total_stake, total_supply):
     return p
 
 
+class UnstakingIndex(object):
+    """
+    Resident index of wallets with pending unstake, persisted incrementally in transform cache
+
+    Every wallet is stored under its own `unstaking:<address>` key, so only changed wallets
+    are written per block. A min-heap keyed by unlock height finds expired wallets
+    without scanning all of them, outdated heap items are skipped on pop.
+
+    Properties:
+        wallets (dict): `stake:unstaking:request_height:unlock_height` by wallet address
+        total_unstaking (float): running total, rounded to the 4 decimals stakes are
+            rounded to, so float errors do not pile up over millions of updates
+
+    Methods:
+        put(addr: str, stake_value: float, unstaking_value: float,
+            request_height: int, unlock_height: int, batch)
+        remove(addr: str, batch)
+        expire(height: int, batch) -> List[Tuple[str, str]]
+    """
+
+    KEY_PREFIX = b'unstaking:'
+    # Whole unstaking map as one JSON value, used by older versions
+    LEGACY_KEY = b'unstaking'
+
+    def __init__(self, db: plyvel.DB):
+        super(UnstakingIndex, self).__init__()
+        self.wallets = {}
+        self.total_unstaking = 0
+        # (unstaking_value, unlock_height) by wallet address
+        self._amounts = {}
+        self._heap = []
+
+        legacy = db.get(UnstakingIndex.LEGACY_KEY)
+        if legacy:
+            wallets = json.loads(legacy)
+            batch = db.write_batch()
+            for addr, value in wallets.items():
+                batch.put(UnstakingIndex.KEY_PREFIX + addr.encode(), value.encode())
+            batch.delete(UnstakingIndex.LEGACY_KEY)
+            batch.write()
+        else:
+            wallets = {
+                key[len(UnstakingIndex.KEY_PREFIX) :].decode(): value.decode()
+                for key, value in db.iterator(prefix=UnstakingIndex.KEY_PREFIX)
+            }
+
+        for addr, value in wallets.items():
+            _, unstaking_value, _, unlock_height = value.split(':')
+            self._set(addr, value, float(unstaking_value), int(unlock_height))
+
+    def __len__(self) -> int:
+        return len(self.wallets)
+
+    def __contains__(self, addr: str) -> bool:
+        return addr in self.wallets
+
+    def put(
+        self,
+        addr: str,
+        stake_value: float,
+        unstaking_value: float,
+        request_height: int,
+        unlock_height: int,
+        batch,
+    ):
+        value = f'{stake_value}:{unstaking_value}:{request_height}:{unlock_height}'
+        self._set(addr, value, unstaking_value, unlock_height)
+        batch.put(UnstakingIndex.KEY_PREFIX + addr.encode(), value.encode())
+
+    def remove(self, addr: str, batch):
+        unstaking_value, _ = self._amounts.pop(addr)
+        self.wallets.pop(addr)
+        self.total_unstaking = round(self.total_unstaking - unstaking_value, 4)
+        batch.delete(UnstakingIndex.KEY_PREFIX + addr.encode())
+
+    def expire(self, height: int, batch) -> List[Tuple[str, str]]:
+        """Remove all wallets unlocked at `height`
+
+        Returns:
+            list: `(address, stake_value)` of removed wallets
+        """
+        expired = []
+        while self._heap and self._heap[0][0] <= height:
+            unlock_height, addr = heapq.heappop(self._heap)
+            if addr in self._amounts and self._amounts[addr][1] == unlock_height:
+                stake_value = self.wallets[addr].split(':')[0]
+                self.remove(addr, batch)
+                expired.append((addr, stake_value))
+        return expired
+
+    def _set(self, addr: str, value: str, unstaking_value: float, unlock_height: int):
+        prev_unstaking_value, prev_unlock_height = self._amounts.get(addr, (0, None))
+        self.wallets[addr] = value
+        self._amounts[addr] = (unstaking_value, unlock_height)
+        self.total_unstaking = round(
+            self.total_unstaking - prev_unstaking_value + unstaking_value, 4
+        )
+        if unlock_height != prev_unlock_height:
+            heapq.heappush(self._heap, (unlock_height, addr))
+            # Drop outdated items once they outnumber live ones
+            if len(self._heap) > 2 * len(self._amounts) + 64:
+                self._heap = [(u, a) for a, (_, u) in self._amounts.items()]
+                heapq.heapify(self._heap)
+
+
 class Transform(BaseTransform):
     START_BLOCK_HEIGHT = FIRST_STAKE_BLOCK_HEIGHT = 7597365
 
@@ -34,6 +140,11 @@ class Transform(BaseTransform):
 
     def __init__(self, working_dir: str, zone_id: str, transform_id: str):
         super(Transform, self).__init__(working_dir, zone_id, transform_id)
+        # Loaded from transform cache on first block
+        self.unstaking_index = None
+
+    def reset_state(self):
+        self.unstaking_index = None
 
     async def execute(self, height: int, input_data: dict) -> Optional[Dict]:
         start_time = time.time()
@@ -78,127 +189,121 @@ class Transform(BaseTransform):
         total_staking_wallets = prev_total_staking_wallets
         total_unstaking_wallets = prev_total_unstaking_wallets
 
-        unstake_state_changed = 0
+        # Nothing cached yet, push initial unstake state
+        unstake_state_changed = int(prev_state_height is None)
 
-        # Cleanup expired unlock period
-        #
-        unstaking_addresses = cache_db.get(b'unstaking')
-        if unstaking_addresses:
-            unstaking_addresses = json.loads(unstaking_addresses)
-        else:
-            unstaking_addresses = {}
-            unstake_state_changed = 1
-        for addr in list(unstaking_addresses):
-            stake_value, unstaking_value, request_height, unlock_height = unstaking_addresses[
-                addr
-            ].split(':')
-            if int(unlock_height) <= height:
-                unstaking_addresses.pop(addr)
+        if self.unstaking_index is None:
+            self.unstaking_index = UnstakingIndex(cache_db)
+        unstaking_index = self.unstaking_index
+
+        try:
+            # Cleanup expired unlock period
+            #
+            for addr, stake_value in unstaking_index.expire(height, cache_db_batch):
                 cache_db_batch.put(addr.encode(), f'{stake_value}:0:0:0'.encode())
                 unstake_state_changed = 1
 
-        cache_db_batch.put(b'unstaking', json.dumps(unstaking_addresses).encode())
-
-        # Calculate staking, unstaking and unlock_height for each wallet
-        # and put them to transform cache
-        # Only process wallets that set new stake in current block
-        #
-        set_stake_wallets = input_data['data']
-        timestamp = input_data['timestamp']
-        total_supply = input_data['total_supply']
-
-        for addr in set_stake_wallets:
-            addr_data = cache_db.get(addr.encode())
-
-            if addr_data:
-                (
-                    prev_stake_value,
-                    prev_unstaking_value,
-                    request_height,
-                    unlock_height,
-                ) = addr_data.split(b':')
-                prev_stake_value = float(prev_stake_value)
-                prev_unstaking_value = float(prev_unstaking_value)
-                request_height = int(request_height)
-                unlock_height = int(unlock_height)
-            else:
-                prev_stake_value = prev_unstaking_value = request_height = unlock_height = 0
-
-            cur_stake_value = round(set_stake_wallets[addr], 4)
-            cur_unstaking_value = 0
-
-            if prev_stake_value == 0 and cur_stake_value > 0:
-                total_staking_wallets += 1
-            elif prev_stake_value > 0 and cur_stake_value == 0:
-                total_staking_wallets -= 1
-
-            # Unstake
-            if cur_stake_value < prev_stake_value:
-                if prev_unstaking_value > 0:
-                    cur_unstaking_value = prev_unstaking_value + (
-                        prev_stake_value - cur_stake_value
-                    )
-
+            # Calculate staking, unstaking and unlock_height for each wallet
+            # and put them to transform cache
+            # Only process wallets that set new stake in current block
+            #
+            set_stake_wallets = input_data['data']
+            timestamp = input_data['timestamp']
+            # Only attached by Upstream to blocks having `setStake` txs
+            total_supply = input_data.get('total_supply')
+
+            for addr in set_stake_wallets:
+                addr_data = cache_db.get(addr.encode())
+
+                if addr_data:
+                    (
+                        prev_stake_value,
+                        prev_unstaking_value,
+                        request_height,
+                        unlock_height,
+                    ) = addr_data.split(b':')
+                    prev_stake_value = float(prev_stake_value)
+                    prev_unstaking_value = float(prev_unstaking_value)
+                    request_height = int(request_height)
+                    unlock_height = int(unlock_height)
                 else:
-                    cur_unstaking_value = prev_stake_value - cur_stake_value
-                unlock_height = height + unlock_period(prev_total_staking, total_supply)
-                request_height = height
-
-            # Restake
-            else:
-                if prev_unstaking_value > 0:
-                    cur_unstaking_value = prev_unstaking_value - (
-                        cur_stake_value - prev_stake_value
-                    )
-                else:
-                    cur_unstaking_value = 0
+                    prev_stake_value = prev_unstaking_value = request_height = unlock_height = 0
 
-            if cur_unstaking_value <= 0:
+                cur_stake_value = round(set_stake_wallets[addr], 4)
                 cur_unstaking_value = 0
-                unlock_height = 0
-                request_height = 0
 
-            cache_db_batch.put(
-                addr.encode(),
-                f'{cur_stake_value}:{cur_unstaking_value}:{request_height}:{unlock_height}'.encode(),
-            )
+                if prev_stake_value == 0 and cur_stake_value > 0:
+                    total_staking_wallets += 1
+                elif prev_stake_value > 0 and cur_stake_value == 0:
+                    total_staking_wallets -= 1
 
-            # Update unstaking wallets list
-            if cur_unstaking_value > 0:
-                unstaking_addresses[
-                    addr
-                ] = f'{cur_stake_value}:{cur_unstaking_value}:{request_height}:{unlock_height}'
-                unstake_state_changed = 1
-            elif addr in unstaking_addresses:
-                unstaking_addresses.pop(addr)
-                unstake_state_changed = 1
+                # Unstake
+                if cur_stake_value < prev_stake_value:
+                    if prev_unstaking_value > 0:
+                        cur_unstaking_value = prev_unstaking_value + (
+                            prev_stake_value - cur_stake_value
+                        )
 
-            cache_db_batch.put(b'unstaking', json.dumps(unstaking_addresses).encode())
+                    else:
+                        cur_unstaking_value = prev_stake_value - cur_stake_value
+                    unlock_height = height + unlock_period(prev_total_staking, total_supply)
+                    request_height = height
 
-            # Update total staking
-            total_staking = total_staking - prev_stake_value + cur_stake_value
+                # Restake
+                else:
+                    if prev_unstaking_value > 0:
+                        cur_unstaking_value = prev_unstaking_value - (
+                            cur_stake_value - prev_stake_value
+                        )
+                    else:
+                        cur_unstaking_value = 0
+
+                if cur_unstaking_value <= 0:
+                    cur_unstaking_value = 0
+                    unlock_height = 0
+                    request_height = 0
 
-        # Update total unstaking wallets
-        total_unstaking_wallets = len(unstaking_addresses)
+                addr_data = (
+                    f'{cur_stake_value}:{cur_unstaking_value}:{request_height}:{unlock_height}'
+                )
+                cache_db_batch.put(addr.encode(), addr_data.encode())
+
+                # Update unstaking wallets index
+                if cur_unstaking_value > 0:
+                    unstaking_index.put(
+                        addr,
+                        cur_stake_value,
+                        cur_unstaking_value,
+                        request_height,
+                        unlock_height,
+                        cache_db_batch,
+                    )
+                    unstake_state_changed = 1
+                elif addr in unstaking_index:
+                    unstaking_index.remove(addr, cache_db_batch)
+                    unstake_state_changed = 1
 
-        # Calculate latest total unstaking
-        total_unstaking = 0
-        for addr in unstaking_addresses:
-            stake_value, unstaking_value, request_height, unlock_height = unstaking_addresses[
-                addr
-            ].split(':')
-            total_unstaking += float(unstaking_value)
+                # Update total staking
+                total_staking = total_staking - prev_stake_value + cur_stake_value
 
-        cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
-        cache_db_batch.put(Transform.LAST_TOTAL_STAKING_KEY, str(total_staking).encode())
-        cache_db_batch.put(Transform.LAST_TOTAL_UNSTAKING_KEY, str(total_unstaking).encode())
-        cache_db_batch.put(
-            Transform.LAST_TOTAL_STAKING_WALLETS_KEY, str(total_staking_wallets).encode()
-        )
-        cache_db_batch.put(
-            Transform.LAST_TOTAL_UNSTAKING_WALLETS_KEY, str(total_unstaking_wallets).encode()
-        )
-        cache_db_batch.write()
+            # Update total unstaking wallets and latest total unstaking
+            total_unstaking_wallets = len(unstaking_index)
+            total_unstaking = unstaking_index.total_unstaking
+
+            cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
+            cache_db_batch.put(Transform.LAST_TOTAL_STAKING_KEY, str(total_staking).encode())
+            cache_db_batch.put(Transform.LAST_TOTAL_UNSTAKING_KEY, str(total_unstaking).encode())
+            cache_db_batch.put(
+                Transform.LAST_TOTAL_STAKING_WALLETS_KEY, str(total_staking_wallets).encode()
+            )
+            cache_db_batch.put(
+                Transform.LAST_TOTAL_UNSTAKING_WALLETS_KEY, str(total_unstaking_wallets).encode()
+            )
+            cache_db_batch.write()
+        except Exception:
+            # Index may be ahead of transform cache now, reload it on next block
+            self.unstaking_index = None
+            raise
 
         execution_time = f'{round(time.time()-start_time, 4)}s'
 
@@ -216,7 +321,7 @@ class Transform(BaseTransform):
             'data': data,
             'misc': {
                 'latest_unstake_state': {
-                    'wallets': unstaking_addresses if unstake_state_changed else None,
+                    'wallets': dict(unstaking_index.wallets) if unstake_state_changed else None,
                     'height': height,
                 }
             },
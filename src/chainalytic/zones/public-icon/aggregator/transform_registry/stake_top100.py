@@ -7,6 +7,7 @@ from iconservice.icon_config import default_icon_config
 from iconservice.icon_constant import ConfigKey
 from iconservice.iiss.engine import Engine
 
+from chainalytic.aggregator.ordered_index import OrderedIndex
 from chainalytic.aggregator.transform import BaseTransform
 from chainalytic.common import rpc_client, trie
 
@@ -14,10 +15,43 @@ from chainalytic.common import rpc_client, trie
 class Transform(BaseTransform):
     START_BLOCK_HEIGHT = FIRST_STAKE_BLOCK_HEIGHT = 7597365
     LAST_STATE_HEIGHT_KEY = b'last_state_height'
+    # Stake of every staking wallet, as `stake:<address>`
+    STAKE_KEY_PREFIX = b'stake:'
+    # Top wallets only, as one JSON value, used by older versions
+    LEGACY_STAKE_TOP100_KEY = b'stake_top100'
     MAX_WALLETS = 100
 
     def __init__(self, working_dir: str, zone_id: str, transform_id: str):
         super(Transform, self).__init__(working_dir, zone_id, transform_id)
+        # Loaded from transform cache on first block
+        self.stake_index = None
+
+    def reset_state(self):
+        self.stake_index = None
+
+    def load_stake_index(self) -> OrderedIndex:
+        """Load stake of all staking wallets from transform cache into an ordered index"""
+        cache_db = self.transform_cache_db
+        stake_index = OrderedIndex()
+
+        legacy = cache_db.get(Transform.LEGACY_STAKE_TOP100_KEY)
+        if legacy:
+            # Older cache only kept top wallets, re-index transform to get all stakers
+            self.logger.warning('stake_top100: migrating legacy cache, only top wallets known')
+            batch = cache_db.write_batch()
+            for addr, val in json.loads(legacy).items():
+                # Unstaked wallets are never stored, see `execute()`
+                if val <= 0:
+                    continue
+                stake_index.put(addr, val)
+                batch.put(Transform.STAKE_KEY_PREFIX + addr.encode(), str(val).encode())
+            batch.delete(Transform.LEGACY_STAKE_TOP100_KEY)
+            batch.write()
+        else:
+            for key, value in cache_db.iterator(prefix=Transform.STAKE_KEY_PREFIX):
+                stake_index.put(key[len(Transform.STAKE_KEY_PREFIX) :].decode(), float(value))
+
+        return stake_index
 
     async def execute(self, height: int, input_data: dict) -> Optional[Dict]:
         start_time = time.time()
@@ -43,32 +77,38 @@ class Transform(BaseTransform):
 
         set_stake_wallets = input_data['data']
 
+        if self.stake_index is None:
+            self.stake_index = self.load_stake_index()
+        stake_index = self.stake_index
+
         if set_stake_wallets:
-            updated_stake_top100 = cache_db.get(b'stake_top100')
-            if updated_stake_top100:
-                updated_stake_top100 = json.loads(updated_stake_top100)
-            else:
-                updated_stake_top100 = {}
-
-            for addr, val in set_stake_wallets.items():
-                updated_stake_top100[addr] = val
-
-            updated_stake_top100 = {
-                k: v
-                for k, v in sorted(
-                    updated_stake_top100.items(), key=lambda item: item[1], reverse=1
-                )
-            }
-            updated_stake_top100 = {
-                k: updated_stake_top100[k]
-                for k in list(updated_stake_top100)[: Transform.MAX_WALLETS]
-            }
-            cache_db_batch.put(b'stake_top100', json.dumps(updated_stake_top100).encode())
+            try:
+                prev_stake_top100 = stake_index.top(Transform.MAX_WALLETS)
+                for addr, val in set_stake_wallets.items():
+                    key = Transform.STAKE_KEY_PREFIX + addr.encode()
+                    if val > 0:
+                        stake_index.put(addr, val)
+                        cache_db_batch.put(key, str(val).encode())
+                    else:
+                        stake_index.remove(addr)
+                        cache_db_batch.delete(key)
+
+                updated_stake_top100 = stake_index.top(Transform.MAX_WALLETS)
+                if updated_stake_top100 == prev_stake_top100:
+                    updated_stake_top100 = None
+                else:
+                    updated_stake_top100 = dict(updated_stake_top100)
+
+                cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
+                cache_db_batch.write()
+            except Exception:
+                # Index may be ahead of transform cache now, reload it on next block
+                self.stake_index = None
+                raise
         else:
             updated_stake_top100 = None
-
-        cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
-        cache_db_batch.write()
+            cache_db_batch.put(Transform.LAST_STATE_HEIGHT_KEY, str(height).encode())
+            cache_db_batch.write()
 
         # execution_time = f'{round(time.time()-start_time, 4)}s'
 
@@ -1,17 +1,21 @@
 import functools
 import json
+import re
+import threading
 import traceback
 from pathlib import Path
 from pprint import pprint
 from time import time
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 import plyvel
+import requests
 from iconsdk.icon_service import IconService
 from iconsdk.providers.http_provider import HTTPProvider
 
 from chainalytic.common import config, util, zone_manager
 from chainalytic.upstream.data_feeder import BaseDataFeeder
+from chainalytic.upstream.endpoint_pool import EndpointPool
 
 BLOCK_HEIGHT_KEY = b'block_height_key'
 BLOCK_HEIGHT_BYTES_LEN = 12
@@ -20,24 +24,110 @@ V3_BLOCK_HEIGHT = 10324749
 V4_BLOCK_HEIGHT = 12640761
 
 
+# Methods of interest for stake-only transforms, as they appear in raw block JSON
+STAKE_METHOD_PATTERNS = [b'"setStake"', b'"setDelegation"']
+TX_LIST_PATTERN = re.compile(rb'"(confirmed_transaction_list|transactions)"\s*:')
+TIMESTAMP_PATTERN = re.compile(rb'"time_stamp"\s*:\s*(\d+)')
+V3_TIMESTAMP_PATTERN = re.compile(rb'"timestamp"\s*:\s*"(0x[0-9a-fA-F]+)"')
+
+
+def height_key(height: int) -> bytes:
+    return BLOCK_HEIGHT_KEY + height.to_bytes(BLOCK_HEIGHT_BYTES_LEN, byteorder='big')
+
+
+def prefilter_raw_block(height: int, data: bytes) -> Optional[dict]:
+    """Build digest of a raw block without JSON decoding, if it has no stake related txs.
+
+    Only valid when ICX transfers are not needed, `fund_transfer` is always empty.
+    Timestamp is only searched in block header, before the tx list, to avoid picking tx fields.
+
+    Returns:
+        dict: digest, flagged with `prefiltered`
+        None: block may contain `setStake`/`setDelegation` txs, or is in unknown format,
+            full decoding is needed
+    """
+    for p in STAKE_METHOD_PATTERNS:
+        if p in data:
+            return None
+
+    tx_list = TX_LIST_PATTERN.search(data)
+    if not tx_list:
+        return None
+    header = data[: tx_list.start()]
+
+    if height < V3_BLOCK_HEIGHT:
+        m = TIMESTAMP_PATTERN.search(header)
+        timestamp = int(m.group(1)) if m else None
+    else:
+        m = V3_TIMESTAMP_PATTERN.search(header)
+        timestamp = int(m.group(1), 16) if m else None
+    if timestamp is None:
+        return None
+
+    return {
+        'timestamp': timestamp,
+        'fund_transfer': [],
+        'stake': {},
+        'delegation': {},
+        'prefiltered': 1,
+    }
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """`HTTPProvider` which reuses keep-alive connections of one long-lived `requests.Session`
+
+    Also counts every JSON-RPC request sent to the citizen node.
+    """
+
+    def __init__(self, base_domain_url: str, version: int, pool_size: int):
+        super(PooledHTTPProvider, self).__init__(base_domain_url, version)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.request_count = 0
+        # Requests are sent from chain read, prefetch and endpoint pool threads
+        self._count_lock = threading.Lock()
+
+    def _make_post_request(self, request_url: str, data: dict, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', 10)
+        with self._count_lock:
+            self.request_count += 1
+        return self.session.post(url=request_url, data=json.dumps(data), **kwargs)
+
+
 def handle_client_failure(func):
+    """Setup citizen node client once and reuse it
+
+    Nodes are only probed with `is_connected()` after a failed call, not before every call.
+    Clients are kept after failures, `EndpointPool` avoids failed endpoints for a while
+    and sessions reconnect by themselves once a node is back.
+    """
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        feeder = args[0]
+        if feeder.direct_db_access:
+            return func(*args, **kwargs)
+
         try:
-            url = f"http://{args[0].client_endpoint}"
-            http_provider = HTTPProvider(url, 3)
-            if args[0].icon_service is None:
-                args[0].icon_service = IconService(http_provider)
-            if http_provider.is_connected():
-                return func(*args, **kwargs)
-            else:
-                args[0].logger.warning(f'Citizen node is not connected: {url}')
-                return None
+            if feeder.endpoint_pool is None:
+                feeder._setup_client()
+            return func(*args, **kwargs)
 
         except Exception as e:
-            args[0].icon_service = None
-            args[0].logger.error('handle_client_failure(): Failed to setup icon_service')
-            args[0].logger.error(str(e))
+            with feeder._client_lock:
+                feeder.client_failures += 1
+            feeder.logger.error(f'handle_client_failure(): There is error while calling: {func}')
+            feeder.logger.error(str(e))
+            connected = 0
+            for provider in (feeder.http_providers or {}).values():
+                try:
+                    connected = connected or provider.is_connected()
+                except Exception:
+                    pass
+            if not connected:
+                feeder.logger.warning(f'Citizen nodes are not connected: {feeder.client_endpoints}')
             return None
 
     return wrapper
@@ -59,20 +149,79 @@ def handle_unknown_failure(func):
 
 class DataFeeder(BaseDataFeeder):
     LAST_BLOCK_KEY = b'last_block_key'
+    CLIENT_POOL_SIZE = 16
+    DEFAULT_CLIENT_HEDGE_DELAY = 0.5
+    DEFAULT_TOTAL_SUPPLY_REFRESH_INTERVAL = 1000
+    DB_ITERATOR_BATCH_SIZE = 100
+    FUND_TRANSFER_TRANSFORMS = ['funded_wallets']
 
-    def __init__(self, working_dir: str, zone_id: str):
-        super(DataFeeder, self).__init__(working_dir, zone_id)
+    def __init__(self, working_dir: str, zone_id: str, backfill_worker: bool = False):
+        super(DataFeeder, self).__init__(working_dir, zone_id, backfill_worker)
 
         self.client_endpoint = self.zone['client_endpoint'] if self.zone else ''
+        # Several equivalent citizen nodes can be listed, `client_endpoint` is the fallback
+        self.client_endpoints = (
+            self.zone.get('client_endpoints') if self.zone else None
+        ) or [self.client_endpoint]
         self.chain_db_dir = self.zone['chain_db_dir'] if self.zone else ''
         self.score_db_icondex_dir = self.zone['score_db_icondex_dir'] if self.zone else ''
 
-        if self.direct_db_access:
+        if self.direct_db_access and backfill_worker:
+            # LevelDB allows only one process, raw blocks are read by backfill parent process
+            self.chain_db = self.score_db_icondex_db = None
+        elif self.direct_db_access:
             assert Path(self.chain_db_dir).exists(), f'Chain DB does not exist: {self.chain_db_dir}'
             self.chain_db = plyvel.DB(self.chain_db_dir)
             self.score_db_icondex_db = plyvel.DB(self.score_db_icondex_dir)
         else:
-            self.icon_service = None
+            self.http_providers = None
+            self.icon_services = None
+            self.endpoint_pool = None
+            self._client_lock = threading.Lock()
+
+        self.client_failures = 0
+        self.client_blocks = 0
+
+        # Raw blocks can skip JSON decoding only if no enabled transform needs ICX transfers
+        transforms = self.zone.get('transforms') if self.zone else None
+        self.prefilter_enabled = bool(
+            self.direct_db_access
+            and not backfill_worker
+            and transforms
+            and not set(transforms).intersection(DataFeeder.FUND_TRANSFER_TRANSFORMS)
+        )
+
+        setting = config.get_setting(working_dir)
+        self.total_supply_refresh_interval = setting.get(
+            'total_supply_refresh_interval', DataFeeder.DEFAULT_TOTAL_SUPPLY_REFRESH_INTERVAL
+        )
+        self._total_supply = None
+        self._total_supply_height = 0
+        self._total_supply_lock = threading.Lock()
+        self.client_hedge_delay = setting.get(
+            'client_hedge_delay', DataFeeder.DEFAULT_CLIENT_HEDGE_DELAY
+        )
+
+    def _setup_client(self):
+        """Build clients of all endpoints once, called from any chain read thread"""
+        with self._client_lock:
+            if self.endpoint_pool is not None:
+                return
+            self.http_providers = {
+                e: PooledHTTPProvider(f"http://{e}", 3, DataFeeder.CLIENT_POOL_SIZE)
+                for e in self.client_endpoints
+            }
+            self.icon_services = {e: IconService(p) for e, p in self.http_providers.items()}
+            # Set last, other threads only use clients once the pool is there
+            self.endpoint_pool = EndpointPool(
+                self.client_endpoints,
+                hedge_delay=self.client_hedge_delay,
+                max_workers=DataFeeder.CLIENT_POOL_SIZE,
+            )
+
+    def _call_client(self, func: Callable[[IconService], Any]) -> Any:
+        """Run one citizen node call on the best endpoint, hedged to another one if slow"""
+        return self.endpoint_pool.call(lambda e: func(self.icon_services[e]))
 
     @handle_client_failure
     def _get_total_supply(self):
@@ -80,108 +229,122 @@ class DataFeeder(BaseDataFeeder):
             r = self.score_db_icondex_db.get(b'total_supply')
             return int.from_bytes(r, 'big') / 10 ** 18
         else:
-            return self.icon_service.get_total_supply() / 10 ** 18
+            return self._call_client(lambda s: s.get_total_supply()) / 10 ** 18
 
     @handle_client_failure
     def _get_block(self, height: int) -> Optional[Dict]:
         if self.direct_db_access:
-            heightkey = BLOCK_HEIGHT_KEY + height.to_bytes(BLOCK_HEIGHT_BYTES_LEN, byteorder='big')
-            block_hash = self.chain_db.get(heightkey)
-
-            if not block_hash:
+            data = self._get_raw_block(height)
+            if not data:
                 return None
 
-            data = self.chain_db.get(block_hash)
-            try:
-                return json.loads(data)
-            except Exception as e:
-                self.logger.error(f'_get_block(): Failed to read block from LevelDB: {height}')
-                self.logger.error(str(e))
-                return None
+            return self._decode_raw_block(height, data)
         else:
-            try:
-                last_block = self._icon_service_get_last_block()
-                if height <= last_block:
-                    return self.icon_service.get_block(height)
-                else:
-                    return -1
-            except Exception as e:
-                self.logger.error(f'_get_block(): icon_service failed to get_block: {height}')
-                self.logger.error(str(e))
+            # Errors are left to `handle_client_failure`, which counts them and probes nodes
+            last_block = self.tip_tracker.get(min_height=height)
+            if last_block is None:
                 return None
+            if height <= last_block:
+                block = self._call_client(lambda s: s.get_block(height))
+                with self._client_lock:
+                    self.client_blocks += 1
+                return block
+            else:
+                return -1
 
-    @handle_client_failure
-    def _icon_service_get_last_block(self):
-        return self.icon_service.get_block('latest')['height']
-
-    async def _get_block_fund_transfer_tx(self, height: int) -> Optional[dict]:
-        """Filter out and process ICX transfering txs."""
-        self.logger.debug(f'Feeding block: {height}')
-
-        block = self._get_block(height)
-        if block is None:
-            self.logger.warning(f'Block {height} not found')
+    def _get_raw_block(self, height: int) -> Optional[bytes]:
+        block_hash = self.chain_db.get(height_key(height))
+        if not block_hash:
             return None
-        elif block == -1:
-            return -1
+        return self.chain_db.get(block_hash)
 
+    def _decode_raw_block(self, height: int, data: bytes) -> Optional[Dict]:
         try:
-            if height < V3_BLOCK_HEIGHT or not self.direct_db_access:
-                txs = block['confirmed_transaction_list']
-                timestamp = block['time_stamp']
-            else:
-                txs = block['transactions']
-                timestamp = int(block['timestamp'], 16)
-
+            return json.loads(data)
         except Exception as e:
-            self.logger.error('ERROR in block data loading, skipped feeding')
-            self.logger.error(e)
-            self.logger.error(traceback.format_exc())
+            self.logger.error(f'_get_block(): Failed to read block from LevelDB: {height}')
+            self.logger.error(str(e))
             return None
 
+    def _iter_raw_blocks(
+        self, start_height: int, end_height: int
+    ) -> Iterator[Tuple[int, Optional[bytes]]]:
+        """Stream raw blocks in height order from chain DB, `direct_db_access` only
+
+        Walks the big-endian height key prefix sequentially under one snapshot,
+        then resolves block hashes in batches sorted by hash,
+        so that block lookups also hit LevelDB in key order.
+        `end_height` is exclusive, iteration stops at the first missing height.
+        """
+        snapshot = self.chain_db.snapshot()
         try:
-            fund_transfer_txs = []
-            for tx in txs:
-                if 'data' in tx:
-                    continue
-                try:
-                    tx_data = {}
-                    tx_data['from'] = tx['from']
-                    tx_data['to'] = tx['to']
-                    tx_data['value'] = (
-                        int(tx['value'], 16) / 10 ** 18
-                        if self.direct_db_access
-                        else tx['value'] / 10 ** 18
-                    )
-                    fund_transfer_txs.append(tx_data)
-                except (ValueError, KeyError):
-                    self.logger.warning('There is issue in fund transfer transaction:')
-                    self.logger.warning(util.pretty(tx))
+            it = snapshot.iterator(start=height_key(start_height), stop=height_key(end_height))
+            expected_height = start_height
+            batch = []
+            for key, block_hash in it:
+                height = int.from_bytes(key[len(BLOCK_HEIGHT_KEY) :], byteorder='big')
+                if height != expected_height:
+                    break
+                batch.append((height, block_hash))
+                expected_height += 1
+
+                if len(batch) == DataFeeder.DB_ITERATOR_BATCH_SIZE:
+                    yield from self._resolve_block_hashes(snapshot, batch)
+                    batch = []
+            yield from self._resolve_block_hashes(snapshot, batch)
+        finally:
+            snapshot.close()
+
+    @staticmethod
+    def _resolve_block_hashes(
+        snapshot: 'plyvel.Snapshot', batch: List[Tuple[int, bytes]]
+    ) -> List[Tuple[int, Optional[bytes]]]:
+        raw_blocks = {
+            h: snapshot.get(block_hash) for h, block_hash in sorted(batch, key=lambda i: i[1])
+        }
+        return [(h, raw_blocks[h]) for h, _ in batch]
 
-        except Exception as e:
-            self.logger.error('ERROR in data pre-processing')
-            self.logger.error('Source TX data:')
-            self.logger.error(util.pretty(tx))
-            self.logger.error(e)
-            self.logger.error(traceback.format_exc())
-            return None
+    def _load_block_digests(self, start_height: int, end_height: int):
+        """Build digests of a height range at once with sequential DB reads, `direct_db_access` only
 
-        return {
-            'data': fund_transfer_txs,
-            'timestamp': timestamp,
-        }
+        Heights already in `block_cache` or `digest_store` are skipped.
+        `end_height` is exclusive.
+        """
+        missing = [
+            h
+            for h in range(start_height, end_height)
+            if h not in self.block_cache and not (self.digest_store and self.digest_store.has(h))
+        ]
+        if not missing:
+            return
+
+        missing = set(missing)
+        for height, data in self._iter_raw_blocks(min(missing), max(missing) + 1):
+            if height not in missing:
+                continue
+            digest = self._digest_from_raw_block(height, data) if data else None
+            if digest is None:
+                break
+            self._keep_digest(height, digest)
 
-    async def _get_block_stake_tx(self, height: int) -> Optional[dict]:
-        """Filter out and process `setStake` txs."""
-        self.logger.debug(f'Feeding block: {height}')
+    @handle_client_failure
+    def _icon_service_get_last_block(self):
+        return self._call_client(lambda s: s.get_block('latest'))['height']
 
-        block = self._get_block(height)
-        if block is None:
-            self.logger.warning(f'Block {height} not found')
-            return None
-        elif block == -1:
-            return -1
+    def _build_block_digest(self, height: int, block: dict) -> Optional[dict]:
+        """Classify all txs of one block in a single pass.
+
+        Every transform input is projected from this digest, so the tx list
+        and V3 format detection are only processed once per height.
 
+        Digest format
+        {
+            'timestamp': int,
+            'fund_transfer': [{'from': str, 'to': str, 'value': float, 'loop': str}],
+            'stake': {ADDRESS: float},
+            'delegation': {ADDRESS: list},
+        }
+        """
         try:
             if height < V3_BLOCK_HEIGHT or not self.direct_db_access:
                 txs = block['confirmed_transaction_list']
@@ -196,11 +359,31 @@ class DataFeeder(BaseDataFeeder):
             self.logger.error(traceback.format_exc())
             return None
 
+        fund_transfer_txs = []
+        set_stake_wallets = {}
+        set_delegation_wallets = {}
         try:
-            set_stake_wallets = {}
             for tx in txs:
                 if 'data' not in tx:
+                    try:
+                        tx_data = {}
+                        tx_data['from'] = tx['from']
+                        tx_data['to'] = tx['to']
+                        tx_data['value'] = (
+                            int(tx['value'], 16) / 10 ** 18
+                            if self.direct_db_access
+                            else tx['value'] / 10 ** 18
+                        )
+                        # Exact value in loop, as hex string to fit in any serialization
+                        tx_data['loop'] = (
+                            hex(int(tx['value'], 16)) if self.direct_db_access else hex(tx['value'])
+                        )
+                        fund_transfer_txs.append(tx_data)
+                    except (ValueError, KeyError):
+                        self.logger.warning('There is issue in fund transfer transaction:')
+                        self.logger.warning(util.pretty(tx))
                     continue
+
                 if 'method' not in tx['data']:
                     continue
                 if tx['data']['method'] == 'setStake':
@@ -211,98 +394,214 @@ class DataFeeder(BaseDataFeeder):
                         self.logger.warning('There is issue in setStake transaction:')
                         self.logger.warning(util.pretty(tx))
 
+                elif tx['data']['method'] == 'setDelegation':
+                    try:
+                        set_delegation_wallets[tx["from"]] = tx['data']['params']['delegations']
+                    except KeyError:
+                        self.logger.warning('There is issue in setDelegation transaction:')
+                        self.logger.warning(util.pretty(tx))
+
         except Exception as e:
             self.logger.error('ERROR in data pre-processing')
+            self.logger.error('Source TX data:')
+            self.logger.error(util.pretty(tx))
             self.logger.error(e)
             self.logger.error(traceback.format_exc())
             return None
 
         return {
-            'data': set_stake_wallets,
             'timestamp': timestamp,
-            'total_supply': self._get_total_supply(),
+            'fund_transfer': fund_transfer_txs,
+            'stake': set_stake_wallets,
+            'delegation': set_delegation_wallets,
         }
 
-    async def _get_block_stake_delegation_tx(self, height: int) -> Optional[dict]:
-        """Filter out and process `setStake` and `setDelegation` txs."""
-        self.logger.debug(f'Feeding block: {height}')
+    def _digest_from_raw_block(self, height: int, data: bytes) -> Optional[dict]:
+        """Build digest from raw block JSON, try byte-level prefilter first if enabled."""
+        if self.prefilter_enabled:
+            digest = prefilter_raw_block(height, data)
+            if digest is not None:
+                return digest
 
-        block = self._get_block(height)
+        block = self._decode_raw_block(height, data)
         if block is None:
-            self.logger.warning(f'Block {height} not found')
             return None
-        elif block == -1:
-            return -1
+        return self._build_block_digest(height, block)
 
-        try:
-            if height < V3_BLOCK_HEIGHT or not self.direct_db_access:
-                txs = block['confirmed_transaction_list']
-                timestamp = block['time_stamp']
-            else:
-                txs = block['transactions']
-                timestamp = int(block['timestamp'], 16)
+    def _keep_digest(self, height: int, digest: dict):
+        self.block_cache.put(height, digest)
+        # Prefiltered digests lack ICX transfers, they must not be reused by other transforms
+        if self.digest_store and not digest.get('prefiltered'):
+            self.digest_store.put(height, digest)
 
-        except Exception as e:
-            self.logger.error('ERROR in block data loading, skipped feeding')
-            self.logger.error(e)
-            self.logger.error(traceback.format_exc())
-            return None
+    def _get_block_digest(self, height: int) -> Optional[Union[dict, int]]:
+        """Get digest of one block, digests are shared by all transforms via `block_cache`.
 
-        try:
-            set_stake_wallets = {}
-            set_delegation_wallets = {}
-            for tx in txs:
-                if 'data' not in tx:
-                    continue
-                if 'method' not in tx['data']:
-                    continue
-                if tx['data']['method'] == 'setStake':
-                    try:
-                        stake_value = int(tx['data']['params']['value'], 16) / 10 ** 18
-                        set_stake_wallets[tx["from"]] = stake_value
-                    except (ValueError, KeyError):
-                        self.logger.warning('There is issue in setStake transaction:')
-                        self.logger.warning(util.pretty(tx))
+        Lookup order is `block_cache`, then `digest_store`, then the chain itself.
+        Only successfully built digests are cached, `None` and `-1` are always re-checked.
+        """
+        digest = self.block_cache.get(height)
+        if digest is not None:
+            return digest
 
-                elif tx['data']['method'] == 'setDelegation':
-                    try:
-                        set_delegation_wallets[tx["from"]] = tx['data']['params']['delegations']
-                    except KeyError:
-                        self.logger.warning('There is issue in setDelegation transaction:')
-                        self.logger.warning(util.pretty(tx))
+        if self.digest_store:
+            digest = self.digest_store.get(height)
+            if digest is not None:
+                self.block_cache.put(height, digest)
+                return digest
 
-        except Exception as e:
-            self.logger.error('ERROR in data pre-processing')
-            self.logger.error(e)
-            self.logger.error(traceback.format_exc())
-            return None
+        self.logger.debug(f'Feeding block: {height}')
+        if self.direct_db_access:
+            data = self._get_raw_block(height)
+            if not data:
+                self.logger.warning(f'Block {height} not found')
+                return None
+            digest = self._digest_from_raw_block(height, data)
+        else:
+            block = self._get_block(height)
+            if block is None:
+                self.logger.warning(f'Block {height} not found')
+                return None
+            elif block == -1:
+                return -1
+            digest = self._build_block_digest(height, block)
+
+        if digest is not None:
+            self._keep_digest(height, digest)
+        return digest
+
+    def _prefetch_block(self, height: int) -> bool:
+        return isinstance(self._get_block_digest(height), dict)
+
+    async def _get_block_fund_transfer_tx(self, height: int) -> Optional[dict]:
+        """Project ICX transfering txs from block digest."""
+        digest = await self.run_blocking(self._get_block_digest, height)
+        if digest in [None, -1]:
+            return digest
 
         return {
-            'data': {'stake': set_stake_wallets, 'delegation': set_delegation_wallets},
-            'timestamp': timestamp,
-            'total_supply': self._get_total_supply(),
+            'data': digest['fund_transfer'],
+            'timestamp': digest['timestamp'],
         }
 
+    def _get_memoized_total_supply(self, height: int) -> Optional[float]:
+        """Total supply is only fetched again every `total_supply_refresh_interval` blocks."""
+        with self._total_supply_lock:
+            if (
+                self._total_supply is None
+                or abs(height - self._total_supply_height) >= self.total_supply_refresh_interval
+            ):
+                total_supply = self._get_total_supply()
+                if total_supply is not None:
+                    self._total_supply = total_supply
+                    self._total_supply_height = height
+            return self._total_supply
+
+    async def _get_block_stake_tx(self, height: int) -> Optional[dict]:
+        """Project `setStake` txs from block digest.
+
+        `total_supply` is only needed to compute unlock period of unstaking wallets,
+        so it is fetched lazily and only attached to blocks having `setStake` txs.
+        """
+        digest = await self.run_blocking(self._get_block_digest, height)
+        if digest in [None, -1]:
+            return digest
+
+        ret = {
+            'data': digest['stake'],
+            'timestamp': digest['timestamp'],
+        }
+        if digest['stake']:
+            ret['total_supply'] = await self.run_blocking(self._get_memoized_total_supply, height)
+        return ret
+
+    async def _get_block_stake_delegation_tx(self, height: int) -> Optional[dict]:
+        """Project `setStake` and `setDelegation` txs from block digest."""
+        digest = await self.run_blocking(self._get_block_digest, height)
+        if digest in [None, -1]:
+            return digest
+
+        return {
+            'data': {'stake': digest['stake'], 'delegation': digest['delegation']},
+            'timestamp': digest['timestamp'],
+        }
+
+    def _get_feeding_method(self, transform_id: str):
+        if transform_id in ['stake_history', 'stake_top100', 'recent_stake_wallets']:
+            return self._get_block_stake_tx
+        elif transform_id in ['abstention_stake', 'passive_stake_wallets']:
+            return self._get_block_stake_delegation_tx
+        elif transform_id == 'funded_wallets':
+            return self._get_block_fund_transfer_tx
+
     @handle_unknown_failure
     async def get_block(self, height: int, transform_id: str) -> Optional[dict]:
-        if transform_id == 'stake_history':
-            return await self._get_block_stake_tx(height)
-        elif transform_id == 'stake_top100':
-            return await self._get_block_stake_tx(height)
-        elif transform_id == 'recent_stake_wallets':
-            return await self._get_block_stake_tx(height)
-        elif transform_id == 'abstention_stake':
-            return await self._get_block_stake_delegation_tx(height)
-        elif transform_id == 'funded_wallets':
-            return await self._get_block_fund_transfer_tx(height)
-        elif transform_id == 'passive_stake_wallets':
-            return await self._get_block_stake_delegation_tx(height)
+        feed = self._get_feeding_method(transform_id)
+        if feed:
+            await self.wait_prefetched(height)
+            block = await feed(height)
+            if block not in [None, -1]:
+                self.schedule_prefetch(height, transform_id)
+            return block
 
     @handle_unknown_failure
-    async def last_block_height(self) -> Optional[int]:
-        """Get last block height from chain
-        """
+    async def get_blocks(self, start_height: int, count: int, transform_id: str) -> List:
+        """Feed a contiguous range of blocks in one call, clamped to current chain tip."""
+        feed = self._get_feeding_method(transform_id)
+        if not feed:
+            return []
+
+        last_height = await self.last_block_height()
+        if last_height is None:
+            return []
+        count = min(count, DataFeeder.MAX_BLOCKS_PER_CALL, last_height - start_height + 1)
+
+        if self.direct_db_access and count > 1:
+            await self.run_blocking(
+                self._load_block_digests,
+                start_height,
+                start_height + min(count, self.block_cache.capacity),
+            )
+
+        blocks = []
+        for height in range(start_height, start_height + count):
+            await self.wait_prefetched(height)
+            block = await feed(height)
+            if block in [None, -1]:
+                break
+            blocks.append(block)
+
+        if blocks:
+            self.schedule_prefetch(start_height + len(blocks) - 1, transform_id)
+        return blocks
+
+    def read_backfill_chunk(self, start_height: int, end_height: int) -> Optional[List]:
+        if self.direct_db_access:
+            return list(self._iter_raw_blocks(start_height, end_height))
+        return None
 
+    def build_backfill_chunk(
+        self, start_height: int, end_height: int, source: Optional[List]
+    ) -> List[Tuple[int, dict]]:
+        digests = []
+        if self.direct_db_access:
+            for height, data in source:
+                digest = self._digest_from_raw_block(height, data) if data else None
+                if digest is None:
+                    break
+                digests.append((height, digest))
+        else:
+            for height in range(start_height, end_height):
+                block = self._get_block(height)
+                if not isinstance(block, dict):
+                    break
+                digest = self._build_block_digest(height, block)
+                if digest is None:
+                    break
+                digests.append((height, digest))
+        return digests
+
+    def _get_last_block_height(self) -> Optional[int]:
         if self.direct_db_access:
             block_hash = self.chain_db.get(DataFeeder.LAST_BLOCK_KEY)
             data = self.chain_db.get(block_hash)
@@ -311,3 +610,25 @@ class DataFeeder(BaseDataFeeder):
                 return int(block['height'], 16)
         else:
             return self._icon_service_get_last_block()
+
+    @handle_unknown_failure
+    async def last_block_height(self) -> Optional[int]:
+        """Get last block height from chain, served by `tip_tracker`
+        """
+        return await self.run_blocking(self.tip_tracker.get)
+
+    async def client_stats(self) -> Dict:
+        """Get request counters of the citizen node client
+        """
+        if self.direct_db_access:
+            return {}
+        requests_count = sum(p.request_count for p in (self.http_providers or {}).values())
+        return {
+            'endpoints': self.endpoint_pool.stats() if self.endpoint_pool else {},
+            'requests': requests_count,
+            'blocks': self.client_blocks,
+            'requests_per_block': (
+                round(requests_count / self.client_blocks, 4) if self.client_blocks else 0
+            ),
+            'failures': self.client_failures,
+        }
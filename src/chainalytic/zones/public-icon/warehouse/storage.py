@@ -83,6 +83,7 @@ from typing import Collection, Dict, List, Optional, Set, Tuple, Union
 
 import plyvel
 
+from chainalytic.aggregator.leaderboard import Leaderboard
 from chainalytic.common import config, zone_manager
 from chainalytic.warehouse.storage import BaseStorage
 
@@ -321,15 +322,17 @@ class Storage(BaseStorage):
         min_balance: float = api_params['min_balance']
         transform_id: str = api_params['transform_id']
 
-        wallets = {}
+        leaderboard = Leaderboard(Storage.MAX_FUNDED_WALLETS_LIST)
+        total = 0
         db = self.transform_storage_dbs[transform_id]
         for addr, balance in db:
-            if addr.startswith(b'hx') and float(balance) >= min_balance and float(balance) > 0:
-                wallets[addr.decode()] = float(balance)
-
-        wallets = {k: v for k, v in sorted(wallets.items(), key=lambda item: item[1], reverse=1)}
-        total = len(wallets)
-        wallets = {k: wallets[k] for k in list(wallets)[: Storage.MAX_FUNDED_WALLETS_LIST]}
+            if not addr.startswith(b'hx'):
+                continue
+            balance = float(balance)
+            if balance >= min_balance and balance > 0:
+                leaderboard.put(addr.decode(), balance)
+                total += 1
+        wallets = leaderboard.to_dict()
 
         height = db.get(Storage.FUNDED_WALLETS_HEIGHT_KEY)
         height = int(height.decode()) if height else None
@@ -363,20 +366,17 @@ class Storage(BaseStorage):
         latest_height = db.get(Storage.PASSIVE_STAKE_WALLETS_HEIGHT_KEY)
         latest_height = int(latest_height.decode()) if latest_height else None
 
-        wallets = {}
+        leaderboard = Leaderboard(Storage.MAX_PASSIVE_STAKE_WALLETS_LIST)
+        total = 0
         for addr, height in db:
+            if not addr.startswith(b'hx'):
+                continue
             height = int(height)
-            if addr.startswith(b'hx') and latest_height - height <= max_inactive_duration:
-                wallets[addr.decode()] = f'{height}:{latest_height - height}'
-
-        wallets = {
-            k: v
-            for k, v in sorted(
-                wallets.items(), key=lambda item: int(item[1].split(':')[1]), reverse=1
-            )
-        }
-        total = len(wallets)
-        wallets = {k: wallets[k] for k in list(wallets)[: Storage.MAX_PASSIVE_STAKE_WALLETS_LIST]}
+            inactive_duration = latest_height - height
+            if inactive_duration <= max_inactive_duration:
+                leaderboard.put(addr.decode(), inactive_duration, f'{height}:{inactive_duration}')
+                total += 1
+        wallets = leaderboard.to_dict()
 
         return {'wallets': wallets, 'height': latest_height, 'total': total}
 
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from chainalytic.common import config, zone_manager
+
+LOOP_PER_ICX = 10 ** 18
+
+
+def load_transform(working_dir: str):
+    config.init_user_config(working_dir)
+    mods = zone_manager.load_zone('public-icon', working_dir)['aggregator']
+    transform_id = 'funded_wallets'
+    return mods['transform_registry'][transform_id].Transform(
+        working_dir, 'public-icon', transform_id
+    )
+
+
+def transfer(source: str, dest: str, loop: int) -> dict:
+    return {'from': source, 'to': dest, 'value': loop / LOOP_PER_ICX, 'loop': hex(loop)}
+
+
+def put_balance(transform, addr: str, loop: int):
+    transform.transform_cache_db.put(b'loop:' + addr.encode(), str(loop).encode())
+
+
+def get_balance(transform, addr: str) -> int:
+    return int(transform.transform_cache_db.get(b'loop:' + addr.encode(), b'0'))
+
+
+@pytest.fixture
+def transform(tmp_path):
+    transform = load_transform(tmp_path.as_posix())
+    transform.transform_cache_db.put(b'last_state_height', b'9')
+    yield transform
+    transform.transform_cache_db.close()
+
+
+def execute(transform, height: int, txs: list) -> dict:
+    return asyncio.get_event_loop().run_until_complete(transform.execute(height, {'data': txs}))
+
+
+def test_legacy_balance(transform):
+    db = transform.transform_cache_db
+    db.put(b'hxa', b'12.5')
+    db.put(b'hxc', b'1.0')
+
+    # Legacy float balance is read once, then rewritten in loop under the new key
+    output = execute(
+        transform,
+        10,
+        [transfer('hxa', 'hxb', 25 * LOOP_PER_ICX // 10), transfer('hxc', 'hxb', 5 * LOOP_PER_ICX)],
+    )
+    assert output['misc']['updated_wallets']['wallets'] == {'hxa': '10', 'hxb': '2.5'}
+    assert get_balance(transform, 'hxa') == 10 * LOOP_PER_ICX
+    assert db.get(b'hxa') is None
+
+    # Legacy balance which was not rewritten is neither cached nor dropped
+    assert 'hxc' not in transform.balance_cache
+    assert db.get(b'hxc') == b'1.0'
+    execute(transform, 11, [transfer('hxc', 'hxb', LOOP_PER_ICX // 2)])
+    assert get_balance(transform, 'hxc') == LOOP_PER_ICX // 2
+    assert get_balance(transform, 'hxb') == 3 * LOOP_PER_ICX
+    assert db.get(b'hxc') is None
+
+
+def test_loop_arithmetic(transform):
+    put_balance(transform, 'hxa', 800460000 * LOOP_PER_ICX)
+
+    # Single loops are neither lost nor rounded, as they would be in float ICX
+    output = execute(transform, 10, [transfer('hxa', 'hxb', 1)] * 3)
+    assert output['misc']['updated_wallets']['wallets'] == {
+        'hxa': '800459999.999999999999999997',
+        'hxb': '0.000000000000000003',
+    }
+    assert get_balance(transform, 'hxa') + get_balance(transform, 'hxb') == (
+        800460000 * LOOP_PER_ICX
+    )
+    assert transform.get_balance('hxb') == 3
+
+
+def test_same_block_transfers(transform):
+    put_balance(transform, 'hxa', 5 * LOOP_PER_ICX)
+
+    # Later transfers see earlier ones of the same block, overdrafts are skipped
+    execute(
+        transform,
+        10,
+        [
+            transfer('hxa', 'hxb', 5 * LOOP_PER_ICX),
+            transfer('hxb', 'hxc', 4 * LOOP_PER_ICX),
+            transfer('hxa', 'hxc', 1),
+        ],
+    )
+    assert get_balance(transform, 'hxa') == 0
+    assert get_balance(transform, 'hxb') == LOOP_PER_ICX
+    assert get_balance(transform, 'hxc') == 4 * LOOP_PER_ICX
+
+
+def test_digest_without_loop(transform):
+    tx = transfer('hxa', 'hxb', 1)
+    del tx['loop']
+    with pytest.raises(ValueError):
+        execute(transform, 10, [tx])
+
+
+def test_discard_keeps_committed_balances(transform):
+    put_balance(transform, 'hxa', 5 * LOOP_PER_ICX)
+    loop = asyncio.get_event_loop()
+    tx = transfer('hxa', 'hxb', LOOP_PER_ICX)
+
+    outputs = loop.run_until_complete(transform.execute_batch(10, [{'data': [tx]}] * 2))
+    assert len(outputs) == 2
+    transform.discard_batch()
+    assert transform.get_balance('hxa') == 5 * LOOP_PER_ICX
+    assert transform.get_balance('hxb') == 0
+
+    assert loop.run_until_complete(transform.execute_staged(10, {'data': [tx]}))
+    transform.discard_staged()
+    assert transform.get_balance('hxa') == 5 * LOOP_PER_ICX
+    assert transform.get_balance('hxb') == 0
+
+    # Committed batch is what cache serves from then on
+    loop.run_until_complete(transform.execute_batch(10, [{'data': [tx]}]))
+    transform.commit_batch()
+    assert transform.get_balance('hxa') == 4 * LOOP_PER_ICX
+    assert get_balance(transform, 'hxb') == LOOP_PER_ICX
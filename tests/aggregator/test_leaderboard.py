@@ -0,0 +1,58 @@
+import random
+
+import pytest
+from chainalytic.aggregator.leaderboard import Leaderboard
+
+
+def test_leaderboard_bounded():
+    board = Leaderboard(3)
+    assert board.put('a', 10)
+    assert board.put('b', 30, 'b:30')
+    assert board.put('c', 20)
+    assert not board.put('d', 5)
+    assert board.put('e', 25)
+
+    assert board.items() == [('b', 'b:30'), ('e', 25), ('c', 20)]
+    assert 'a' not in board
+    assert board.min_score() == 20
+
+    # Updated entry moves to its new slot
+    assert board.put('b', 1)
+    assert board.items() == [('e', 25), ('c', 20), ('b', 1)]
+
+    assert board.remove('e')
+    assert not board.remove('e')
+    assert board.to_dict() == {'c': 20, 'b': 1}
+
+
+def test_leaderboard_trim():
+    board = Leaderboard(10)
+    for i in range(10):
+        board.put(f'k{i}', i)
+    assert board.trim(7) == ['k0', 'k1', 'k2', 'k3', 'k4', 'k5', 'k6']
+    assert [k for k, _ in board.items()] == ['k9', 'k8', 'k7']
+
+
+def test_leaderboard_persistence():
+    board = Leaderboard(4)
+    for key, score in [('a', 1.5), ('b', 3), ('c', 2), ('d', 4), ('e', 0.5)]:
+        board.put(key, score, f'{key}:{score}')
+
+    restored = Leaderboard.loads(board.dumps())
+    assert restored.capacity == 4
+    assert restored.items() == board.items()
+
+    smaller = Leaderboard.loads(board.dumps(), capacity=2)
+    assert smaller.to_dict() == {'d': 'd:4', 'b': 'b:3'}
+
+
+def test_leaderboard_against_sort():
+    rnd = random.Random(0)
+    scores = {}
+    board = Leaderboard(50)
+    for key in range(5000):
+        scores[key] = rnd.randrange(100000)
+        board.put(key, scores[key])
+
+    expected = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:50]
+    assert board.items() == expected
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+from chainalytic.aggregator.ordered_index import OrderedIndex
+
+
+def test_ordered_index_top():
+    index = OrderedIndex()
+    index.put('a', 10)
+    index.put('b', 30)
+    index.put('c', 20)
+    index.put('d', 20)
+
+    assert index.top(2) == [('b', 30), ('c', 20)]
+    assert index.top(10) == [('b', 30), ('c', 20), ('d', 20), ('a', 10)]
+    assert index.rank('a') == 3
+
+    # Wallet leaving the top list comes back once it is large enough again
+    index.put('b', 5)
+    assert index.top(2) == [('c', 20), ('d', 20)]
+    index.put('b', 25)
+    assert index.top(1) == [('b', 25)]
+
+    assert index.remove('b') == 25
+    assert index.remove('b') is None
+    assert 'b' not in index
+    assert len(index) == 3
+
+
+def test_ordered_index_against_sort():
+    rnd = random.Random(0)
+    index = OrderedIndex(chunk_size=8)
+    values = {}
+    for _ in range(2000):
+        key = rnd.randrange(300)
+        if rnd.random() < 0.2:
+            index.remove(key)
+            values.pop(key, None)
+        else:
+            value = rnd.randrange(1000)
+            index.put(key, value)
+            values[key] = value
+
+    expected = sorted(values.items(), key=lambda item: (-item[1], item[0]))
+    assert list(index) == expected
+    assert index.top(50) == expected[:50]
+    assert all(index.rank(key) == i for i, (key, _) in enumerate(expected))
@@ -0,0 +1,52 @@
+import plyvel
+import pytest
+from chainalytic.aggregator.overlay_db import OverlayDB
+
+
+def test_overlay_db(tmp_path):
+    db = plyvel.DB(tmp_path.joinpath('db').as_posix(), create_if_missing=True)
+    db.put(b'a', b'1')
+    db.put(b'b', b'2')
+
+    overlay = OverlayDB(db)
+    wb = overlay.write_batch()
+    wb.put(b'a', b'10')
+    wb.delete(b'b')
+    wb.put(b'c', b'3')
+
+    # Batch is not visible until written
+    assert overlay.get(b'a') == b'1'
+    wb.write()
+    assert overlay.get(b'a') == b'10'
+    assert overlay.get(b'b') is None
+    assert overlay.get(b'b', b'x') == b'x'
+    assert overlay.get(b'c') == b'3'
+
+    # Underlying DB is untouched until flush
+    assert db.get(b'a') == b'1'
+    assert db.get(b'b') == b'2'
+    assert db.get(b'c') is None
+
+    assert overlay.flush() == 3
+    assert db.get(b'a') == b'10'
+    assert db.get(b'b') is None
+    assert db.get(b'c') == b'3'
+    assert overlay.flush() == 0
+    db.close()
+
+
+def test_overlay_db_iterator(tmp_path):
+    db = plyvel.DB(tmp_path.joinpath('db').as_posix(), create_if_missing=True)
+    db.put(b'p:a', b'1')
+    db.put(b'p:b', b'2')
+    db.put(b'q:a', b'3')
+
+    overlay = OverlayDB(db)
+    overlay.put(b'p:c', b'4')
+    overlay.put(b'p:a', b'10')
+    overlay.delete(b'p:b')
+    overlay.put(b'q:b', b'5')
+
+    assert list(overlay.iterator(prefix=b'p:')) == [(b'p:a', b'10'), (b'p:c', b'4')]
+    assert len(list(overlay.iterator())) == 4
+    db.close()
@@ -0,0 +1,18 @@
+from chainalytic.aggregator.__main__ import Scheduler
+
+
+def test_prefetch_blocks():
+    scheduler = Scheduler(batch_size=100, prefetch_depth=4, catch_up_lag=100, tip_follow_lag=10)
+
+    # Tip-follow mode still keeps single blocks in all three stages
+    assert scheduler.batch_blocks('t') == 1
+    assert scheduler.prefetch_blocks('t') == 12
+
+    # Catch-up mode fetches whole batches, `prefetch_depth` of them in each stage
+    scheduler._modes['t'] = Scheduler.CATCH_UP
+    assert scheduler.batch_blocks('t') == 100
+    assert scheduler.prefetch_blocks('t') == 1200
+
+    scheduler = Scheduler(batch_size=0, prefetch_depth=0, catch_up_lag=100, tip_follow_lag=10)
+    scheduler._modes['t'] = Scheduler.CATCH_UP
+    assert scheduler.prefetch_blocks('t') == 3
@@ -0,0 +1,46 @@
+import pytest
+from chainalytic.aggregator.sliding_window import SlidingWindow
+
+
+def test_sliding_window_expire():
+    window = SlidingWindow(span=10)
+    window.push('a', 1, 'a1')
+    window.push('b', 3, 'b3')
+    window.push('a', 5, 'a5')
+    window.push('c', 8, 'c8')
+
+    assert window.items() == [('c', 'c8'), ('a', 'a5'), ('b', 'b3')]
+    assert window.items(limit=2) == [('c', 'c8'), ('a', 'a5')]
+
+    # Outdated record of `a` at height 1 does not expire live record at height 5
+    assert window.expire(12) == []
+    assert window.expire(14) == ['b']
+    assert window.to_dict() == {'c': 'c8', 'a': 'a5'}
+    assert window.expire(100) == ['a', 'c']
+    assert len(window) == 0
+
+    assert window.push('d', 100, 'd100')
+    assert not window.push('e', 99, 'e99')
+
+
+def test_sliding_window_capacity():
+    window = SlidingWindow(span=1000, capacity=3)
+    for height in range(10):
+        window.push(f'k{height % 5}', height, height)
+
+    assert window.items() == [('k4', 9), ('k3', 8), ('k2', 7)]
+    assert 'k1' not in window
+
+
+def test_sliding_window_persistence():
+    window = SlidingWindow(span=50, capacity=10)
+    for height in range(200):
+        window.push(f'k{height % 7}', height, f'{height}')
+
+    restored = SlidingWindow.loads(window.dumps())
+    assert (restored.span, restored.capacity) == (50, 10)
+    assert restored.items() == window.items()
+
+    restored = SlidingWindow.loads(window.dumps(), span=5)
+    assert restored.expire(199) == ['k4']
+    assert restored.expire(201) == ['k5', 'k6']
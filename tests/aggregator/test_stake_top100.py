@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+from chainalytic.common import config, zone_manager
+
+
+def load_transform(working_dir: str):
+    config.init_user_config(working_dir)
+    mods = zone_manager.load_zone('public-icon', working_dir)['aggregator']
+    transform_id = 'stake_top100'
+    return mods['transform_registry'][transform_id].Transform(
+        working_dir, 'public-icon', transform_id
+    )
+
+
+def test_load_stake_index(tmp_path):
+    transform = load_transform(tmp_path.as_posix())
+    db = transform.transform_cache_db
+    db.put(b'stake_top100', json.dumps({'hxa': 10.5, 'hxb': 0, 'hxc': 20, 'hxd': -1}).encode())
+
+    # Legacy top wallets are moved to one key per staker, unstaked wallets are skipped
+    stake_index = transform.load_stake_index()
+    assert stake_index.top(10) == [('hxc', 20), ('hxa', 10.5)]
+    assert db.get(b'stake_top100') is None
+    assert dict(db.iterator(prefix=b'stake:')) == {b'stake:hxa': b'10.5', b'stake:hxc': b'20'}
+
+    # Migrated cache loads the same index
+    assert transform.load_stake_index().top(10) == [('hxc', 20), ('hxa', 10.5)]
+
+    db.put(b'last_state_height', b'9')
+    output = asyncio.get_event_loop().run_until_complete(
+        transform.execute(10, {'data': {'hxa': 0, 'hxe': 30}})
+    )
+    assert output['misc']['latest_stake_top100']['wallets'] == {'hxe': 30, 'hxc': 20}
+    assert transform.load_stake_index().top(10) == [('hxe', 30), ('hxc', 20)]
+    db.close()
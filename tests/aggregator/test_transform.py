@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from chainalytic.aggregator.transform import BaseTransform
+from chainalytic.common import config
+
+
+class CounterTransform(BaseTransform):
+    """Store each executed height and count executed blocks, fail on height 5"""
+
+    def __init__(self, working_dir: str, zone_id: str, transform_id: str):
+        super(CounterTransform, self).__init__(working_dir, zone_id, transform_id)
+        self.resets = 0
+
+    def reset_state(self):
+        self.resets += 1
+
+    async def execute(self, height, input_data):
+        if height == 5:
+            raise Exception('Failed block')
+        count = int(self.transform_cache_db.get(b'count', b'0'))
+        self.transform_cache_db.put(b'count', str(count + 1).encode())
+        self.transform_cache_db.put(b'last_state_height', str(height).encode())
+        return {'height': height, 'data': {}}
+
+
+def test_execute_batch(tmp_path):
+    working_dir = tmp_path.as_posix()
+    config.init_user_config(working_dir)
+    transform = CounterTransform(working_dir, 'public-icon', 'test_execute_batch')
+    db = transform.transform_cache_db
+    loop = asyncio.get_event_loop()
+
+    # Changes stay pending until committed, execution stops at failed block
+    outputs = loop.run_until_complete(transform.execute_batch(1, [{}] * 10))
+    assert [o['height'] for o in outputs] == [1, 2, 3, 4]
+    assert db.get(b'last_state_height') is None
+    assert transform.commit_batch() == 2
+    assert db.get(b'last_state_height') == b'4'
+    assert transform.pending_batch is None
+
+    # Discarded changes never reach transform cache
+    outputs = loop.run_until_complete(transform.execute_batch(6, [{}] * 3))
+    assert len(outputs) == 3
+    transform.discard_batch()
+    assert db.get(b'last_state_height') == b'4'
+    assert transform.resets == 1
+    assert transform.commit_batch() == 0
+    db.close()
+
+
+def test_execute_staged(tmp_path):
+    working_dir = tmp_path.as_posix()
+    config.init_user_config(working_dir)
+    transform = CounterTransform(working_dir, 'public-icon', 'test_execute_staged')
+    db = transform.transform_cache_db
+    loop = asyncio.get_event_loop()
+
+    # Each block sees changes of previous staged blocks, transform cache does not
+    for height in [1, 2, 3]:
+        assert loop.run_until_complete(transform.execute_staged(height, {}))
+    assert db.get(b'count') is None
+
+    assert transform.commit_staged(1) == 2
+    assert db.get(b'count') == b'1'
+    assert loop.run_until_complete(transform.execute_staged(4, {}))
+    assert transform.commit_staged(3) == 4
+    assert db.get(b'count') == b'3'
+    assert db.get(b'last_state_height') == b'3'
+
+    # Failed block is not staged, discarded blocks never reach transform cache
+    with pytest.raises(Exception):
+        loop.run_until_complete(transform.execute_staged(5, {}))
+    assert [h for h, _ in transform.staged_blocks] == [4]
+    assert transform.transform_cache_db is db
+    transform.discard_staged()
+    assert transform.resets == 1
+    assert transform.commit_staged(4) == 0
+    assert db.get(b'count') == b'3'
+    db.close()
+
+
+def test_execute_staged_batch(tmp_path):
+    working_dir = tmp_path.as_posix()
+    config.init_user_config(working_dir)
+    transform = CounterTransform(working_dir, 'public-icon', 'test_execute_staged_batch')
+    db = transform.transform_cache_db
+    loop = asyncio.get_event_loop()
+
+    # Whole run is staged under its last height, next run reads through it
+    outputs = loop.run_until_complete(transform.execute_staged_batch(1, [{}] * 3))
+    assert [o['height'] for o in outputs] == [1, 2, 3]
+    outputs = loop.run_until_complete(transform.execute_staged_batch(4, [{}] * 3))
+    assert [o['height'] for o in outputs] == [4]
+    assert [h for h, _ in transform.staged_blocks] == [3, 4]
+    assert transform.transform_cache_db is db
+    assert db.get(b'count') is None
+
+    assert transform.commit_staged(3) == 2
+    assert db.get(b'count') == b'3'
+    assert transform.commit_staged(4) == 2
+    assert db.get(b'count') == b'4'
+
+    # Run failing on its first block stages nothing
+    assert loop.run_until_complete(transform.execute_staged_batch(5, [{}] * 2)) == []
+    assert not transform.staged_blocks
+    db.close()
@@ -0,0 +1,113 @@
+import json
+import random
+
+import plyvel
+import pytest
+from chainalytic.common import config, zone_manager
+
+
+@pytest.fixture
+def stake_history(tmp_path):
+    working_dir = tmp_path.as_posix()
+    config.init_user_config(working_dir)
+    return zone_manager.load_zone('public-icon', working_dir)['aggregator']['transform_registry'][
+        'stake_history'
+    ]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = plyvel.DB(tmp_path.joinpath('cache').as_posix(), create_if_missing=True)
+    yield db
+    db.close()
+
+
+class LinearScan(object):
+    """Unstaking wallets as kept by older versions, scanned in full on every block"""
+
+    def __init__(self):
+        self.wallets = {}
+
+    def expire(self, height: int) -> list:
+        expired = []
+        for addr in list(self.wallets):
+            stake_value, _, _, unlock_height = self.wallets[addr].split(':')
+            if int(unlock_height) <= height:
+                self.wallets.pop(addr)
+                expired.append((addr, stake_value))
+        return expired
+
+    @property
+    def total_unstaking(self) -> float:
+        return sum(float(v.split(':')[1]) for v in self.wallets.values())
+
+
+def test_expire(stake_history, db):
+    index = stake_history.UnstakingIndex(db)
+    with db.write_batch() as batch:
+        index.put('hxa', 10, 1.5, 1, 100, batch)
+        index.put('hxb', 20, 2.25, 1, 50, batch)
+        # Moved unlock height leaves an outdated heap item behind
+        index.put('hxa', 10, 3.5, 2, 150, batch)
+
+    assert index.total_unstaking == 5.75
+    with db.write_batch() as batch:
+        assert index.expire(49, batch) == []
+        assert index.expire(100, batch) == [('hxb', '20')]
+        assert index.expire(149, batch) == []
+    assert index.total_unstaking == 3.5
+    assert db.get(b'unstaking:hxb') is None
+    assert db.get(b'unstaking:hxa') == b'10:3.5:2:150'
+
+    with db.write_batch() as batch:
+        index.remove('hxa', batch)
+        assert index.expire(150, batch) == []
+    assert len(index) == 0
+    assert index.total_unstaking == 0
+
+
+def test_legacy_migration(stake_history, db):
+    wallets = {'hxa': '10:1.5:1:100', 'hxb': '20:2.25:1:50'}
+    db.put(b'unstaking', json.dumps(wallets).encode())
+
+    index = stake_history.UnstakingIndex(db)
+    assert index.wallets == wallets
+    assert index.total_unstaking == 3.75
+    assert db.get(b'unstaking') is None
+    assert db.get(b'unstaking:hxa') == b'10:1.5:1:100'
+
+    # Migrated cache loads the same index
+    index = stake_history.UnstakingIndex(db)
+    assert index.wallets == wallets
+    with db.write_batch() as batch:
+        assert index.expire(50, batch) == [('hxb', '20')]
+
+
+def test_same_as_linear_scan(stake_history, db):
+    index = stake_history.UnstakingIndex(db)
+    reference = LinearScan()
+    rand = random.Random(0)
+    addrs = [f'hx{i:040x}' for i in range(50)]
+
+    for height in range(1, 2000):
+        with db.write_batch() as batch:
+            assert sorted(index.expire(height, batch)) == sorted(reference.expire(height))
+            for addr in rand.sample(addrs, 3):
+                if addr in reference.wallets and rand.random() < 0.3:
+                    index.remove(addr, batch)
+                    reference.wallets.pop(addr)
+                    continue
+                stake_value = rand.randint(0, 10 ** 8) / 10 ** 4
+                unstaking_value = rand.randint(1, 10 ** 8) / 10 ** 4
+                unlock_height = height + rand.randint(1, 100)
+                index.put(addr, stake_value, unstaking_value, height, unlock_height, batch)
+                reference.wallets[addr] = (
+                    f'{stake_value}:{unstaking_value}:{height}:{unlock_height}'
+                )
+
+        assert index.wallets == reference.wallets
+        assert index.total_unstaking == round(reference.total_unstaking, 4)
+
+    # Outdated heap items are dropped, heap does not grow with number of updates
+    assert len(index._heap) <= 2 * len(index) + 64
+    assert stake_history.UnstakingIndex(db).wallets == reference.wallets
@@ -37,6 +37,8 @@ def test_setting_value(setup_chainalytic_config):
         'zone_storage_dir',
         'transform_storage_dir',
         'transform_cache_dir',
+        'block_cache_size',
+        'digest_store_dir',
     ]
     for k in valid_keys:
         assert k in setting
@@ -49,4 +51,6 @@ def test_setting_value(setup_chainalytic_config):
     assert setting['zone_storage_dir'] == '{warehouse_dir}/{zone_id}_storage'
     assert setting['transform_storage_dir'] == '{zone_storage_dir}/{transform_id}_storage'
     assert setting['transform_cache_dir'] == '{zone_storage_dir}/{transform_id}_cache'
+    assert setting['block_cache_size'] == 1000
+    assert setting['digest_store_dir'] == ''
 
@@ -0,0 +1,39 @@
+import pytest
+from chainalytic.common.lru_cache import LRUCache
+
+
+def test_lru_cache_eviction():
+    c = LRUCache(2)
+    c.put(1, 'a')
+    c.put(2, 'b')
+
+    # Touch key 1 so key 2 becomes the least recently used one
+    assert c.get(1) == 'a'
+    c.put(3, 'c')
+
+    assert 1 in c
+    assert 2 not in c
+    assert 3 in c
+    assert len(c) == 2
+
+
+def test_lru_cache_stats():
+    c = LRUCache(10)
+    c.put(1, 'a')
+    c.get(1)
+    c.get(1)
+    c.get(2)
+
+    stats = c.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['size'] == 1
+    assert stats['capacity'] == 10
+    assert stats['hit_rate'] == round(2 / 3, 4)
+
+
+def test_lru_cache_disabled():
+    c = LRUCache(0)
+    c.put(1, 'a')
+    assert c.get(1) is None
+    assert len(c) == 0
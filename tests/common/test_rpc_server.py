@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+from chainalytic.common import rpc_server
+
+
+class StandInWebSocket(object):
+    """Record frames sent by server, optionally drop connection after some messages"""
+
+    def __init__(self, disconnect_after: int = None):
+        self.sent = []
+        self.close_code = None
+        self.close_reason = None
+        self.disconnect_after = disconnect_after
+
+    async def send(self, message: str):
+        if self.disconnect_after is not None and len(self.sent) >= self.disconnect_after:
+            raise websockets.ConnectionClosedOK(1000, '')
+        self.sent.append(json.loads(message))
+
+    async def close(self, code: int = 1000, reason: str = ''):
+        self.close_code = code
+        self.close_reason = reason
+
+
+@pytest.fixture
+def subscriptions():
+    @rpc_server.subscription('test_count')
+    async def count(limit: int, error: str = ''):
+        for i in range(limit):
+            yield {'i': i}
+        if error:
+            raise ValueError(error)
+
+    yield
+    rpc_server._SUBSCRIPTIONS.pop('test_count')
+
+
+def serve(websocket, **params):
+    asyncio.get_event_loop().run_until_complete(
+        rpc_server._serve_subscription(websocket, 1, 'test_count', params)
+    )
+
+
+def test_subscription(subscriptions):
+    websocket = StandInWebSocket()
+    serve(websocket, limit=2)
+    assert websocket.sent == [
+        {'jsonrpc': '2.0', 'result': 'test_count', 'id': 1},
+        {'jsonrpc': '2.0', 'method': 'test_count', 'params': {'i': 0}},
+        {'jsonrpc': '2.0', 'method': 'test_count', 'params': {'i': 1}},
+    ]
+    assert websocket.close_code is None
+
+    # Subscriber leaving is not an error
+    websocket = StandInWebSocket(disconnect_after=2)
+    serve(websocket, limit=5)
+    assert len(websocket.sent) == 2
+    assert websocket.close_code is None
+
+
+def test_subscription_failure(subscriptions):
+    # Subscriber gets an error frame instead of waiting forever
+    websocket = StandInWebSocket()
+    serve(websocket, limit=1, error='Chain read failed')
+    assert len(websocket.sent) == 2
+    assert websocket.close_code == 1011
+    assert websocket.close_reason == 'ValueError: Chain read failed'
+
+    # Close reason fits in one close frame
+    websocket = StandInWebSocket()
+    serve(websocket, limit=0, error='é' * 100)
+    assert len(websocket.close_reason.encode()) <= 123
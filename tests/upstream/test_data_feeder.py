@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from chainalytic.common import config
+from chainalytic.upstream.data_feeder import BaseDataFeeder
+
+
+class CountingDataFeeder(BaseDataFeeder):
+    """Record prefetched heights instead of reading chain"""
+
+    def __init__(self, working_dir: str, zone_id: str):
+        super(CountingDataFeeder, self).__init__(working_dir, zone_id)
+        self.prefetched = []
+        self._lock = threading.Lock()
+
+    def _prefetch_block(self, height: int) -> bool:
+        with self._lock:
+            self.prefetched.append(height)
+        return True
+
+
+def prefetch(feeder: CountingDataFeeder, *heights: int):
+    feeder._prefetch_executor = ThreadPoolExecutor(max_workers=2)
+    for height in heights:
+        feeder.schedule_prefetch(height, 'stake_history')
+    feeder._prefetch_executor.shutdown(wait=True)
+
+
+def test_schedule_prefetch_below_tip(tmp_path):
+    working_dir = tmp_path.as_posix()
+    config.init_user_config(working_dir)
+    feeder = CountingDataFeeder(working_dir, 'public-icon')
+    feeder.prefetch_window = 5
+
+    # Tip is unknown, nothing to prefetch
+    prefetch(feeder, 100)
+    assert feeder.prefetched == []
+
+    # Only heights up to cached tip are prefetched, none once synced to tip
+    feeder.tip_tracker.height = 102
+    prefetch(feeder, 100, 102)
+    assert sorted(feeder.prefetched) == [101, 102]
+    assert feeder.tip_tracker.refresh_count == 0
+
+    feeder.tip_tracker.height = 110
+    prefetch(feeder, 103)
+    assert sorted(feeder.prefetched) == [101, 102, 104, 105, 106, 107, 108]
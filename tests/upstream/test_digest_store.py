@@ -0,0 +1,84 @@
+import multiprocessing
+
+import pytest
+from chainalytic.upstream.digest_store import DigestStore
+
+
+def test_digest_store(tmp_path):
+    store = DigestStore(tmp_path.as_posix())
+    digest = {
+        'timestamp': 1570000000000000,
+        'stake': {'hx0000000000000000000000000000000000000001': 100.5},
+        'delegation': {},
+        'fund_transfer': [{'from': 'hx01', 'to': 'hx02', 'value': 1.0}],
+    }
+
+    assert store.get(10) is None
+    assert store.put(10, digest)
+    assert store.get(10) == digest
+
+    # Stored heights are never overwritten
+    assert not store.put(10, {'timestamp': 0})
+    assert store.get(10) == digest
+
+    # Heights can be added out of order, gaps are reported as missing
+    assert store.put(12, {'timestamp': 12})
+    assert store.put(11, {'timestamp': 11})
+    assert store.has(11)
+    assert not store.has(13)
+    assert not store.has(9)
+
+    assert [h for h, _ in store.iter_range(10, 20)] == [10, 11, 12]
+    store.close()
+
+    # Reopen from disk
+    store = DigestStore(tmp_path.as_posix())
+    assert store.get(10) == digest
+    assert store.get(12) == {'timestamp': 12}
+    assert store.stats()['index_records'] == 13
+    store.close()
+
+
+def _put_heights(store_dir, heights):
+    store = DigestStore(store_dir)
+    for height in heights:
+        # Digest sizes differ per height, so a misplaced offset cannot decode to the right one
+        store.put(height, {'height': height, 'padding': 'x' * (height % 97)})
+    store.close()
+
+
+def test_digest_store_two_writers(tmp_path):
+    store_dir = tmp_path.as_posix()
+    writers = [
+        multiprocessing.Process(target=_put_heights, args=(store_dir, range(i, 2000, 2)))
+        for i in range(2)
+    ]
+    for p in writers:
+        p.start()
+    for p in writers:
+        p.join()
+        assert p.exitcode == 0
+
+    store = DigestStore(store_dir)
+    for height in range(2000):
+        assert store.get(height) == {'height': height, 'padding': 'x' * (height % 97)}
+    store.close()
+
+
+def test_digest_store_writer_lock(tmp_path):
+    store_dir = tmp_path.as_posix()
+    server = DigestStore(store_dir, exclusive=1)
+    assert server.has_writer_lock()
+
+    # E.g. a backfill started while Upstream server is running, store is read-only
+    backfill = DigestStore(store_dir, exclusive=1)
+    assert not backfill.has_writer_lock()
+    assert not backfill.put(1, {'timestamp': 1})
+    assert server.put(2, {'timestamp': 2})
+    assert backfill.get(2) == {'timestamp': 2}
+
+    # Writer lock is taken over once the holder closes
+    server.close()
+    assert backfill.put(1, {'timestamp': 1})
+    assert backfill.has_writer_lock()
+    backfill.close()
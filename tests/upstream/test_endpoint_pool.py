@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from chainalytic.upstream.endpoint_pool import EndpointPool
+
+
+def start_node(delay: float = 0):
+    """Stand-in citizen node, answer every JSON-RPC request with its own port after `delay`"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            time.sleep(server.delay)
+            body = json.dumps({'jsonrpc': '2.0', 'result': server.server_port, 'id': 1}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('localhost', 0), Handler)
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=1).start()
+    return server
+
+
+def post(endpoint: str):
+    r = requests.post(f'http://{endpoint}', json={'jsonrpc': '2.0', 'method': 'x', 'id': 1})
+    return r.json()['result']
+
+
+@pytest.fixture
+def nodes():
+    servers = [start_node(), start_node()]
+    yield servers
+    for s in servers:
+        s.shutdown()
+        s.server_close()
+
+
+def endpoint(server) -> str:
+    return f'localhost:{server.server_port}'
+
+
+def test_spread_over_endpoints(nodes):
+    pool = EndpointPool([endpoint(s) for s in nodes])
+    results = set()
+
+    def call():
+        results.add(pool.call(post))
+
+    nodes[0].delay = nodes[1].delay = 0.2
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Concurrent calls go to different idle endpoints
+    assert results == {s.server_port for s in nodes}
+    assert all(v['latency_ms'] > 0 for v in pool.stats().values())
+
+
+def test_hedge_slow_endpoint(nodes):
+    nodes[0].delay = 2
+    pool = EndpointPool([endpoint(s) for s in nodes], hedge_delay=0.1)
+
+    # Slow first endpoint is picked first, then hedged to the second one
+    t = time.time()
+    assert pool.call(post) == nodes[1].server_port
+    assert time.time() - t < 1
+    assert pool.stats()[endpoint(nodes[1])]['hedges'] == 1
+
+
+def test_failover(nodes):
+    down = 'localhost:1'
+    pool = EndpointPool([down, endpoint(nodes[0])], failure_cooldown=60)
+
+    assert pool.call(post) == nodes[0].server_port
+    assert pool.call(post) == nodes[0].server_port
+    stats = pool.stats()
+    assert stats[down]['failures'] <= 1
+    assert stats[endpoint(nodes[0])]['requests'] == 2
+
+    pool = EndpointPool([down])
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.call(post)
+
+
+def test_close(nodes):
+    pool = EndpointPool([endpoint(s) for s in nodes], hedge_delay=0.1)
+    assert pool.call(post)
+    executor = pool._executor
+
+    pool.close()
+    assert executor._shutdown
+    pool.close()
+
+    # Closed pool still serves calls, only without hedging
+    assert pool.call(post) in {s.server_port for s in nodes}
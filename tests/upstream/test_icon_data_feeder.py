@@ -0,0 +1,314 @@
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import plyvel
+import pytest
+from chainalytic.common import config, zone_manager
+from ruamel.yaml import YAML
+
+TOTAL_SUPPLY = 800460000 * 10 ** 18
+LOOP_PER_ICX = 10 ** 18
+V3_BLOCK_HEIGHT = 10324749
+
+
+def load_data_feeder_module(working_dir: str):
+    config.init_user_config(working_dir)
+    return zone_manager.load_zone('public-icon', working_dir)['upstream']['data_feeder']
+
+
+def start_node(port: int = 0):
+    """Stand-in citizen node, answer every JSON-RPC request with total supply"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            body = json.dumps({'jsonrpc': '2.0', 'result': hex(TOTAL_SUPPLY), 'id': 1}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('localhost', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=1).start()
+    return server
+
+
+def test_client_setup_once(tmp_path):
+    data_feeder = load_data_feeder_module(tmp_path.as_posix())
+    node = start_node()
+    feeder = data_feeder.DataFeeder(tmp_path.as_posix(), 'public-icon')
+    feeder.client_endpoints = [f'localhost:{node.server_port}']
+
+    # Clients are built once, even if first calls come from several threads at once
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: feeder._get_total_supply(), range(80)))
+    assert results == [TOTAL_SUPPLY / 10 ** 18] * 80
+    assert len(feeder.http_providers) == 1
+    assert feeder.http_providers[feeder.client_endpoints[0]].request_count == 80
+    endpoint_pool = feeder.endpoint_pool
+
+    # Clients are kept while node is down, and reused once it is back
+    node.shutdown()
+    node.server_close()
+    assert feeder._get_total_supply() is None
+    assert feeder.client_failures == 1
+    assert feeder.endpoint_pool is endpoint_pool
+
+    node = start_node(node.server_port)
+    assert feeder._get_total_supply() == TOTAL_SUPPLY / 10 ** 18
+    assert feeder.endpoint_pool is endpoint_pool
+    node.shutdown()
+
+
+def transfer_tx(source: str, dest: str, loop: int, v3: bool = False) -> dict:
+    tx = {'from': source, 'to': dest, 'value': hex(loop), 'timestamp': hex(1)}
+    if not v3:
+        tx['method'] = 'icx_sendTransaction'
+    return tx
+
+
+def call_tx(source: str, method: str, params: dict) -> dict:
+    return {
+        'from': source,
+        'to': 'cx0000000000000000000000000000000000000000',
+        'dataType': 'call',
+        'data': {'method': method, 'params': params},
+        'timestamp': hex(2),
+    }
+
+
+def raw_block(height: int, txs: list) -> dict:
+    """Raw block as stored in chain DB, in V1 or V3 format depending on height"""
+    if height < V3_BLOCK_HEIGHT:
+        return {
+            'version': '0.1a',
+            'time_stamp': 1516819217223222 + height,
+            'confirmed_transaction_list': txs,
+            'height': hex(height),
+        }
+    return {
+        'version': '0.3',
+        'timestamp': hex(1516819217223222 + height),
+        'transactions': txs,
+        'height': hex(height),
+    }
+
+
+def fixture_blocks(start_height: int, count: int) -> dict:
+    """Raw blocks mixing ICX transfers, `setStake`, `setDelegation` and other calls"""
+    v3 = start_height >= V3_BLOCK_HEIGHT
+    blocks = {}
+    for i in range(count):
+        height = start_height + i
+        txs = [transfer_tx('hxa', f'hx{i:040x}', i * LOOP_PER_ICX + 1, v3)]
+        if i % 3 == 0:
+            txs.append(call_tx(f'hx{i:040x}', 'setStake', {'value': hex(i * LOOP_PER_ICX)}))
+        if i % 4 == 0:
+            delegations = [{'address': 'hxp', 'value': hex(i)}]
+            txs.append(call_tx(f'hx{i:040x}', 'setDelegation', {'delegations': delegations}))
+        if i % 5 == 0:
+            txs.append(call_tx('hxb', 'transfer', {'_to': 'hxc', '_value': '0x1'}))
+        blocks[height] = raw_block(height, txs)
+    return blocks
+
+
+def build_chain_db(chain_db_dir: str, score_db_dir: str, blocks: dict):
+    chain_db = plyvel.DB(chain_db_dir, create_if_missing=True)
+    for height, block in blocks.items():
+        block_hash = hashlib.sha3_256(str(height).encode()).hexdigest().encode()
+        chain_db.put(b'block_height_key' + height.to_bytes(12, 'big'), block_hash)
+        chain_db.put(block_hash, json.dumps(block).encode())
+    chain_db.put(b'last_block_key', block_hash)
+    chain_db.close()
+
+    score_db = plyvel.DB(score_db_dir, create_if_missing=True)
+    score_db.put(b'total_supply', TOTAL_SUPPLY.to_bytes(32, 'big'))
+    score_db.close()
+
+
+def setup_direct_db_access(working_dir: str, tmp_path: Path, transforms: list, blocks: dict):
+    """Working dir of a zone reading blocks straight from a chain DB built from `blocks`"""
+    chain_db_dir = tmp_path.joinpath('chain_db').as_posix()
+    score_db_dir = tmp_path.joinpath('score_db').as_posix()
+    if not Path(chain_db_dir).exists():
+        build_chain_db(chain_db_dir, score_db_dir, blocks)
+
+    config.init_user_config(working_dir)
+    yaml = YAML(typ='safe')
+    registry_path = Path(working_dir, config.CHAINALYTIC_FOLDER, config.CFG_FOLDER).joinpath(
+        'chain_registry.yml'
+    )
+    registry = yaml.load(registry_path.read_text())
+    zone = [z for z in registry['zones'] if z['zone_id'] == 'public-icon'][0]
+    zone.update(
+        {
+            'chain_db_dir': chain_db_dir,
+            'score_db_icondex_dir': score_db_dir,
+            'direct_db_access': 1,
+            'transforms': transforms,
+        }
+    )
+    with open(registry_path, 'w') as f:
+        yaml.dump(registry, f)
+
+    setting_path = registry_path.parent.joinpath('setting.yml')
+    setting = yaml.load(setting_path.read_text())
+    setting['digest_store_dir'] = '.chainalytic/chainalytic_upstream/{zone_id}_digest_store'
+    with open(setting_path, 'w') as f:
+        yaml.dump(setting, f)
+
+
+@pytest.fixture
+def open_feeder(tmp_path):
+    """Open data feeders on a fixture chain DB, one at a time as LevelDB allows one user"""
+    feeders = []
+
+    def open_feeder(transforms: list, blocks: dict = None):
+        while feeders:
+            close_feeder(feeders.pop())
+        working_dir = tmp_path.joinpath('_'.join(transforms)).as_posix()
+        setup_direct_db_access(working_dir, tmp_path, transforms, blocks)
+        data_feeder = zone_manager.load_zone('public-icon', working_dir)['upstream']['data_feeder']
+        feeders.append(data_feeder.DataFeeder(working_dir, 'public-icon'))
+        return feeders[-1]
+
+    yield open_feeder
+    while feeders:
+        close_feeder(feeders.pop())
+
+
+def close_feeder(feeder):
+    feeder.chain_db.close()
+    feeder.score_db_icondex_db.close()
+    if feeder.digest_store:
+        feeder.digest_store.close()
+
+
+def test_build_block_digest(open_feeder):
+    blocks = {**fixture_blocks(1, 2), **fixture_blocks(V3_BLOCK_HEIGHT, 2)}
+    feeder = open_feeder(['stake_history', 'funded_wallets'], blocks)
+
+    for height in [1, V3_BLOCK_HEIGHT]:
+        digest = feeder._build_block_digest(height, blocks[height])
+        assert digest['timestamp'] == 1516819217223222 + height
+        assert digest['fund_transfer'] == [
+            {'from': 'hxa', 'to': f'hx{0:040x}', 'value': 1 / LOOP_PER_ICX, 'loop': '0x1'}
+        ]
+        assert digest['stake'] == {f'hx{0:040x}': 0}
+        assert digest['delegation'] == {f'hx{0:040x}': [{'address': 'hxp', 'value': '0x0'}]}
+
+    # Large transfer keeps every loop in its hex value
+    block = raw_block(2, [transfer_tx('hxa', 'hxb', 800460000 * LOOP_PER_ICX - 1)])
+    digest = feeder._build_block_digest(2, block)
+    assert int(digest['fund_transfer'][0]['loop'], 16) == 800460000 * LOOP_PER_ICX - 1
+
+    # Malformed txs are skipped, block without tx list has no digest
+    block = raw_block(2, [{'from': 'hxa', 'value': '0x1'}, call_tx('hxa', 'setStake', {})])
+    assert feeder._build_block_digest(2, block) == {
+        'timestamp': 1516819217223224,
+        'fund_transfer': [],
+        'stake': {},
+        'delegation': {},
+    }
+    assert feeder._build_block_digest(2, {'time_stamp': 1}) is None
+
+
+def test_prefilter_raw_block(open_feeder):
+    blocks = {**fixture_blocks(1, 4), **fixture_blocks(V3_BLOCK_HEIGHT, 4)}
+    feeder = open_feeder(['stake_history'], blocks)
+    data_feeder = zone_manager.load_zone('public-icon', feeder.working_dir)['upstream'][
+        'data_feeder'
+    ]
+    prefilter_raw_block = data_feeder.prefilter_raw_block
+
+    for height in [2, V3_BLOCK_HEIGHT + 1]:
+        # Header timestamp is found, not the timestamp of a tx
+        assert prefilter_raw_block(height, json.dumps(blocks[height]).encode()) == {
+            'timestamp': 1516819217223222 + height,
+            'fund_transfer': [],
+            'stake': {},
+            'delegation': {},
+            'prefiltered': 1,
+        }
+    # Blocks with stake related txs, or in unknown format, need full decoding
+    for height in [1, 4, V3_BLOCK_HEIGHT + 3]:
+        assert prefilter_raw_block(height, json.dumps(blocks[height]).encode()) is None
+    assert prefilter_raw_block(2, b'{"time_stamp": 1}') is None
+    assert prefilter_raw_block(2, b'{"confirmed_transaction_list": []}') is None
+
+    # Prefilter is only used if no transform needs ICX transfers,
+    # its digests lack them so they never reach digest store
+    assert feeder.prefilter_enabled
+    assert feeder._get_block_digest(2)['prefiltered']
+    assert feeder._get_block_digest(4)['stake'] == {f'hx{3:040x}': 3.0}
+    assert not feeder.digest_store.has(2)
+    assert feeder.digest_store.has(4)
+
+    feeder = open_feeder(['stake_history', 'funded_wallets'])
+    assert not feeder.prefilter_enabled
+    assert feeder._get_block_digest(2)['fund_transfer']
+
+
+def test_iter_raw_blocks(open_feeder, monkeypatch):
+    blocks = fixture_blocks(1, 20)
+    feeder = open_feeder(['stake_history'], blocks)
+    monkeypatch.setattr(type(feeder), 'DB_ITERATOR_BATCH_SIZE', 3)
+
+    items = list(feeder._iter_raw_blocks(2, 12))
+    assert [h for h, _ in items] == list(range(2, 12))
+    assert all(json.loads(data) == blocks[h] for h, data in items)
+
+    # Blocks are read from one snapshot, and iteration stops at the first missing height
+    it = feeder._iter_raw_blocks(1, 30)
+    assert next(it)[0] == 1
+    feeder.chain_db.delete(b'block_height_key' + (5).to_bytes(12, 'big'))
+    assert [h for h, _ in it] == list(range(2, 21))
+    assert [h for h, _ in feeder._iter_raw_blocks(1, 30)] == [1, 2, 3, 4]
+
+
+def test_get_memoized_total_supply(open_feeder):
+    feeder = open_feeder(['stake_history'], fixture_blocks(1, 1))
+    feeder.total_supply_refresh_interval = 1000
+    assert feeder._get_memoized_total_supply(10) == TOTAL_SUPPLY / 10 ** 18
+
+    # Total supply is only read again once refresh interval is passed, in any direction
+    feeder.score_db_icondex_db.put(b'total_supply', (2 * TOTAL_SUPPLY).to_bytes(32, 'big'))
+    assert feeder._get_memoized_total_supply(1009) == TOTAL_SUPPLY / 10 ** 18
+    assert feeder._get_memoized_total_supply(1010) == 2 * TOTAL_SUPPLY / 10 ** 18
+    feeder.score_db_icondex_db.put(b'total_supply', TOTAL_SUPPLY.to_bytes(32, 'big'))
+    assert feeder._get_memoized_total_supply(10) == TOTAL_SUPPLY / 10 ** 18
+
+
+@pytest.mark.parametrize('transforms', [['stake_history'], ['stake_history', 'funded_wallets']])
+def test_iterator_and_single_block_paths(open_feeder, transforms):
+    blocks = {**fixture_blocks(1, 30), **fixture_blocks(V3_BLOCK_HEIGHT, 30)}
+    loop = asyncio.get_event_loop()
+
+    def feed(feeder, start_height: int, count: int, transform_id: str) -> list:
+        # Digests of first feeder must not be reused by the second one
+        feeder.digest_store.close()
+        feeder.digest_store = None
+        if count > 1:
+            return loop.run_until_complete(feeder.get_blocks(start_height, count, transform_id))
+        return [
+            loop.run_until_complete(feeder.get_block(h, transform_id))
+            for h in range(start_height, start_height + 30)
+        ]
+
+    # Ranges are read with the snapshot iterator, single blocks with point lookups
+    for start_height in [1, V3_BLOCK_HEIGHT]:
+        for transform_id in transforms:
+            feeder = open_feeder(transforms, blocks)
+            ranged = feed(feeder, start_height, 30, transform_id)
+            feeder = open_feeder(transforms)
+            single = feed(feeder, start_height, 1, transform_id)
+            assert len(ranged) == 30
+            assert ranged == single
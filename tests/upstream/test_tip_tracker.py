@@ -0,0 +1,41 @@
+import pytest
+from chainalytic.upstream.tip_tracker import TipTracker
+
+
+def test_tip_tracker():
+    chain = {'tip': 100, 'calls': 0}
+
+    def fetch_tip():
+        chain['calls'] += 1
+        return chain['tip']
+
+    tracker = TipTracker(fetch_tip, ttl=60)
+    assert tracker.get() == 100
+    assert chain['calls'] == 1
+
+    # Served from cache while fresh and high enough
+    chain['tip'] = 105
+    assert tracker.get() == 100
+    assert tracker.get(min_height=100) == 100
+    assert chain['calls'] == 1
+
+    # Requesting a height above cached tip forces a refresh
+    assert tracker.get(min_height=103) == 105
+    assert chain['calls'] == 2
+
+    # Failed fetch keeps previous tip
+    chain['tip'] = None
+    assert tracker.refresh() == 105
+
+
+def test_tip_tracker_ttl():
+    chain = {'calls': 0}
+
+    def fetch_tip():
+        chain['calls'] += 1
+        return 100
+
+    tracker = TipTracker(fetch_tip, ttl=0)
+    tracker.get()
+    tracker.get()
+    assert chain['calls'] == 2